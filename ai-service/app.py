@@ -6,14 +6,30 @@ Provides face verification, liveness detection, and OCR capabilities.
 """
 
 import os
+import json
 import logging
-from flask import Flask, jsonify, request
+import time
+import functools
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 
 from services.face_verification import FaceVerificationService
 from services.liveness_detection import LivenessDetectionService
 from services.ocr_service import OCRService
+from services.ocr_pool import pool_stats
+from services.pipeline import run_complete_verification, stage_costs
+from services.job_queue import (
+    QueueFullError, callback_error, get_job_queue, job_stats, resume_orphaned_jobs,
+)
+from services.deadline import DeadlineExceeded, deadline_from_header
+from services import metrics, profiler, thread_budget, timing, usage, warmup
+from services.singleflight import request_key, singleflight
+from services.presubmit import PresubmitFull, presubmit_store
+from services.admission import AdmissionRejected, admission, estimate_decoded_bytes
+from services.scheduler import (
+    reset_request_lane, run_scheduled, scheduler_stats, set_request_lane,
+)
 
 # Logging
 logging.basicConfig(
@@ -26,15 +42,311 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Bulk validation streams NDJSON, so it gets its own (larger) body limit
+app.config['BULK_VALIDATE_MAX_BYTES'] = int(os.getenv('BULK_VALIDATE_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['BULK_VALIDATE_BATCH_SIZE'] = int(os.getenv('BULK_VALIDATE_BATCH_SIZE', 1000))
+
 # CORS configuration
 CORS(app, resources={
     r"/api/*": {
         "origins": os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000,http://localhost:5001').split(','),
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": [
+            "Content-Type", "Authorization",
+            "X-Priority", "X-Client-Id", "X-Request-Timeout-Ms", "X-Timing-Breakdown",
+            "X-Profile", "X-Profile-Token", "X-Profile-Output",
+        ],
+        "expose_headers": [
+            "X-Coalesced", "Server-Timing", "Retry-After",
+            "X-Profile-File", "X-Profiled-Status", "X-Profile-Elapsed-Ms",
+        ]
     }
 })
 
+# ===========================================
+# Request Metrics
+# ===========================================
+# Latency, status, in-flight count, CPU time and memory per route (see
+# services/metrics.py and services/usage.py).
+
+def _metrics_endpoint() -> str:
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _request_resources():
+    """CPU and memory charged to this request so far, or None when not accounted."""
+    accounted = request.environ.get('verifyx.usage')
+    return accounted[0].report() if accounted is not None else None
+
+
+@app.before_request
+def start_request_metrics():
+    request.environ['verifyx.started_at'] = time.perf_counter()
+    if usage.ENABLED:
+        request.environ['verifyx.usage'] = usage.start()
+    metrics.request_started(_metrics_endpoint())
+
+
+@app.after_request
+def record_request_metrics(response):
+    started_at = request.environ.get('verifyx.started_at')
+    if started_at is not None:
+        metrics.request_finished(_metrics_endpoint(), response.status_code, time.perf_counter() - started_at,
+                                 _request_resources())
+    return response
+
+
+@app.teardown_request
+def close_request_metrics(exc):
+    accounted = request.environ.pop('verifyx.usage', None)
+    if accounted is not None:
+        usage.finish(accounted[1])
+    if request.environ.pop('verifyx.started_at', None) is not None:
+        metrics.request_closed(_metrics_endpoint())
+
+
+# ===========================================
+# Timing Breakdown & Slow Requests
+# ===========================================
+# X-Timing-Breakdown: true adds `timing_breakdown` (nested stage timings,
+# with CPU and memory per stage and for the whole request) to JSON
+# responses.  Every request is traced while the slow-request log is on
+# (SLOW_REQUEST_MS > 0); see services/timing.py.
+
+def _timing_requested() -> bool:
+    return request.headers.get('X-Timing-Breakdown', '').lower() in ('1', 'true', 'yes')
+
+
+@app.before_request
+def start_request_timing():
+    if _timing_requested() or timing.SLOW_REQUEST_MS > 0:
+        request.environ['verifyx.timing'] = timing.start(f'{request.method} {_metrics_endpoint()}')
+
+
+@app.after_request
+def attach_timing_breakdown(response):
+    trace = request.environ.pop('verifyx.timing', None)
+    if trace is None:
+        return response
+    root, token = trace
+    timing.finish(root, token)
+    tree = timing.breakdown(root)
+    resources = _request_resources()
+    if resources is not None:
+        tree['resources'] = resources
+
+    if _timing_requested():
+        response.headers['Server-Timing'] = timing.server_timing(tree)
+        if response.is_json and not response.is_streamed:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body['timing_breakdown'] = tree
+                response.set_data(json.dumps(body))
+
+    if 0 < timing.SLOW_REQUEST_MS <= tree['ms']:
+        timing.log_slow_request(
+            _metrics_endpoint(), request.method, response.status_code, tree['ms'],
+            timing.summarize_inputs(request.get_json(silent=True), request.content_length), tree,
+        )
+    return response
+
+
+@app.teardown_request
+def end_request_timing(exc):
+    # A request that failed before after_request still has to release its span
+    trace = request.environ.pop('verifyx.timing', None)
+    if trace is not None:
+        timing.finish(*trace)
+
+
+# ===========================================
+# Request Profiling
+# ===========================================
+# X-Profile: sample | deterministic, with X-Profile-Token, profiles one
+# /api/v1 request; X-Profile-Output: attachment (default) | spool.
+# PROFILE_SAMPLE_RATE profiles a fraction of traffic into the spool
+# directory.  See services/profiler.py.
+
+@app.before_request
+def start_request_profile():
+    if not request.path.startswith('/api/v1/'):
+        return None
+
+    mode = request.headers.get('X-Profile', '').lower()
+    if not mode:
+        if profiler.sampled():
+            try:
+                request.environ['verifyx.profile'] = (profiler.start('sample', request.path), 'background')
+            except profiler.ProfilerBusy:
+                pass
+        return None
+
+    if not profiler.authorized(request.headers.get('X-Profile-Token', '')):
+        return jsonify({'success': False, 'error': 'Profiling not permitted'}), 403
+    if mode not in profiler.MODES:
+        return jsonify({'success': False, 'error': f"X-Profile must be one of: {', '.join(profiler.MODES)}"}), 400
+    output = request.headers.get('X-Profile-Output', 'attachment').lower()
+    if output not in ('attachment', 'spool'):
+        return jsonify({'success': False, 'error': 'X-Profile-Output must be attachment or spool'}), 400
+
+    try:
+        request.environ['verifyx.profile'] = (profiler.start(mode, request.path), output)
+    except profiler.ProfilerBusy as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return None
+
+
+@app.after_request
+def finish_request_profile(response):
+    started = request.environ.pop('verifyx.profile', None)
+    if started is None:
+        return response
+    (profile, token), output = started
+    profiler.finish(profile, token)
+
+    if output == 'background':
+        profiler.write_spool(profile)
+        return response
+    if output == 'spool':
+        response.headers['X-Profile-File'] = profiler.write_spool(profile)
+        return response
+
+    data, extension = profile.output()
+    attachment = Response(data, mimetype='text/plain' if extension == 'collapsed' else 'application/octet-stream')
+    attachment.headers['Content-Disposition'] = f'attachment; filename="{profile.filename()}"'
+    attachment.headers['X-Profiled-Status'] = str(response.status_code)
+    attachment.headers['X-Profile-Elapsed-Ms'] = str(round(profile.elapsed * 1000, 1))
+    return attachment
+
+
+@app.teardown_request
+def end_request_profile(exc):
+    # The view raised before after_request: stop profiling, keep nothing
+    started = request.environ.pop('verifyx.profile', None)
+    if started is not None:
+        profiler.finish(*started[0])
+
+
+# ===========================================
+# Request Lanes
+# ===========================================
+# X-Priority: interactive | batch   (default: interactive)
+# X-Client-Id: caller identity for fair-share scheduling (default: remote address)
+
+def _request_client_id() -> str:
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'anonymous'
+
+
+@app.before_request
+def assign_request_lane():
+    lane = request.headers.get('X-Priority', 'interactive').lower()
+    request.environ['verifyx.lane_token'] = set_request_lane(lane, _request_client_id())
+
+
+@app.teardown_request
+def release_request_lane(exc):
+    token = request.environ.pop('verifyx.lane_token', None)
+    if token is not None:
+        reset_request_lane(token)
+
+
+def _request_deadline():
+    """Deadline for this request: X-Request-Timeout-Ms, capped by REQUEST_TIMEOUT."""
+    return deadline_from_header(request.headers.get('X-Request-Timeout-Ms'))
+
+
+def _deadline_response(e):
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 504
+
+
+# ===========================================
+# Admission Control
+# ===========================================
+# Engine endpoints are rejected up front (429/503 + Retry-After) when the
+# engine is saturated or the decoded-image memory budget is spent.
+
+def admission_controlled(engines: tuple, *image_fields):
+    """Admit the request against `engines` and the bytes its `image_fields` decode to."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return view(*args, **kwargs)  # let the view report the bad payload
+
+            nbytes = 0
+            for field in image_fields:
+                value = data.get(field)
+                for image in (value if isinstance(value, list) else [value]):
+                    nbytes += estimate_decoded_bytes(image)
+
+            try:
+                with admission.admit(engines, nbytes):
+                    return view(*args, **kwargs)
+            except AdmissionRejected as e:
+                logger.warning(f"Rejected {request.path}: {e}")
+                response = jsonify({
+                    'success': False,
+                    'error': str(e),
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, e.status
+        return wrapper
+    return decorator
+
+
+# ===========================================
+# Request Coalescing
+# ===========================================
+# Identical /ocr/extract and /verify/complete requests in flight at the
+# same time run once; followers get X-Coalesced: true.
+
+def _is_complete_result(result: dict) -> bool:
+    """Partial results reflect one caller's deadline and aren't shared with coalesced requests."""
+    return not result.get('partial')
+
+
+def _mark_coalesced(response, coalesced: bool):
+    if coalesced:
+        response.headers['X-Coalesced'] = 'true'
+    return response
+
+
+# ===========================================
+# Payload Validation
+# ===========================================
+
+def _parse_page(data: dict, field: str) -> tuple:
+    """1-based page number `data[field]` (default 1).  Returns (page, error_message)."""
+    value = data.get(field, 1)
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        page = int(value)
+    except ValueError:
+        return None, f'{field} must be an integer'
+    if page < 1:
+        return None, f'{field} must be >= 1'
+    return page, None
+
+
+def _parse_flag(data: dict, field: str) -> tuple:
+    """Optional boolean `data[field]` (true/false or "true"/"false").  Returns (value, error_message)."""
+    value = data.get(field)
+    if value is None or isinstance(value, bool):
+        return value, None
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true', None
+    return None, f'{field} must be true or false'
+
+
 # ===========================================
 # Health Check Endpoints
 # ===========================================
@@ -49,9 +361,15 @@ def home():
         'timestamp': datetime.utcnow().isoformat(),
         'endpoints': {
             'health': '/health',
+            'live': '/health/live',
+            'ready': '/health/ready',
+            'status': '/status',
+            'metrics': '/metrics',
             'face_verify': '/api/v1/face/verify',
             'liveness': '/api/v1/liveness/detect',
-            'ocr': '/api/v1/ocr/extract'
+            'ocr': '/api/v1/ocr/extract',
+            'presubmit': '/api/v1/verify/presubmit',
+            'verify': '/api/v1/verify/complete'
         }
     })
 
@@ -67,6 +385,7 @@ def health_check():
 
     return jsonify({
         'status': 'healthy',
+        'ready': warmup.is_ready(),
         'timestamp': datetime.utcnow().isoformat(),
         'services': {
             'face_verification':  status(face_ready),
@@ -81,11 +400,70 @@ def health_check():
     })
 
 
+@app.route('/health/live')
+def liveness_check():
+    """Liveness probe: the process is up and serving requests (engines may still be loading)."""
+    return jsonify({
+        'status': 'alive',
+        'pid': os.getpid(),
+        'uptime_seconds': warmup.uptime_seconds(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe: 503 until engine warmup has finished in this worker."""
+    ready = warmup.is_ready()
+    return jsonify({
+        'ready': ready,
+        'engines': warmup.readiness(),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
+
+@app.route('/status')
+def service_status():
+    """Runtime internals: worker pools and queue depths."""
+    status = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'ocr_pool': pool_stats(),
+        'ocr_cache': OCRService.cache_stats(),
+        'face_batcher': FaceVerificationService.batcher_stats(),
+        'jobs': job_stats(),
+        'scheduler': scheduler_stats(),
+        'admission': admission.stats(),
+        'singleflight': singleflight.stats(),
+        'presubmit': presubmit_store.stats(),
+        'profiler': profiler.stats(),
+        'thread_budget': thread_budget.budget(),
+        'stage_costs_ms': stage_costs.snapshot(),
+    }
+    # Set by asgi.py when served by uvicorn
+    asgi_executors = request.environ.get('verifyx.asgi_executors')
+    if asgi_executors is not None:
+        status['asgi_executors'] = asgi_executors()
+    return jsonify(status)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus exposition: per-stage histograms, caches, queues, warmup (all workers)."""
+    if not metrics.ENABLED:
+        return jsonify({
+            'error': 'Metrics disabled (prometheus_client not installed or METRICS_ENABLED=false)',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 503
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 # ===========================================
 # Face Verification Endpoints
 # ===========================================
 
 @app.route('/api/v1/face/verify', methods=['POST'])
+@admission_controlled(('face',), 'document_image', 'selfie_image')
 def verify_face():
     """
     Compare two face images and return similarity score.
@@ -93,6 +471,7 @@ def verify_face():
     Expected payload:
     - document_image: Base64 encoded image from ID document
     - selfie_image: Base64 encoded selfie image
+    - document_page: (optional) 1-based page when document_image is a PDF
     """
     try:
         data = request.get_json()
@@ -106,7 +485,14 @@ def verify_face():
         if not document_image or not selfie_image:
             return jsonify({'error': 'Both document_image and selfie_image are required'}), 400
 
-        verification = FaceVerificationService.verify_faces(document_image, selfie_image)
+        document_page, error = _parse_page(data, 'document_page')
+        if error:
+            return jsonify({'error': error}), 400
+
+        verification = run_scheduled(
+            'face', FaceVerificationService.verify_faces, document_image, selfie_image, document_page,
+            deadline=_request_deadline(),
+        )
 
         return jsonify({
             'success': True,
@@ -121,6 +507,9 @@ def verify_face():
             'timestamp': datetime.utcnow().isoformat()
         })
 
+    except DeadlineExceeded as e:
+        return _deadline_response(e)
+
     except ValueError as e:
         # Face not detected or image decode error
         return jsonify({
@@ -139,6 +528,7 @@ def verify_face():
 
 
 @app.route('/api/v1/face/detect', methods=['POST'])
+@admission_controlled(('face',), 'image')
 def detect_face():
     """
     Detect faces in an image and return bounding boxes.
@@ -149,7 +539,9 @@ def detect_face():
         if not data or 'image' not in data:
             return jsonify({'error': 'Image is required'}), 400
 
-        detection = FaceVerificationService.detect_faces(data['image'])
+        detection = run_scheduled(
+            'face', FaceVerificationService.detect_faces, data['image'], deadline=_request_deadline()
+        )
 
         return jsonify({
             'success': True,
@@ -159,6 +551,9 @@ def detect_face():
             'timestamp': datetime.utcnow().isoformat()
         })
 
+    except DeadlineExceeded as e:
+        return _deadline_response(e)
+
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -179,6 +574,7 @@ def detect_face():
 # ===========================================
 
 @app.route('/api/v1/liveness/detect', methods=['POST'])
+@admission_controlled(('liveness',), 'frames')
 def detect_liveness():
     """
     Perform liveness detection on video frames using MediaPipe FaceMesh.
@@ -203,7 +599,10 @@ def detect_liveness():
         if challenge_type not in valid_challenges:
             return jsonify({'error': f'Invalid challenge_type. Must be one of: {", ".join(valid_challenges)}'}), 400
 
-        result = LivenessDetectionService.detect(frames, challenge_type)
+        result = run_scheduled(
+            'liveness', LivenessDetectionService.detect, frames, challenge_type,
+            deadline=_request_deadline(),
+        )
 
         return jsonify({
             'success': True,
@@ -217,10 +616,15 @@ def detect_liveness():
             'details':       result.get('details'),
             'frames_analyzed': result['frames_analyzed'],
             'frames_with_face': result['frames_with_face'],
+            'frames_skipped':   result['frames_skipped'],
+            'partial':          result['partial'],
             'processing_time_ms': result['processing_time_ms'],
             'timestamp': datetime.utcnow().isoformat()
         })
 
+    except DeadlineExceeded as e:
+        return _deadline_response(e)
+
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -265,13 +669,20 @@ def get_liveness_challenge():
 # ===========================================
 
 @app.route('/api/v1/ocr/extract', methods=['POST'])
+@admission_controlled(('ocr',), 'image')
 def extract_document_text():
     """
     Extract text and structured fields from a document image using Tesseract OCR.
 
     Expected payload:
-    - image: Base64 encoded document image
+    - image: Base64 encoded document image or PDF
     - document_type: 'passport' | 'driving_license' | 'national_id' | 'auto'
+    - page: (optional) 1-based page when image is a PDF
+
+    `document_quality` has the same keys for every input; its `source` is
+    'image', or 'pdf_text_layer' when a PDF's text layer was used, in which
+    case the pixel measurements (resolution, brightness, contrast,
+    blur_score) are null.
     """
     try:
         data = request.get_json()
@@ -280,10 +691,21 @@ def extract_document_text():
             return jsonify({'error': 'Image is required'}), 400
 
         document_type = data.get('document_type', 'auto')
-
-        result = OCRService.extract(data['image'], document_type)
-
-        return jsonify({
+        page, error = _parse_page(data, 'page')
+        if error:
+            return jsonify({'error': error}), 400
+
+        # Identical requests already in flight share one extraction
+        deadline = _request_deadline()
+        result, coalesced = singleflight.do(
+            request_key('ocr_extract', data['image'], document_type, page),
+            lambda: run_scheduled('ocr', OCRService.extract, data['image'], document_type, page,
+                                  deadline=deadline),
+            deadline=deadline,
+            shareable=_is_complete_result,
+        )
+
+        response = jsonify({
             'success': True,
             'document_type':     result['document_type'],
             'extracted_data':    result['extracted_data'],
@@ -293,9 +715,16 @@ def extract_document_text():
             'checks_passed':     result['checks_passed'],
             'checks_failed':     result['checks_failed'],
             'ocr_confidence':    result['ocr_confidence'],
+            'text_source':       result['source'],
+            'cache_hit':         result['cache_hit'],
+            'partial':           result.get('partial', False),
             'processing_time_ms': result['processing_time_ms'],
             'timestamp': datetime.utcnow().isoformat()
         })
+        return _mark_coalesced(response, coalesced)
+
+    except DeadlineExceeded as e:
+        return _deadline_response(e)
 
     except RuntimeError as e:
         # Tesseract not installed or not found
@@ -352,14 +781,213 @@ def validate_document():
         }), 500
 
 
+# Fields validate_batch reads; anything else in a record is ignored
+BULK_STRING_FIELDS = ('full_name', 'document_number', 'date_of_birth', 'expiry_date')
+
+
+@app.route('/api/v1/ocr/validate/bulk', methods=['POST'])
+def validate_documents_bulk():
+    """
+    Validate many stored document records in one streaming request.
+
+    Request body: NDJSON — one JSON object per line, either the
+    extracted_data dict itself or {"id": ..., "extracted_data": {...}}.
+
+    Response body: NDJSON — one line per input line, in order:
+    {"line": n, "id": ..., "validation": {...}, "authenticity_score": ...}
+    or {"line": n, "error": "..."} for lines that could not be parsed or
+    whose full_name / document_number / date_of_birth / expiry_date is not
+    a string (null counts as absent).
+    Records are validated in batches of BULK_VALIDATE_BATCH_SIZE.
+    """
+    request.max_content_length = app.config['BULK_VALIDATE_MAX_BYTES']
+    batch_size = app.config['BULK_VALIDATE_BATCH_SIZE']
+
+    def flush(batch):
+        try:
+            results = OCRService.validate_batch([record for _, _, record in batch])
+        except Exception:
+            # One record the line checks missed must not cost the rest of the batch
+            logger.exception("Bulk validation batch failed; validating its records one by one")
+            results = None
+        for i, (line_no, record_id, record) in enumerate(batch):
+            if results is not None:
+                result = results[i]
+            else:
+                try:
+                    result = OCRService.validate_batch([record])[0]
+                except Exception as e:
+                    yield json.dumps({'line': line_no, 'id': record_id, 'error': f'Validation failed: {e}'}) + '\n'
+                    continue
+            yield json.dumps({
+                'line': line_no,
+                'id':   record_id,
+                'validation': {
+                    'is_valid':      result['is_valid'],
+                    'checks_passed': result['checks_passed'],
+                    'checks_failed': result['checks_failed'],
+                    'warnings':      result['warnings'],
+                },
+                'authenticity_score': result['authenticity_score'],
+            }) + '\n'
+
+    def generate():
+        batch = []
+        line_no = 0
+        for raw in request.stream:
+            line_no += 1
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+                if not isinstance(item, dict):
+                    raise ValueError('each line must be a JSON object')
+                record = item.get('extracted_data', item)  # accept flat or nested
+                if not isinstance(record, dict):
+                    raise ValueError('extracted_data must be an object')
+                for field in BULK_STRING_FIELDS:
+                    if record.get(field) is not None and not isinstance(record[field], str):
+                        raise ValueError(f'{field} must be a string')
+            except ValueError as e:
+                # Flush pending records first so output stays in input order
+                yield from flush(batch)
+                batch = []
+                yield json.dumps({'line': line_no, 'error': f'Invalid record: {e}'}) + '\n'
+                continue
+
+            batch.append((line_no, item.get('id'), record))
+            if len(batch) >= batch_size:
+                yield from flush(batch)
+                batch = []
+
+        if batch:
+            yield from flush(batch)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 # ===========================================
 # Combined Verification Endpoint
 # ===========================================
 
+def _parse_verification_payload(data: dict, allow_handle: bool = False) -> tuple:
+    """
+    Validate a /verify/complete style payload.  Returns (params, error_message).
+
+    With allow_handle, a `document_handle` from /verify/presubmit may stand in
+    for document_image (the handle itself is not part of params).
+    """
+    params = {
+        'document_image':  data.get('document_image'),
+        'selfie_image':    data.get('selfie_image'),
+        'liveness_frames': data.get('liveness_frames', []),
+        'challenge_type':  data.get('challenge_type', 'blink'),
+        'document_type':   data.get('document_type', 'auto'),
+    }
+
+    handle = data.get('document_handle') if allow_handle else None
+    if handle is not None and not isinstance(handle, str):
+        return None, 'document_handle must be a string'
+
+    has_document = params['document_image'] or handle
+    if not has_document or not params['selfie_image']:
+        if allow_handle:
+            return None, 'document_image (or document_handle) and selfie_image are required'
+        return None, 'document_image and selfie_image are required'
+
+    params['document_page'], error = _parse_page(data, 'document_page')
+    if error:
+        return None, error
+
+    params['fail_fast'], error = _parse_flag(data, 'fail_fast')
+    if error:
+        return None, error
+
+    return params, None
+
+
+@app.route('/api/v1/verify/presubmit', methods=['POST'])
+@admission_controlled((), 'document_image')
+def presubmit_document():
+    """
+    Hand the ID document over before the selfie/liveness steps.
+
+    Decode, quality assessment, OCR and document-face embedding start in
+    the background; pass the returned handle to /verify/complete as
+    `document_handle` and it only waits for whatever is still running.
+
+    Expected payload:
+    - document_image: Base64 encoded ID document image
+    - document_type:  'passport' | 'driving_license' | 'national_id' | 'auto'
+    - document_page:  (optional) 1-based page when document_image is a PDF
+    """
+    try:
+        data = request.get_json()
+
+        if not data or not data.get('document_image'):
+            return jsonify({'error': 'document_image is required'}), 400
+
+        document_page, error = _parse_page(data, 'document_page')
+        if error:
+            return jsonify({'error': error}), 400
+
+        try:
+            document = presubmit_store.submit(
+                data['document_image'], data.get('document_type', 'auto'), document_page,
+            )
+        except PresubmitFull as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            response.headers['Retry-After'] = os.getenv('ADMISSION_RETRY_AFTER', '2')
+            return response, 503
+
+        status_url = f'/api/v1/verify/presubmit/{document.handle}'
+        response = jsonify({
+            'success': True,
+            'document_handle': document.handle,
+            'status_url': status_url,
+            'expires_in_seconds': int(presubmit_store.ttl_seconds),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        response.headers['Location'] = status_url
+        return response, 202
+
+    except Exception as e:
+        logger.exception("Document pre-submission failed")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/v1/verify/presubmit/<handle>', methods=['GET'])
+def get_presubmitted_document(handle):
+    """Progress of a pre-submitted document; `document_quality` is filled in as soon as it is known."""
+    document = presubmit_store.get(handle)
+    if document is None:
+        return jsonify({
+            'success': False,
+            'error': 'Document handle not found (unknown id or expired)',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'document': document.status(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+
 @app.route('/api/v1/verify/complete', methods=['POST'])
+@admission_controlled(('face', 'liveness', 'ocr'), 'document_image', 'selfie_image', 'liveness_frames')
 def complete_verification():
     """
     Full verification pipeline: face match + liveness + OCR + validation.
+    Face, liveness and OCR run concurrently; per-stage timings are
+    reported in `stage_timings`.
 
     Expected payload:
     - document_image:   Base64 encoded ID document image
@@ -367,6 +995,12 @@ def complete_verification():
     - liveness_frames:  List of base64 encoded frames for liveness check
     - challenge_type:   'blink' | 'head_left' | 'head_right' | 'smile' | 'nod'
     - document_type:    'passport' | 'driving_license' | 'national_id' | 'auto'
+    - document_page:    (optional) 1-based page when document_image is a PDF
+    - fail_fast:        (optional, boolean) run stages cheapest-first and stop at the
+                        first decisive failure; skipped stages are reported
+    - document_handle:  (optional) handle from /verify/presubmit, instead of
+                        document_image (or alongside it, as a fallback for
+                        when the handle is unknown to this worker)
     """
     try:
         data = request.get_json()
@@ -374,107 +1008,124 @@ def complete_verification():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
-        document_image  = data.get('document_image')
-        selfie_image    = data.get('selfie_image')
-        liveness_frames = data.get('liveness_frames', [])
-        challenge_type  = data.get('challenge_type', 'blink')
-        document_type   = data.get('document_type', 'auto')
+        params, error = _parse_verification_payload(data, allow_handle=True)
+        if error:
+            return jsonify({'error': error}), 400
+
+        handle = data.get('document_handle')
+        document = presubmit_store.get(handle) if handle else None
+        if document is not None:
+            # The document's type and page were fixed when it was pre-submitted
+            params.update(document_type=document.document_type, document_page=document.page)
+        elif handle and not params['document_image']:
+            return jsonify({
+                'success': False,
+                'error': 'Document handle not found (unknown id or expired) — resend document_image',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 404
+        elif handle:
+            logger.info("Document handle unknown to this worker — processing document_image instead")
+            handle = None
+
+        deadline = _request_deadline()
+        result, coalesced = singleflight.do(
+            request_key('verify_complete', params, handle or ''),
+            lambda: run_complete_verification(**params, deadline=deadline, document=document),
+            deadline=deadline,
+            shareable=_is_complete_result,
+        )
+        return _mark_coalesced(jsonify(result), coalesced)
+
+    except DeadlineExceeded as e:
+        return _deadline_response(e)
 
-        if not document_image or not selfie_image:
-            return jsonify({'error': 'document_image and selfie_image are required'}), 400
+    except Exception as e:
+        logger.exception("Complete verification failed")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-        start = datetime.utcnow()
-        errors = []
 
-        # 1. Face verification
-        try:
-            face_result = FaceVerificationService.verify_faces(document_image, selfie_image)
-            face_passed = face_result['match']
-        except Exception as e:
-            face_result = {'match': False, 'confidence': 0, 'error': str(e)}
-            face_passed = False
-            errors.append(f'face_verification: {str(e)}')
-
-        # 2. Liveness detection
-        liveness_result = None
-        liveness_passed = False
-        if liveness_frames:
-            try:
-                liveness_result = LivenessDetectionService.detect(liveness_frames, challenge_type)
-                liveness_passed = liveness_result['is_live']
-            except Exception as e:
-                liveness_result = {'is_live': False, 'confidence': 0, 'error': str(e)}
-                errors.append(f'liveness_detection: {str(e)}')
-        else:
-            liveness_result = {'is_live': None, 'note': 'No frames provided — skipped'}
-            liveness_passed = True  # don't fail pipeline if caller skips liveness
-
-        # 3. OCR extraction
-        try:
-            ocr_result = OCRService.extract(document_image, document_type)
-            ocr_passed = len(ocr_result['extracted_data']) > 0
-        except Exception as e:
-            ocr_result = {'extracted_data': {}, 'error': str(e)}
-            ocr_passed = False
-            errors.append(f'ocr_extraction: {str(e)}')
-
-        # 4. Data validation
-        validation_result = None
-        if ocr_result.get('extracted_data'):
-            try:
-                validation_result = OCRService.validate(ocr_result['extracted_data'])
-                validation_passed = validation_result['is_valid']
-            except Exception as e:
-                validation_result = {'is_valid': False, 'error': str(e)}
-                validation_passed = False
-                errors.append(f'validation: {str(e)}')
-        else:
-            validation_result = {'is_valid': False, 'note': 'No extracted data to validate'}
-            validation_passed = False
-
-        overall_passed = face_passed and liveness_passed and ocr_passed
-        elapsed_ms = int((datetime.utcnow() - start).total_seconds() * 1000)
+# ===========================================
+# Asynchronous Verification Jobs
+# ===========================================
 
-        return jsonify({
+@app.route('/api/v1/verify/jobs', methods=['POST'])
+def submit_verification_job():
+    """
+    Queue a full verification and return immediately with a job id.
+
+    Expected payload: same as /api/v1/verify/complete, plus
+    - callback_url: (optional) http(s) URL that receives the finished job as JSON;
+      its host must be in JOB_CALLBACK_ALLOWED_HOSTS
+    """
+    try:
+        data = request.get_json()
+
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        params, error = _parse_verification_payload(data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        callback_url = data.get('callback_url')
+        if callback_url:
+            error = callback_error(callback_url) if isinstance(callback_url, str) else 'callback_url must be a string'
+            if error:
+                return jsonify({'error': error}), 400
+
+        try:
+            # Jobs default to the batch lane unless the caller asks otherwise
+            lane = request.headers.get('X-Priority', 'batch').lower()
+            job_id = get_job_queue().submit(params, callback_url, lane, _request_client_id())
+        except QueueFullError as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            response.headers['Retry-After'] = os.getenv('JOB_RETRY_AFTER_SECONDS', '5')
+            return response, 503
+
+        status_url = f'/api/v1/verify/jobs/{job_id}'
+        response = jsonify({
             'success': True,
-            'verification_id': f'ver_{start.strftime("%Y%m%d%H%M%S")}',
-            'overall_result': 'PASSED' if overall_passed else 'FAILED',
-            'results': {
-                'face_verification': {
-                    'passed':     face_passed,
-                    'confidence': face_result.get('confidence', 0),
-                    'match':      face_result.get('match', False),
-                },
-                'liveness_detection': {
-                    'passed':     liveness_passed,
-                    'confidence': liveness_result.get('confidence', None),
-                    'is_live':    liveness_result.get('is_live'),
-                },
-                'document_ocr': {
-                    'passed':        ocr_passed,
-                    'mrz_found':     ocr_result.get('mrz_found', False),
-                    'checks_passed': ocr_result.get('checks_passed', []),
-                    'checks_failed': ocr_result.get('checks_failed', []),
-                },
-                'document_validation': {
-                    'passed':             validation_passed,
-                    'authenticity_score': validation_result.get('authenticity_score', 0) if validation_result else 0,
-                }
-            },
-            'extracted_data': ocr_result.get('extracted_data', {}),
-            'errors': errors,
-            'processing_time_ms': elapsed_ms,
-            'timestamp': start.isoformat()
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url,
+            'timestamp': datetime.utcnow().isoformat()
         })
+        response.headers['Location'] = status_url
+        return response, 202
 
     except Exception as e:
-        logger.exception("Complete verification failed")
+        logger.exception("Job submission failed")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
+@app.route('/api/v1/verify/jobs/<job_id>', methods=['GET'])
+def get_verification_job(job_id):
+    """Poll a verification job.  `result` holds the /verify/complete body once it has succeeded."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found (unknown id or expired)',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job': job,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+
 # ===========================================
 # Error Handlers
 # ===========================================
@@ -531,11 +1182,13 @@ if __name__ == '__main__':
     ╚═══════════════════════════════════════════════╝
     """)
 
-    # Pre-load all models so the first real request is fast.
+    # Pre-load all models in the background so the first real request is
+    # fast without delaying the port bind; /health/ready reports progress.
     # Set WARMUP_MODELS=false to skip and load lazily instead.
     if os.getenv('WARMUP_MODELS', 'true').lower() == 'true':
-        FaceVerificationService.warmup()
-        LivenessDetectionService.warmup()
-        OCRService.warmup()
+        warmup.start_background()
+    else:
+        warmup.skip()
+    resume_orphaned_jobs()
 
     app.run(host='0.0.0.0', port=port, debug=debug)
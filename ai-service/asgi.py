@@ -0,0 +1,365 @@
+"""
+ASGI Entry Point
+================
+Async variant of the AI service:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+
+Routes and response bodies are exactly those of the Flask app — every
+request is still dispatched to its Flask view — but the I/O around the
+view is asynchronous:
+
+- Request bodies (up to 16MB of base64) are read on the event loop, so a
+  slow upload doesn't hold a thread.  Oversized bodies are refused with
+  413 before they are read in full.
+- The view then runs on a bounded thread pool for its engine (face,
+  liveness, ocr, pipeline, default).  A burst of OCR work can't take the
+  threads face requests need, and when an engine's pool and its queue are
+  full the request is refused at once with 503 + Retry-After.
+- Bulk validation streams both ways: its NDJSON body is fed to the view
+  as it arrives and result lines are relayed as they are produced.
+
+Configuration (env):
+- ASGI_FACE_THREADS / ASGI_LIVENESS_THREADS / ASGI_OCR_THREADS /
+  ASGI_PIPELINE_THREADS / ASGI_DEFAULT_THREADS: threads per engine pool (default: 4 / 4 / 4 / 4 / 8)
+- ASGI_QUEUE_LIMIT: requests allowed to wait per engine pool (default: 32)
+"""
+
+import io
+import os
+import sys
+import json
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+from services import warmup
+from services.job_queue import resume_orphaned_jobs
+
+logger = logging.getLogger(__name__)
+
+# First matching prefix wins
+ROUTE_ENGINES = (
+    ('/api/v1/face/',            'face'),
+    ('/api/v1/liveness/detect',  'liveness'),
+    ('/api/v1/ocr/extract',      'ocr'),
+    ('/api/v1/verify/complete',  'pipeline'),
+)
+STREAMING_PATHS = ('/api/v1/ocr/validate/bulk',)
+
+
+def _engine_for(path: str) -> str:
+    for prefix, engine in ROUTE_ENGINES:
+        if path.startswith(prefix):
+            return engine
+    return 'default'
+
+
+# -------------------------------------------------------
+# Bounded per-engine executors
+# -------------------------------------------------------
+
+class EnginePoolFull(Exception):
+    """Raised when an engine pool's threads and queue are all taken."""
+
+
+class EngineExecutor:
+    """Thread pool for one engine with a cap on running + waiting requests."""
+
+    def __init__(self, engine: str, threads: int, queue_limit: int):
+        self.engine = engine
+        self.threads = threads
+        self.limit = threads + queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f'asgi-{engine}')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        """Schedule `fn` on the pool.  Raises EnginePoolFull right away if there is no room."""
+        with self._lock:
+            if self._in_flight >= self.limit:
+                self._rejected += 1
+                raise EnginePoolFull(f'{self.engine} pool is full ({self.limit} requests in flight)')
+            self._in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'threads': self.threads, 'limit': self.limit,
+                    'in_flight': self._in_flight, 'rejected': self._rejected}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_queue_limit = int(os.getenv('ASGI_QUEUE_LIMIT', 32))
+executors = {
+    engine: EngineExecutor(engine, int(os.getenv(f'ASGI_{engine.upper()}_THREADS', default)), _queue_limit)
+    for engine, default in (('face', 4), ('liveness', 4), ('ocr', 4), ('pipeline', 4), ('default', 8))
+}
+
+
+def executor_stats() -> dict:
+    """Per-engine pool usage; the Flask /status view reports it as `asgi_executors`."""
+    return {engine: executor.stats() for engine, executor in executors.items()}
+
+
+# -------------------------------------------------------
+# ASGI ↔ WSGI plumbing
+# -------------------------------------------------------
+
+class _Disconnected(Exception):
+    pass
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class _BadContentLength(Exception):
+    pass
+
+
+def _declared_length(scope: dict) -> int:
+    """The request's Content-Length, or None when it has none."""
+    declared = dict(scope.get('headers', [])).get(b'content-length')
+    if declared is None:
+        return None
+    try:
+        length = int(declared)
+    except ValueError:
+        raise _BadContentLength()
+    if length < 0:
+        raise _BadContentLength()
+    return length
+
+
+class _ReceiveStream(io.RawIOBase):
+    """Blocking file object for a worker thread, fed by the event loop's receive()."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                raise _Disconnected()
+            self._buffer += message.get('body', b'')
+            self._done = not message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+async def _read_body(receive, limit: int) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise _Disconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit and size > limit:
+            raise _TooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def _build_environ(scope: dict, body_stream, content_length: int = None) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD':    scope['method'],
+        'SCRIPT_NAME':       scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO':         scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING':      scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME':       server[0],
+        'SERVER_PORT':       str(server[1]),
+        'SERVER_PROTOCOL':   f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR':       client[0] if client else '',
+        'wsgi.version':      (1, 0),
+        'wsgi.url_scheme':   scope.get('scheme', 'http'),
+        'wsgi.input':        body_stream,
+        'wsgi.errors':       sys.stderr,
+        'wsgi.multithread':  True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once':     False,
+        # Lets /status report the engine pools without importing this module
+        'verifyx.asgi_executors': executor_stats,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+
+    if content_length is not None:
+        environ['CONTENT_LENGTH'] = str(content_length)
+    else:
+        # Streamed body of unknown length: read until the client is done
+        environ['wsgi.input_terminated'] = True
+    return environ
+
+
+def _call_flask(environ: dict):
+    """Run the Flask app; returns (status, headers, body iterable)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+        return lambda data: None
+
+    body = flask_app(environ, start_response)
+    return started['status'], started['headers'], body
+
+
+def _call_flask_buffered(environ: dict):
+    status, headers, body = _call_flask(environ)
+    try:
+        return status, headers, b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def _encode_headers(headers: list) -> list:
+    return [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+
+async def _send_json(send, status: int, payload: dict, extra_headers: list = ()):
+    body = json.dumps(payload).encode()
+    headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))] + list(extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': _encode_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# -------------------------------------------------------
+# Request handling
+# -------------------------------------------------------
+
+async def _handle_buffered(scope, receive, send, engine: str):
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    declared = _declared_length(scope)
+    try:
+        if declared is not None and limit and declared > limit:
+            raise _TooLarge()
+        body = await _read_body(receive, limit)
+    except _TooLarge:
+        await _send_json(send, 413, {
+            'error': 'Request Entity Too Large',
+            'message': f'Request body exceeds {limit} bytes',
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        return
+
+    environ = _build_environ(scope, io.BytesIO(body), len(body))
+    status, headers, payload = await executors[engine].submit(_call_flask_buffered, environ)
+    await send({'type': 'http.response.start', 'status': status, 'headers': _encode_headers(headers)})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _handle_streaming(scope, receive, send, engine: str):
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=16)
+    done = object()
+
+    def produce(environ):
+        # Runs on the engine pool: consume the view's iterator, hand chunks to the loop
+        try:
+            status, headers, body = _call_flask(environ)
+            asyncio.run_coroutine_threadsafe(chunks.put((status, headers)), loop).result()
+            try:
+                for chunk in body:
+                    if chunk:
+                        asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            asyncio.run_coroutine_threadsafe(chunks.put(done), loop).result()
+
+    stream = io.BufferedReader(_ReceiveStream(receive, loop))
+    environ = _build_environ(scope, stream, _declared_length(scope))
+    producer = executors[engine].submit(produce, environ)
+
+    started = False
+    while True:
+        item = await chunks.get()
+        if item is done:
+            break
+        if not started:
+            status, headers = item
+            await send({'type': 'http.response.start', 'status': status, 'headers': _encode_headers(headers)})
+            started = True
+        else:
+            await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+    await producer  # surfaces errors raised while streaming
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if os.getenv('WARMUP_MODELS', 'true').lower() == 'true':
+                warmup.start_background()
+            else:
+                warmup.skip()
+            resume_orphaned_jobs()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for executor in executors.values():
+                executor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    engine = _engine_for(scope['path'])
+    try:
+        if scope['path'] in STREAMING_PATHS:
+            await _handle_streaming(scope, receive, send, engine)
+        else:
+            await _handle_buffered(scope, receive, send, engine)
+    except _BadContentLength:
+        await _send_json(send, 400, {
+            'error': 'Bad Request',
+            'message': 'Malformed Content-Length header',
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except EnginePoolFull as e:
+        await _send_json(send, 503, {
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }, [('Retry-After', os.getenv('ADMISSION_RETRY_AFTER', '2'))])
+    except _Disconnected:
+        logger.debug(f"Client disconnected during {scope['path']}")
@@ -0,0 +1 @@
+"""Offline benchmarks for the AI service (run from ai-service/ with python -m benchmarks.<name>)."""
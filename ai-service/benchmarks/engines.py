@@ -0,0 +1,334 @@
+"""
+Engine Benchmarks
+=================
+Times the hot functions of all three engines on the synthetic fixtures
+(benchmarks/fixtures.py) across image sizes, and writes JSON that can be
+compared between commits.
+
+    python -m benchmarks.engines --json bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.engines --engines ocr --iterations 10 --memory
+    python -m benchmarks.engines --json new.json --compare old.json --threshold 10
+
+Cases (variant = image size, or liveness scenario and frame size):
+
+- decode:   face and OCR `_decode_base64_image`
+- ocr:      `_assess_quality`, `_preprocess_for_ocr`, `OCRService.extract`
+            (result cache cleared before every call; `correct` reports
+            whether the MRZ fields came back as rendered)
+- liveness: `LivenessDetectionService.detect` per scenario and frame size
+- face:     `FaceVerificationService.verify_faces` per vendored pair and size
+
+Each case reports wall-time statistics and the calling thread's CPU time;
+work done in the OCR process pool or Tesseract subprocesses shows up in
+wall time only.  --memory adds one extra call under tracemalloc and
+reports its allocation peak.  An engine whose dependencies are missing
+(OpenCV, Tesseract, DeepFace) is reported as skipped, not failed.
+
+Missing face fixtures are not skipped quietly: without a vendored
+`<name>_a/_b` pair (see benchmarks/fixtures.py) there is nothing to time
+for `face`, and the liveness frames fall back to a drawn face that the
+OpenCV detector is unlikely to find — `detect` would be timed on its
+no-face path.  Running `face` or `liveness` then exits with status 2
+unless --allow-missing-faces is given, in which case `face` is skipped
+and the report records `sprite: drawn`.
+
+--compare prints the p50 change of every case present in both files and
+exits with status 1 when any case is slower by more than --threshold
+percent.  Missing fixtures are generated first.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from benchmarks import fixtures
+
+ENGINES = ('decode', 'ocr', 'liveness', 'face')
+
+
+class MissingFixture(Exception):
+    """Raised when the fixtures can't exercise a requested engine's real code path."""
+
+
+LIVENESS_CHALLENGES = {'still': 'blink', 'blink': 'blink', 'head_left': 'head_left', 'nod': 'nod'}
+
+
+def _b64(img: Image.Image, fmt: str = 'JPEG') -> str:
+    buf = BytesIO()
+    if fmt == 'JPEG':
+        img.convert('RGB').save(buf, fmt, quality=92)
+    else:
+        img.save(buf, fmt)
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def _resize_to_width(img: Image.Image, width: int) -> Image.Image:
+    if width >= img.width:
+        return img
+    return img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+
+
+def _measure(fn, iterations: int, warmup: int, memory: bool) -> dict:
+    """Wall and thread-CPU statistics of `iterations` calls to `fn` (after `warmup` calls)."""
+    for _ in range(warmup):
+        fn()
+    wall, cpu = [], []
+    for _ in range(iterations):
+        cpu_start, start = time.thread_time(), time.perf_counter()
+        fn()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.thread_time() - cpu_start)
+
+    ms = np.array(wall) * 1000
+    row = {
+        'iterations': iterations,
+        'mean_ms':    round(float(ms.mean()), 2),
+        'p50_ms':     round(float(np.percentile(ms, 50)), 2),
+        'p95_ms':     round(float(np.percentile(ms, 95)), 2),
+        'min_ms':     round(float(ms.min()), 2),
+        'max_ms':     round(float(ms.max()), 2),
+        'cpu_ms':     round(float(np.mean(cpu)) * 1000, 2),
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            row['alloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return row
+
+
+# -------------------------------------------------------
+# Cases
+# -------------------------------------------------------
+
+def _passports(fixture_dir: str, manifest: dict) -> list:
+    """[(variant, PIL image, base64 PNG)] for every generated passport size."""
+    out = []
+    for doc in manifest['passport']['documents']:
+        img = Image.open(os.path.join(fixture_dir, doc['file'])).convert('RGB')
+        out.append((f"{doc['width']}x{doc['height']}", img, _b64(img, 'PNG')))
+    return out
+
+
+def decode_cases(fixture_dir: str, manifest: dict, sizes: list) -> list:
+    from services import face_verification, ocr_service
+
+    cases = []
+    for variant, _, b64 in _passports(fixture_dir, manifest):
+        cases.append(('face._decode_base64_image', variant, lambda b64=b64: face_verification._decode_base64_image(b64)))
+        cases.append(('ocr._decode_base64_image', variant, lambda b64=b64: ocr_service._decode_base64_image(b64)))
+    return cases
+
+
+def ocr_cases(fixture_dir: str, manifest: dict, sizes: list) -> list:
+    from services.ocr_service import OCRService, _assess_quality, _get_tesseract, _preprocess_for_ocr
+
+    _get_tesseract()  # skip the engine here, not halfway through, when Tesseract is missing
+    expected = manifest['passport']['fields']
+
+    def extract(b64):
+        OCRService._cache.clear()
+        return OCRService.extract(b64, 'passport')
+
+    def check(result):
+        data = result.get('extracted_data', {})
+        return data.get('document_number') == expected['document_number'] and not result.get('checks_failed')
+
+    cases = []
+    for variant, img, b64 in _passports(fixture_dir, manifest):
+        cases.append(('ocr._assess_quality', variant, lambda img=img: _assess_quality(img)))
+        cases.append(('ocr._preprocess_for_ocr', variant, lambda img=img: _preprocess_for_ocr(img)))
+        cases.append(('OCRService.extract', variant, lambda b64=b64: extract(b64), check))
+    return cases
+
+
+def liveness_cases(fixture_dir: str, manifest: dict, sizes: list, frame_sizes: list) -> list:
+    from services.liveness_detection import LivenessDetectionService
+
+    LivenessDetectionService.warmup()
+    cases = []
+    for seq in manifest['liveness']:
+        seq_dir = os.path.join(fixture_dir, seq['dir'])
+        frames = [Image.open(os.path.join(seq_dir, f['file'])).convert('RGB') for f in seq['frames']]
+        challenge = LIVENESS_CHALLENGES[seq['scenario']]
+        for width in frame_sizes:
+            frames_b64 = [_b64(f.resize((width, round(f.height * width / f.width)))) for f in frames]
+            variant = f"{seq['scenario']}/{width}x{round(frames[0].height * width / frames[0].width)}"
+            cases.append(('LivenessDetectionService.detect', variant,
+                          lambda fb=frames_b64, ch=challenge: LivenessDetectionService.detect(fb, ch)))
+    return cases
+
+
+def face_cases(fixture_dir: str, manifest: dict, sizes: list) -> list:
+    from services.face_verification import FaceVerificationService
+
+    if not manifest['faces']:
+        raise RuntimeError(f'no vendored face pairs (<name>_a/_b images in {fixtures.DEFAULT_FACES})')
+    FaceVerificationService.warmup()
+    cases = []
+    for pair in manifest['faces']:
+        a, b = Image.open(pair['a']).convert('RGB'), Image.open(pair['b']).convert('RGB')
+        for width in sizes:
+            a_b64, b_b64 = _b64(_resize_to_width(a, width)), _b64(_resize_to_width(b, width))
+            cases.append(('FaceVerificationService.verify_faces', f"{pair['name']}/{min(width, a.width)}w",
+                          lambda a_b64=a_b64, b_b64=b_b64: FaceVerificationService.verify_faces(a_b64, b_b64),
+                          lambda result: bool(result.get('match'))))
+    return cases
+
+
+# -------------------------------------------------------
+# Running and comparing
+# -------------------------------------------------------
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(fixture_dir: str, engines=ENGINES, sizes=None, frame_sizes=(320, 640, 1280),
+        iterations: int = 5, warmup: int = 1, memory: bool = False,
+        allow_missing_faces: bool = False) -> dict:
+    """
+    Benchmark `engines` on the fixtures in `fixture_dir` and return the report.
+
+    Raises:
+        MissingFixture if `face` or `liveness` is requested without vendored
+        face pairs and allow_missing_faces is false
+    """
+    manifest_path = os.path.join(fixture_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print(f"No fixtures in {fixture_dir} — generating them")
+        fixtures.generate(fixture_dir)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if sizes:
+        manifest['passport']['documents'] = [d for d in manifest['passport']['documents'] if d['width'] in sizes]
+    sizes = sizes or [d['width'] for d in manifest['passport']['documents']]
+
+    needs_faces = sorted({'face', 'liveness'} & set(engines))
+    if needs_faces and not manifest['faces']:
+        message = (f"no vendored face pairs (<name>_a/_b images in {fixtures.DEFAULT_FACES}, then "
+                   f"regenerate the fixtures): {', '.join(needs_faces)} would not time real faces")
+        if not allow_missing_faces:
+            raise MissingFixture(message)
+        print(f"WARNING: {message}")
+
+    builders = {
+        'decode':   lambda: decode_cases(fixture_dir, manifest, sizes),
+        'ocr':      lambda: ocr_cases(fixture_dir, manifest, sizes),
+        'liveness': lambda: liveness_cases(fixture_dir, manifest, sizes, frame_sizes),
+        'face':     lambda: face_cases(fixture_dir, manifest, sizes),
+    }
+    results, skipped = [], {}
+    for engine in engines:
+        try:
+            cases = builders[engine]()
+        except Exception as e:
+            skipped[engine] = f'{type(e).__name__}: {e}'
+            print(f"  {engine:<9} skipped — {skipped[engine]}")
+            continue
+
+        for name, variant, fn, *check in cases:
+            outcome, timed = {}, fn
+            if check:
+                # A correctness flag alongside the timing — a faster wrong answer is a regression too
+                def timed(fn=fn, check=check[0], outcome=outcome):
+                    outcome['correct'] = bool(check(fn()))
+            try:
+                row = _measure(timed, iterations, warmup, memory)
+            except Exception as e:
+                row = {'error': f'{type(e).__name__}: {e}'}
+            row = {'engine': engine, 'case': name, 'variant': variant, **row, **outcome}
+            results.append(row)
+            summary = row.get('error') or (
+                f"p50 {row['p50_ms']:>9.2f}ms  p95 {row['p95_ms']:>9.2f}ms  cpu {row['cpu_ms']:>9.2f}ms"
+                + (f"  correct={row['correct']}" if 'correct' in row else '')
+            )
+            print(f"  {name:<38} {variant:<22} {summary}")
+
+    return {
+        'commit':     _commit(),
+        'timestamp':  time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python':     platform.python_version(),
+        'platform':   platform.platform(),
+        'cores':      os.cpu_count(),
+        'config':     {'engines': list(engines), 'sizes': sizes, 'frame_sizes': list(frame_sizes),
+                       'iterations': iterations, 'warmup': warmup, 'memory': memory},
+        'sprite':     manifest['sprite'],
+        'results':    results,
+        'skipped':    skipped,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float) -> list:
+    """Cases slower in `new` than in `old` by more than `threshold` percent (p50)."""
+    before = {(r['case'], r['variant']): r for r in old['results'] if 'p50_ms' in r}
+    regressions = []
+    print(f"\nComparing with {old.get('commit') or 'baseline'} (p50, threshold {threshold:g}%)")
+    for row in new['results']:
+        base = before.get((row['case'], row['variant']))
+        if base is None or 'p50_ms' not in row or not base['p50_ms']:
+            continue
+        change = (row['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100
+        flag = 'REGRESSION' if change > threshold else ''
+        print(f"  {row['case']:<38} {row['variant']:<22} {base['p50_ms']:>9.2f} -> {row['p50_ms']:>9.2f}ms "
+              f"{change:>+7.1f}%  {flag}")
+        if flag:
+            regressions.append({**row, 'baseline_p50_ms': base['p50_ms'], 'change_percent': round(change, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Engine benchmarks on synthetic fixtures')
+    parser.add_argument('--fixtures', default=fixtures.DEFAULT_OUT, help='fixture directory (generated if missing)')
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"comma-separated subset of {','.join(ENGINES)}")
+    parser.add_argument('--sizes', help='passport / face widths to run (default: every generated size)')
+    parser.add_argument('--frame-sizes', default='320,640,1280', help='liveness frame widths')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1, help='untimed calls before each case')
+    parser.add_argument('--memory', action='store_true', help='also record each case\'s tracemalloc peak')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    parser.add_argument('--threshold', type=float, default=10, help='p50 slowdown (percent) counted as a regression')
+    parser.add_argument('--allow-missing-faces', action='store_true',
+                        help='run without vendored face pairs (face skipped, liveness on a drawn face)')
+    args = parser.parse_args()
+
+    try:
+        report = run(
+            args.fixtures,
+            engines=[e for e in args.engines.split(',') if e],
+            sizes=[int(s) for s in args.sizes.split(',')] if args.sizes else None,
+            frame_sizes=[int(s) for s in args.frame_sizes.split(',')],
+            iterations=args.iterations, warmup=args.warmup, memory=args.memory,
+            allow_missing_faces=args.allow_missing_faces,
+        )
+    except MissingFixture as e:
+        parser.error(f'{e} (pass --allow-missing-faces to run anyway)')
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(json.load(f), report, args.threshold)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Benchmark Fixtures
+==================
+Synthetic inputs for the engine benchmarks (benchmarks/engines.py),
+generated offline so runs are reproducible across machines and commits.
+
+    python -m benchmarks.fixtures
+    python -m benchmarks.fixtures --out /tmp/fixtures --sizes 640,1280,2480
+
+Writes to --out (default: benchmarks/fixtures/generated/):
+
+- passport_<width>.png — a TD3 passport data page with rendered MRZ lines
+  whose check digits are valid, at each width.
+- liveness_<scenario>/frame_NN.jpg — frame sequences with controlled
+  motion: `still` (a photo held up), `blink` (eyes closed in frames 4-6),
+  `head_left` (the face drifts sideways) and `nod`.
+- manifest.json — what each fixture contains (MRZ lines, expected fields,
+  motion per frame) and the face pairs found.
+
+Face pairs come from locally vendored images, never generated: put
+`<name>_a.jpg` and `<name>_b.jpg` (the same person; any of .jpg/.jpeg/.png)
+in benchmarks/fixtures/faces/ or pass --faces.  None are committed —
+face photos need a licence that allows redistribution — so add your own
+before benchmarking.  The liveness frames use the first vendored face as
+their sprite when there is one, and a drawn face otherwise; the drawn face
+is unlikely to pass the OpenCV detector, so benchmarks/engines.py refuses
+to time `face` or `liveness` without a pair (see --allow-missing-faces).
+"""
+
+import os
+import glob
+import json
+import argparse
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from services.ocr_service import _mrz_checksum
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT = os.path.join(HERE, 'fixtures', 'generated')
+DEFAULT_FACES = os.path.join(HERE, 'fixtures', 'faces')
+DEFAULT_SIZES = (640, 1280, 2480)
+
+# ID-3 page at 300 DPI: 125 x 88 mm
+PAGE_SIZE = (1476, 1039)
+FRAME_SIZE = (640, 480)
+FRAMES = 10
+
+PASSPORT = {
+    'issuing_country': 'UTO',
+    'surname':         'ERIKSSON',
+    'given_names':     'ANNA MARIA',
+    'document_number': 'L898902C3',
+    'nationality':     'UTO',
+    'date_of_birth':   '740812',
+    'gender':          'F',
+    'expiry_date':     '320415',
+    'personal_number': 'ZE184226B',
+}
+
+
+# -------------------------------------------------------
+# Passports
+# -------------------------------------------------------
+
+def mrz_lines(p: dict = PASSPORT) -> tuple:
+    """TD3 MRZ (two lines of 44 characters) for `p`, with valid check digits."""
+    name = f"{p['surname']}<<{p['given_names'].replace(' ', '<')}"
+    line1 = f"P<{p['issuing_country']}{name}".ljust(44, '<')[:44]
+
+    number = p['document_number'].ljust(9, '<')
+    personal = p['personal_number'].ljust(14, '<')
+    line2 = (
+        f"{number}{_mrz_checksum(number)}"
+        f"{p['nationality']}"
+        f"{p['date_of_birth']}{_mrz_checksum(p['date_of_birth'])}"
+        f"{p['gender']}"
+        f"{p['expiry_date']}{_mrz_checksum(p['expiry_date'])}"
+        f"{personal}{_mrz_checksum(personal)}"
+    )
+    composite = line2[0:10] + line2[13:20] + line2[21:43]
+    return line1, line2 + str(_mrz_checksum(composite))
+
+
+def _font(size: int, mono: bool = False):
+    names = ('DejaVuSansMono.ttf', 'LiberationMono-Regular.ttf') if mono else ('DejaVuSans.ttf', 'LiberationSans-Regular.ttf')
+    for name in names:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def passport_page(face: Image.Image = None) -> Image.Image:
+    """A passport data page at PAGE_SIZE with a photo, printed fields and the MRZ."""
+    w, h = PAGE_SIZE
+    img = Image.new('RGB', PAGE_SIZE, (236, 232, 218))
+    draw = ImageDraw.Draw(img)
+
+    # Guilloche-like background so quality/thresholding have texture to deal with
+    for i in range(0, w, 24):
+        draw.line([(i, 0), (i + 200, h)], fill=(226, 220, 204), width=2)
+
+    photo_box = (60, 150, 460, 660)
+    if face is not None:
+        img.paste(face.convert('RGB').resize((photo_box[2] - photo_box[0], photo_box[3] - photo_box[1])),
+                  photo_box[:2])
+    else:
+        _draw_face(draw, photo_box, eyes_open=True)
+
+    label, value = _font(28), _font(40)
+    draw.text((60, 50), 'PASSPORT  /  PASSEPORT', font=_font(48), fill=(40, 40, 90))
+    fields = [
+        ('Surname', PASSPORT['surname']),
+        ('Given names', PASSPORT['given_names']),
+        ('Nationality', PASSPORT['nationality']),
+        ('Date of birth', PASSPORT['date_of_birth']),
+        ('Sex', PASSPORT['gender']),
+        ('Date of expiry', PASSPORT['expiry_date']),
+        ('Passport No.', PASSPORT['document_number']),
+    ]
+    for i, (name, text) in enumerate(fields):
+        y = 150 + i * 72
+        draw.text((520, y), name, font=label, fill=(90, 90, 90))
+        draw.text((520, y + 28), text, font=value, fill=(10, 10, 10))
+
+    # MRZ zone: white band, two monospace lines
+    mrz_font = _font(52, mono=True)
+    draw.rectangle((0, h - 230, w, h), fill=(250, 250, 250))
+    for i, line in enumerate(mrz_lines()):
+        draw.text((40, h - 200 + i * 90), line, font=mrz_font, fill=(0, 0, 0))
+    return img
+
+
+# -------------------------------------------------------
+# Liveness frames
+# -------------------------------------------------------
+
+def _draw_face(draw: ImageDraw.ImageDraw, box: tuple, eyes_open: bool):
+    x0, y0, x1, y1 = box
+    fw, fh = x1 - x0, y1 - y0
+    draw.ellipse(box, fill=(224, 182, 150), outline=(120, 80, 60), width=3)
+    for ex in (0.3, 0.7):
+        cx, cy = x0 + fw * ex, y0 + fh * 0.4
+        rx, ry = fw * 0.09, fh * 0.05
+        if eyes_open:
+            draw.ellipse((cx - rx, cy - ry, cx + rx, cy + ry), fill=(255, 255, 255), outline=(40, 30, 20), width=2)
+            draw.ellipse((cx - rx / 2.5, cy - ry / 1.2, cx + rx / 2.5, cy + ry / 1.2), fill=(50, 35, 25))
+        else:
+            draw.line((cx - rx, cy, cx + rx, cy), fill=(40, 30, 20), width=4)
+    draw.line((x0 + fw * 0.5, y0 + fh * 0.45, x0 + fw * 0.46, y0 + fh * 0.62), fill=(150, 100, 80), width=3)
+    draw.arc((x0 + fw * 0.33, y0 + fh * 0.62, x0 + fw * 0.67, y0 + fh * 0.8), 20, 160, fill=(140, 60, 60), width=4)
+
+
+def _close_eyes(face: Image.Image) -> Image.Image:
+    """Approximate closed eyes on a face photo: smear the eye band with skin tone."""
+    face = face.copy()
+    w, h = face.size
+    band = (int(w * 0.18), int(h * 0.33), int(w * 0.82), int(h * 0.47))
+    skin = face.crop((int(w * 0.4), int(h * 0.55), int(w * 0.6), int(h * 0.65))).resize((1, 1)).getpixel((0, 0))
+    eyes = Image.new('RGB', (band[2] - band[0], band[3] - band[1]), skin).filter(ImageFilter.GaussianBlur(3))
+    face.paste(eyes, band[:2])
+    return face
+
+
+# offset of the face centre per frame, as fractions of the frame size
+SCENARIOS = {
+    'still':     lambda i: (0.0, 0.0),
+    'blink':     lambda i: (0.004 * (i % 2), 0.0),
+    'head_left': lambda i: (-0.03 * i, 0.0),
+    'nod':       lambda i: (0.0, 0.03 * (i if i < FRAMES // 2 else FRAMES - 1 - i)),
+}
+BLINK_FRAMES = (4, 5, 6)
+
+
+def liveness_frames(scenario: str, face: Image.Image = None) -> list:
+    """FRAMES frames of `scenario`, each with its face offset and eye state."""
+    fw, fh = FRAME_SIZE
+    size = (int(fh * 0.45), int(fh * 0.6))
+    frames = []
+    for i in range(FRAMES):
+        dx, dy = SCENARIOS[scenario](i)
+        eyes_open = not (scenario == 'blink' and i in BLINK_FRAMES)
+        x0 = int(fw / 2 - size[0] / 2 + dx * fw)
+        y0 = int(fh / 2 - size[1] / 2 + dy * fh)
+
+        img = Image.new('RGB', FRAME_SIZE, (96, 110, 124))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((0, int(fh * 0.75), fw, fh), fill=(70, 70, 80))  # desk / shoulders
+        if face is not None:
+            sprite = face.convert('RGB').resize(size)
+            img.paste(sprite if eyes_open else _close_eyes(sprite), (x0, y0))
+        else:
+            _draw_face(draw, (x0, y0, x0 + size[0], y0 + size[1]), eyes_open)
+        frames.append((img, {'dx': round(dx, 4), 'dy': round(dy, 4), 'eyes_open': eyes_open}))
+    return frames
+
+
+# -------------------------------------------------------
+# Faces
+# -------------------------------------------------------
+
+def face_pairs(faces_dir: str) -> list:
+    """[(name, path_a, path_b)] for every `<name>_a.*` with a matching `<name>_b.*`."""
+    pairs = []
+    for a in sorted(glob.glob(os.path.join(faces_dir, '*_a.*'))):
+        stem = os.path.basename(a).rsplit('_a.', 1)[0]
+        b = next(iter(sorted(glob.glob(os.path.join(faces_dir, f'{stem}_b.*')))), None)
+        if b is not None and a.lower().endswith(('.jpg', '.jpeg', '.png')):
+            pairs.append((stem, a, b))
+    return pairs
+
+
+def generate(out_dir: str, sizes=DEFAULT_SIZES, faces_dir: str = DEFAULT_FACES) -> dict:
+    """Write every fixture to `out_dir` and return the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    pairs = face_pairs(faces_dir)
+    sprite = Image.open(pairs[0][1]) if pairs else None
+
+    page = passport_page(sprite)
+    passports = []
+    for width in sizes:
+        height = round(page.height * width / page.width)
+        path = os.path.join(out_dir, f'passport_{width}.png')
+        page.resize((width, height), Image.LANCZOS).save(path)
+        passports.append({'file': os.path.basename(path), 'width': width, 'height': height})
+
+    liveness = []
+    for scenario in SCENARIOS:
+        scenario_dir = os.path.join(out_dir, f'liveness_{scenario}')
+        os.makedirs(scenario_dir, exist_ok=True)
+        frames = []
+        for i, (img, meta) in enumerate(liveness_frames(scenario, sprite)):
+            name = f'frame_{i:02d}.jpg'
+            img.save(os.path.join(scenario_dir, name), quality=90)
+            frames.append({'file': name, **meta})
+        liveness.append({'scenario': scenario, 'dir': os.path.basename(scenario_dir), 'frames': frames})
+
+    manifest = {
+        'passport': {
+            'fields':    PASSPORT,
+            'mrz':       list(mrz_lines()),
+            'documents': passports,
+        },
+        'liveness': liveness,
+        'faces': [{'name': n, 'a': a, 'b': b} for n, a, b in pairs],
+        'sprite': 'vendored' if sprite is not None else 'drawn',
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic benchmark fixtures')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma-separated passport image widths')
+    parser.add_argument('--faces', default=DEFAULT_FACES, help='directory of vendored <name>_a/_b face images')
+    args = parser.parse_args()
+
+    manifest = generate(args.out, [int(s) for s in args.sizes.split(',')], args.faces)
+    if not manifest['faces']:
+        print(f"WARNING: no face pairs in {args.faces} — face benchmarks can't run and "
+              f"liveness frames use a drawn face")
+    print(f"Wrote {len(manifest['passport']['documents'])} passports, "
+          f"{len(manifest['liveness'])} liveness sequences and {len(manifest['faces'])} face pairs "
+          f"({manifest['sprite']} liveness sprite) to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
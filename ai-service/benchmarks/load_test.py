@@ -0,0 +1,504 @@
+"""
+Load Test
+=========
+Drives the Flask app with a configurable mix of requests and reports
+throughput, latency percentiles, error rates and where it saturates.
+
+    # in-process, engines stubbed: pure serving overhead
+    python -m benchmarks.load_test --stub-engines ocr=150,liveness=90,face=250 --rates 5,10,20,40
+
+    # a running server (gunicorn / uvicorn), OCR-heavy, fixed rate
+    python -m benchmarks.load_test --url http://localhost:5001 --workload ocr_heavy --rate 8 --duration 60
+
+    # replay a recorded trace at twice its speed
+    python -m benchmarks.load_test --url http://localhost:5001 --trace prod.jsonl --speed 2
+
+Load:
+- --rate / --rates: open-loop arrivals (Poisson, or --arrival uniform) at
+  that many requests/second, sent by up to --concurrency threads.
+  Latency is measured from the scheduled arrival, so time spent queued
+  behind a saturated server counts.  --rates runs one step per rate.
+- Without a rate: closed loop, --concurrency threads back to back.
+- --trace: replay a JSON-lines trace of `{"t": seconds, "endpoint": path,
+  "bytes": request size}`.  Each request gets the fixture closest to its
+  size (a passport width, or a number of liveness frames).
+  --record-trace writes the generated schedule in the same format.
+
+Workloads (--workload, or --mix ocr=3,face=1,...): ocr_heavy,
+liveness_heavy, complete, mixed; kinds are ocr, liveness, face and
+complete (/verify/complete with document, selfie and liveness frames).
+Every request carries a unique image (a random JPEG comment), so the OCR
+cache and request coalescing only kick in with --repeat-payloads.
+
+--stub-engines (in-process only) replaces OCR, liveness, face verification
+and document quality with sleeps of the given milliseconds (± --stub-jitter)
+returning canned results.
+
+A step counts as saturated when it completes less than 90% of the offered
+rate, its error rate exceeds --max-error-rate, or its p99 exceeds
+--slo-ms.  Inputs come from the benchmark fixtures (benchmarks/fixtures.py),
+generated when missing.
+"""
+
+import os
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from io import BytesIO
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from benchmarks import fixtures
+
+ENDPOINTS = {
+    'ocr':      '/api/v1/ocr/extract',
+    'liveness': '/api/v1/liveness/detect',
+    'face':     '/api/v1/face/verify',
+    'complete': '/api/v1/verify/complete',
+}
+WORKLOADS = {
+    'ocr_heavy':      {'ocr': 0.7, 'complete': 0.2, 'liveness': 0.1},
+    'liveness_heavy': {'liveness': 0.7, 'complete': 0.2, 'ocr': 0.1},
+    'complete':       {'complete': 1.0},
+    'mixed':          {'ocr': 0.3, 'liveness': 0.3, 'face': 0.2, 'complete': 0.2},
+}
+SATURATION_THROUGHPUT = 0.9
+
+
+# -------------------------------------------------------
+# Payloads
+# -------------------------------------------------------
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buf = BytesIO()
+    img.convert('RGB').save(buf, 'JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def _unique(jpeg: bytes) -> bytes:
+    """The same image with a random COM segment, so no two requests hash alike."""
+    tag = os.urandom(16)
+    return jpeg[:2] + b'\xff\xfe' + (len(tag) + 2).to_bytes(2, 'big') + tag + jpeg[2:]
+
+
+class Payloads:
+    """Request bodies built from the benchmark fixtures."""
+
+    def __init__(self, fixture_dir: str, widths: list = None, frames: int = 10, repeat: bool = False):
+        manifest_path = os.path.join(fixture_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            print(f"No fixtures in {fixture_dir} — generating them")
+            fixtures.generate(fixture_dir)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        self.repeat = repeat
+        self.frames = frames
+        self.documents = [
+            _jpeg(Image.open(os.path.join(fixture_dir, d['file'])))
+            for d in manifest['passport']['documents'] if not widths or d['width'] in widths
+        ]
+        seq = next(s for s in manifest['liveness'] if s['scenario'] == 'blink')
+        self.frame_pool = [_jpeg(Image.open(os.path.join(fixture_dir, seq['dir'], f['file'])))
+                           for f in seq['frames']]
+        if manifest['faces']:
+            self.selfie = _jpeg(Image.open(manifest['faces'][0]['b']))
+        else:
+            self.selfie = self.frame_pool[0]
+
+    def _b64(self, jpeg: bytes) -> str:
+        return base64.b64encode(jpeg if self.repeat else _unique(jpeg)).decode()
+
+    def _document(self, nbytes: int = None) -> bytes:
+        if nbytes is None:
+            return random.choice(self.documents)
+        return min(self.documents, key=lambda d: abs(len(d) * 4 / 3 - nbytes))
+
+    def _frames(self, nbytes: int = None) -> list:
+        count = self.frames
+        if nbytes is not None:
+            per_frame = np.mean([len(f) for f in self.frame_pool]) * 4 / 3
+            count = int(min(60, max(3, round(nbytes / per_frame))))
+        return [self._b64(self.frame_pool[i % len(self.frame_pool)]) for i in range(count)]
+
+    def body(self, kind: str, nbytes: int = None) -> dict:
+        """JSON body for a `kind` request, sized after `nbytes` when replaying a trace."""
+        if kind == 'ocr':
+            return {'image': self._b64(self._document(nbytes)), 'document_type': 'passport'}
+        if kind == 'liveness':
+            return {'frames': self._frames(nbytes), 'challenge_type': 'blink'}
+        if kind == 'face':
+            return {'document_image': self._b64(self._document(nbytes)), 'selfie_image': self._b64(self.selfie)}
+        if kind == 'complete':
+            return {
+                'document_image':  self._b64(self._document(nbytes)),
+                'selfie_image':    self._b64(self.selfie),
+                'liveness_frames': self._frames(),
+                'document_type':   'passport',
+            }
+        raise ValueError(f'Unknown request kind: {kind}')
+
+
+# -------------------------------------------------------
+# Targets
+# -------------------------------------------------------
+
+class InProcessTarget:
+    """The Flask app in this process, through its test client (one per thread)."""
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path: str, data: bytes) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post(path, data=data, content_type='application/json').status_code
+
+
+class HTTPTarget:
+    """A running server, one keep-alive session per thread."""
+
+    def __init__(self, url: str, timeout: float):
+        import requests
+        self._requests = requests
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path: str, data: bytes) -> int:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.post(self.url + path, data=data, timeout=self.timeout,
+                                headers={'Content-Type': 'application/json'})
+        return response.status_code
+
+
+def stub_engines(latencies_ms: dict, jitter: float):
+    """Replace the engines with sleeps returning canned results (in-process runs only)."""
+    from services.face_verification import FaceVerificationService
+    from services.liveness_detection import LivenessDetectionService
+    from services.ocr_service import OCRService
+
+    def pause(engine):
+        ms = latencies_ms.get(engine, 0)
+        if ms:
+            time.sleep(max(0.0, random.gauss(ms, ms * jitter)) / 1000)
+
+    def extract(cls, image_b64, document_type='auto', page=1, deadline=None):
+        pause('ocr')
+        return {
+            'document_type': document_type, 'extracted_data': dict(fixtures.PASSPORT), 'confidence_scores': {},
+            'mrz_found': True, 'checks_passed': ['document_number_checksum'], 'checks_failed': [],
+            'quality': {'score': 0.9, 'issues': []}, 'ocr_confidence': 0.9, 'source': 'stub',
+            'cache_hit': False, 'processing_time_ms': latencies_ms.get('ocr', 0),
+        }
+
+    def assess_quality(cls, image_b64, page=1, deadline=None):
+        pause('quality')
+        return {'score': 0.9, 'issues': []}
+
+    def detect(cls, frames_b64, challenge_type='blink', deadline=None):
+        pause('liveness')
+        return {
+            'is_live': True, 'confidence': 0.9, 'challenge_completed': True, 'challenge_type': challenge_type,
+            'anti_spoofing': {'is_real_face': True, 'confidence': 0.95, 'spoof_type_detected': None},
+            'frames_analyzed': len(frames_b64), 'frames_with_face': len(frames_b64),
+            'frames_skipped': 0, 'partial': False, 'processing_time_ms': latencies_ms.get('liveness', 0),
+        }
+
+    def verify_faces(cls, document_image_b64, selfie_image_b64, document_page=1, deadline=None):
+        pause('face')
+        return {'match': True, 'confidence': 0.9, 'threshold': 0.68, 'model': 'stub',
+                'distance_metric': 'cosine', 'processing_time_ms': latencies_ms.get('face', 0)}
+
+    OCRService.extract = classmethod(extract)
+    OCRService.assess_quality = classmethod(assess_quality)
+    LivenessDetectionService.detect = classmethod(detect)
+    FaceVerificationService.verify_faces = classmethod(verify_faces)
+
+
+# -------------------------------------------------------
+# Running
+# -------------------------------------------------------
+
+class Runner:
+    """Sends scheduled requests and records their outcome."""
+
+    def __init__(self, target, payloads: Payloads, concurrency: int, client_timeout: float):
+        self.target = target
+        self.payloads = payloads
+        self.concurrency = concurrency
+        self.client_timeout = client_timeout
+
+    def _send(self, kind: str, nbytes: int, scheduled: float, records: list):
+        wait = time.perf_counter() - scheduled
+        record = {'kind': kind, 'wait_ms': round(wait * 1000, 2)}
+        if wait > self.client_timeout:
+            # Queued in the client longer than any caller would wait: not worth sending
+            record.update(status='client_timeout', latency_ms=round(wait * 1000, 2))
+            records.append(record)
+            return
+        data = json.dumps(self.payloads.body(kind, nbytes)).encode()
+        record['bytes'] = len(data)
+        start = time.perf_counter()
+        try:
+            record['status'] = self.target.post(ENDPOINTS[kind], data)
+        except Exception as e:
+            record['status'] = f'error:{type(e).__name__}'
+        # Body building is client work — leave it out, keep the queueing before it
+        record['latency_ms'] = round((wait + time.perf_counter() - start) * 1000, 2)
+        records.append(record)
+
+    def open_loop(self, schedule: list) -> tuple:
+        """Send `schedule` ([(offset_seconds, kind, bytes or None)]) at its offsets."""
+        records = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='load') as pool:
+            began = time.perf_counter()
+            for offset, kind, nbytes in schedule:
+                delay = began + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, kind, nbytes, began + offset, records)
+        return records, time.perf_counter() - began
+
+    def closed_loop(self, mix: dict, duration: float) -> tuple:
+        """`concurrency` threads sending back to back for `duration` seconds."""
+        records = []
+        began = time.perf_counter()
+        stop_at = began + duration
+
+        def loop():
+            while time.perf_counter() < stop_at:
+                self._send(pick_kind(mix), None, time.perf_counter(), records)
+
+        threads = [threading.Thread(target=loop, name=f'load-{i}') for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return records, time.perf_counter() - began
+
+
+def pick_kind(mix: dict) -> str:
+    return random.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def arrivals(mix: dict, rate: float, duration: float, process: str = 'poisson') -> list:
+    """Open-loop schedule: [(offset_seconds, kind, None)] at `rate` requests/second."""
+    schedule, t = [], 0.0
+    while True:
+        t += random.expovariate(rate) if process == 'poisson' else 1 / rate
+        if t >= duration:
+            return schedule
+        schedule.append((t, pick_kind(mix), None))
+
+
+def load_trace(path: str, speed: float = 1.0) -> list:
+    """Schedule from a JSON-lines trace of {"t", "endpoint", "bytes"}; unknown endpoints are skipped."""
+    kinds = {endpoint: kind for kind, endpoint in ENDPOINTS.items()}
+    schedule, skipped = [], Counter()
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            kind = kinds.get(entry['endpoint'])
+            if kind is None:
+                skipped[entry['endpoint']] += 1
+                continue
+            schedule.append((float(entry['t']), kind, entry.get('bytes')))
+    if skipped:
+        print(f"Trace: skipped endpoints {dict(skipped)}")
+    schedule.sort(key=lambda s: s[0])
+    start = schedule[0][0] if schedule else 0.0
+    return [((t - start) / speed, kind, nbytes) for t, kind, nbytes in schedule]
+
+
+def write_trace(path: str, schedule: list, payloads: Payloads):
+    with open(path, 'w') as f:
+        for t, kind, nbytes in schedule:
+            size = nbytes or len(json.dumps(payloads.body(kind)))
+            f.write(json.dumps({'t': round(t, 4), 'endpoint': ENDPOINTS[kind], 'bytes': size}) + '\n')
+
+
+# -------------------------------------------------------
+# Reporting
+# -------------------------------------------------------
+
+def _percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    ms = np.array(latencies)
+    return {f'p{p}_ms': round(float(np.percentile(ms, p)), 1) for p in (50, 95, 99)}
+
+
+def summarize(records: list, elapsed: float) -> dict:
+    """Throughput, latency percentiles (successful requests) and errors of one run."""
+    ok = [r for r in records if isinstance(r['status'], int) and r['status'] < 400]
+    errors = Counter(str(r['status']) for r in records if r not in ok)
+    return {
+        'requests':       len(records),
+        'ok':             len(ok),
+        'errors':         dict(errors),
+        'error_rate':     round(1 - len(ok) / len(records), 4) if records else 0.0,
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'mean_wait_ms':   round(float(np.mean([r['wait_ms'] for r in records])), 1) if records else None,
+        **_percentiles([r['latency_ms'] for r in ok]),
+    }
+
+
+def report_step(records: list, elapsed: float, offered_rate: float = None) -> dict:
+    by_kind = defaultdict(list)
+    for r in records:
+        by_kind[r['kind']].append(r)
+    step = {
+        'offered_rps': offered_rate,
+        'elapsed_s':   round(elapsed, 2),
+        **summarize(records, elapsed),
+        'endpoints':   {ENDPOINTS[k]: summarize(rs, elapsed) for k, rs in sorted(by_kind.items())},
+    }
+    return step
+
+
+def saturation_reason(step: dict, max_error_rate: float, slo_ms: float = None) -> str:
+    """Why `step` counts as saturated, or None."""
+    if step['offered_rps'] and step['throughput_rps'] < SATURATION_THROUGHPUT * step['offered_rps']:
+        return f"throughput {step['throughput_rps']} < {SATURATION_THROUGHPUT:.0%} of offered {step['offered_rps']}"
+    if step['error_rate'] > max_error_rate:
+        return f"error rate {step['error_rate']:.2%} > {max_error_rate:.2%}"
+    if slo_ms is not None and step['p99_ms'] is not None and step['p99_ms'] > slo_ms:
+        return f"p99 {step['p99_ms']}ms > SLO {slo_ms}ms"
+    return None
+
+
+def _print_step(step: dict):
+    offered = f"{step['offered_rps']:>7.2f}" if step['offered_rps'] else ' closed'
+    print(f"  offered {offered} rps  done {step['throughput_rps']:>7.2f} rps  "
+          f"p50 {step['p50_ms']}ms  p95 {step['p95_ms']}ms  p99 {step['p99_ms']}ms  "
+          f"errors {step['error_rate']:.2%} {step['errors'] or ''}")
+    for endpoint, s in step['endpoints'].items():
+        print(f"      {endpoint:<26} {s['requests']:>6} req  p50 {s['p50_ms']}ms  p99 {s['p99_ms']}ms  "
+              f"errors {s['error_rate']:.2%}")
+
+
+def parse_pairs(spec: str, cast=float) -> dict:
+    pairs = {}
+    for item in filter(None, spec.split(',')):
+        name, value = item.split('=')
+        pairs[name.strip()] = cast(value)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the AI service')
+    parser.add_argument('--url', help='server to test (default: the Flask app in this process)')
+    parser.add_argument('--workload', choices=sorted(WORKLOADS), default='mixed')
+    parser.add_argument('--mix', help='custom request mix, e.g. ocr=3,liveness=1,face=1,complete=1')
+    parser.add_argument('--rate', type=float, help='open-loop arrival rate (requests/second)')
+    parser.add_argument('--rates', help='comma-separated rates, one step each (saturation sweep)')
+    parser.add_argument('--arrival', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per step')
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads')
+    parser.add_argument('--trace', help='JSON-lines trace to replay instead of generated arrivals')
+    parser.add_argument('--speed', type=float, default=1.0, help='trace replay speed-up')
+    parser.add_argument('--record-trace', help='write the generated schedule as a trace')
+    parser.add_argument('--fixtures', default=fixtures.DEFAULT_OUT)
+    parser.add_argument('--sizes', help='passport widths to send (default: all generated)')
+    parser.add_argument('--frames', type=int, default=10, help='liveness frames per request')
+    parser.add_argument('--repeat-payloads', action='store_true', help='send identical images (cache/coalescing hits)')
+    parser.add_argument('--stub-engines', help='in-process only: engine latencies in ms, e.g. ocr=150,liveness=90,face=250,quality=5')
+    parser.add_argument('--stub-jitter', type=float, default=0.2, help='relative standard deviation of stub latencies')
+    parser.add_argument('--warmup-requests', type=int, default=1, help='untimed requests of each kind first')
+    parser.add_argument('--client-timeout', type=float, default=60, help='seconds a request may wait client-side or for a response')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--slo-ms', type=float, help='p99 above this counts as saturated')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mix = parse_pairs(args.mix) if args.mix else WORKLOADS[args.workload]
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        if args.stub_engines:
+            parser.error('--stub-engines only applies to in-process runs (no --url)')
+        target = HTTPTarget(args.url, args.client_timeout)
+    else:
+        if args.stub_engines:
+            stub_engines(parse_pairs(args.stub_engines), args.stub_jitter)
+        target = InProcessTarget()
+
+    payloads = Payloads(args.fixtures, [int(s) for s in args.sizes.split(',')] if args.sizes else None,
+                        args.frames, args.repeat_payloads)
+    runner = Runner(target, payloads, args.concurrency, args.client_timeout)
+
+    if args.warmup_requests:
+        warm = [(0.0, kind, None) for kind in mix for _ in range(args.warmup_requests)]
+        records, _ = runner.open_loop(warm)
+        failed = Counter(str(r['status']) for r in records if not (isinstance(r['status'], int) and r['status'] < 400))
+        print(f"Warm-up: {len(records)} requests" + (f", failures {dict(failed)}" if failed else ''))
+
+    steps = []
+    if args.trace:
+        schedule = load_trace(args.trace, args.speed)
+        print(f"Replaying {len(schedule)} requests from {args.trace} at {args.speed:g}x")
+        records, elapsed = runner.open_loop(schedule)
+        offered = round(len(schedule) / max(schedule[-1][0], 1e-9), 2) if schedule else None
+        steps.append(report_step(records, elapsed, offered))
+        _print_step(steps[-1])
+    elif args.rate or args.rates:
+        rates = [args.rate] if args.rate else [float(r) for r in args.rates.split(',')]
+        recorded = []
+        for i, rate in enumerate(rates):
+            schedule = arrivals(mix, rate, args.duration, args.arrival)
+            recorded += [(t + i * args.duration, kind, nbytes) for t, kind, nbytes in schedule]
+            records, elapsed = runner.open_loop(schedule)
+            steps.append(report_step(records, elapsed, rate))
+            _print_step(steps[-1])
+        if args.record_trace:
+            write_trace(args.record_trace, recorded, payloads)
+    else:
+        print(f"Closed loop: {args.concurrency} clients for {args.duration:g}s")
+        records, elapsed = runner.closed_loop(mix, args.duration)
+        steps.append(report_step(records, elapsed))
+        _print_step(steps[-1])
+
+    saturation = None
+    for step in steps:
+        step['saturated'] = saturation_reason(step, args.max_error_rate, args.slo_ms)
+        if step['saturated'] and saturation is None:
+            saturation = {'offered_rps': step['offered_rps'], 'reason': step['saturated']}
+    sustained = [s['offered_rps'] for s in steps if s['offered_rps'] and not s['saturated']]
+    if saturation:
+        print(f"Saturated at {saturation['offered_rps']} rps: {saturation['reason']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'target':            args.url or 'in-process',
+                'mix':               mix,
+                'stub_engines':      parse_pairs(args.stub_engines) if args.stub_engines else None,
+                'concurrency':       args.concurrency,
+                'timestamp':         time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'steps':             steps,
+                'saturation':        saturation,
+                'max_sustained_rps': max(sustained) if sustained else None,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
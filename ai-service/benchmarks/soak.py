@@ -0,0 +1,336 @@
+"""
+Soak Test
+=========
+Tens of thousands of mixed requests through the Flask app in this process,
+watching memory for growth that does not level off.
+
+    python -m benchmarks.soak --requests 50000 --json soak.json
+    python -m benchmarks.soak --stub-engines ocr=5,liveness=5,face=5 --per-kind
+
+Every --sample-every requests (after a garbage collection) it records the
+process RSS, the memory traced by tracemalloc and the size-like counters
+of /status (cache entries and bytes, live handles, queue depths).  After
+the first --warmup requests — caches filling, allocator arenas growing —
+a straight line is fitted through the samples; the test fails (exit
+status 1) when RSS or traced memory grows by more than
+--max-growth-kb-per-1k per thousand requests.
+
+The report points at the leaking stage:
+- the allocation sites that grew most between the end of warm-up and the
+  last sample, each attributed to the innermost services/ function on its
+  traceback (e.g. `ocr_service._preprocess_for_ocr`);
+- /status counters that kept growing;
+- with --per-kind, one extra phase per request kind (ocr, liveness, face,
+  complete) with its own growth rate, so the leaking endpoint stands out;
+  a kind over the limit fails the run too (`per_kind:<kind>` in `failed`).
+
+RSS growth without matching traced growth is native memory (OpenCV,
+TensorFlow, Tesseract) that tracemalloc cannot see; --per-kind still
+narrows it down to an engine.  Engines can be stubbed (--stub-engines) to
+soak the serving layer alone.  tracemalloc slows allocation down, so
+throughput here is not representative — use benchmarks/load_test.py for that.
+"""
+
+import gc
+import os
+import ast
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import fixtures
+from benchmarks.load_test import (
+    ENDPOINTS, WORKLOADS, InProcessTarget, Payloads, Runner, parse_pairs, pick_kind, stub_engines,
+)
+from services.usage import rss_bytes
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'services')
+
+# /status leaves that measure how much something holds (not how often it happened)
+_SIZE_KEYS = ('entries', 'bytes', 'handles', 'queue_depth', 'pending', 'waiting', 'in_flight', 'jobs')
+
+
+def _status_sizes(status: dict, prefix: str = '') -> dict:
+    """Numeric size-like leaves of /status, flattened to dotted keys."""
+    sizes = {}
+    for key, value in status.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            sizes.update(_status_sizes(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(_SIZE_KEYS):
+            sizes[path] = value
+    return sizes
+
+
+def _function_names(filename: str) -> dict:
+    """{line: enclosing function} for a source file."""
+    try:
+        with open(filename) as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return {}
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            # ast.walk is breadth-first, so nested functions overwrite their parent's lines
+            for line in range(node.lineno, (node.end_lineno or node.lineno) + 1):
+                names[line] = node.name
+    return names
+
+
+_functions = {}
+
+
+def stage_of(traceback) -> str:
+    """Innermost services/ function on an allocation traceback, e.g. 'ocr_service._preprocess_for_ocr'."""
+    for frame in reversed(traceback):
+        if frame.filename.startswith(SERVICES_DIR):
+            module = os.path.splitext(os.path.relpath(frame.filename, SERVICES_DIR))[0].replace(os.sep, '.')
+            if frame.filename not in _functions:
+                _functions[frame.filename] = _function_names(frame.filename)
+            function = _functions[frame.filename].get(frame.lineno)
+            return f'{module}.{function}' if function else f'{module}:{frame.lineno}'
+    return 'outside services/'
+
+
+def _slope_per_1k(samples: list, key: str) -> float:
+    """Least-squares growth of samples[key] per 1000 requests."""
+    if len(samples) < 2:
+        return 0.0
+    x = np.array([s['requests'] for s in samples], dtype=float)
+    y = np.array([s[key] for s in samples], dtype=float)
+    return float(np.polyfit(x, y, 1)[0] * 1000)
+
+
+class Tally:
+    """Outcome counts of the requests sent — a list of records would itself look like a leak."""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.kinds = Counter()
+        self._lock = threading.Lock()
+
+    def append(self, record: dict):
+        with self._lock:
+            self.statuses[str(record['status'])] += 1
+            self.kinds[record['kind']] += 1
+
+    def summary(self) -> dict:
+        total = sum(self.statuses.values())
+        ok = sum(n for status, n in self.statuses.items() if status.isdigit() and int(status) < 400)
+        return {
+            'requests':   total,
+            'by_kind':    dict(self.kinds),
+            'statuses':   dict(self.statuses),
+            'error_rate': round(1 - ok / total, 4) if total else 0.0,
+        }
+
+
+class Soak:
+    """Closed-loop requests in batches, with a memory sample after each batch."""
+
+    def __init__(self, target, payloads: Payloads, concurrency: int, trace_frames: int):
+        self.runner = Runner(target, payloads, concurrency, client_timeout=float('inf'))
+        self.concurrency = concurrency
+        self.client = target.app.test_client()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(trace_frames)
+
+    def sample(self, requests: int, started: float) -> dict:
+        gc.collect()
+        status = self.client.get('/status').get_json()
+        return {
+            'requests':     requests,
+            'elapsed_s':    round(time.perf_counter() - started, 1),
+            'rss_bytes':    rss_bytes(),
+            'traced_bytes': tracemalloc.get_traced_memory()[0],
+            'status':       _status_sizes(status),
+        }
+
+    def run(self, mix: dict, total: int, sample_every: int, on_sample=None) -> tuple:
+        """Send `total` requests drawn from `mix`.  Returns (samples, Tally)."""
+        records, samples = Tally(), []
+        started = time.perf_counter()
+        samples.append(self.sample(0, started))
+
+        def send(_):
+            self.runner._send(pick_kind(mix), None, time.perf_counter(), records)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='soak') as pool:
+            done = 0
+            while done < total:
+                batch = min(sample_every, total - done)
+                # Sampling between batches sees a quiet process: no request half-way through
+                list(pool.map(send, range(batch)))
+                done += batch
+                samples.append(self.sample(done, started))
+                if on_sample:
+                    on_sample(samples[-1])
+        return samples, records
+
+
+# -------------------------------------------------------
+# Analysis
+# -------------------------------------------------------
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, os.path.join(BENCHMARKS_DIR, '*')),
+    ))
+
+
+def top_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int) -> tuple:
+    """(stages, sites): allocation growth grouped by services/ function, and the biggest sites."""
+    stats = [s for s in after.compare_to(before, 'traceback') if s.size_diff > 0]
+    stages = defaultdict(lambda: {'size_diff_bytes': 0, 'count_diff': 0})
+    for stat in stats:
+        stage = stages[stage_of(stat.traceback)]
+        stage['size_diff_bytes'] += stat.size_diff
+        stage['count_diff'] += stat.count_diff
+    stages = sorted(({'stage': name, **v} for name, v in stages.items()),
+                    key=lambda s: s['size_diff_bytes'], reverse=True)[:top]
+    sites = [{
+        'stage':           stage_of(stat.traceback),
+        'size_diff_bytes': stat.size_diff,
+        'count_diff':      stat.count_diff,
+        'traceback':       [f'{f.filename}:{f.lineno}' for f in reversed(stat.traceback)][:6],
+    } for stat in stats[:top]]
+    return stages, sites
+
+
+def growing_counters(before: dict, after: dict) -> dict:
+    """/status size counters that are larger at the end than after warm-up."""
+    return {key: {'after_warmup': before.get(key, 0), 'final': value}
+            for key, value in after.items() if value > before.get(key, 0)}
+
+
+def growth(samples: list, warmup: int) -> dict:
+    steady = [s for s in samples if s['requests'] >= warmup]
+    return {
+        'samples':              len(steady),
+        'rss_per_1k_bytes':     round(_slope_per_1k(steady, 'rss_bytes')),
+        'traced_per_1k_bytes':  round(_slope_per_1k(steady, 'traced_bytes')),
+    }
+
+
+def _print_sample(sample: dict):
+    print(f"  {sample['requests']:>7} req  {sample['elapsed_s']:>7.1f}s  "
+          f"rss {sample['rss_bytes'] / 2**20:>8.1f} MiB  traced {sample['traced_bytes'] / 2**20:>8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test with memory-growth detection')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sample-every', type=int, default=1000, help='requests between memory samples')
+    parser.add_argument('--warmup', type=int, default=2000, help='requests left out of the growth fit')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workload', choices=sorted(WORKLOADS), default='mixed')
+    parser.add_argument('--mix', help='custom request mix, e.g. ocr=3,liveness=1')
+    parser.add_argument('--max-growth-kb-per-1k', type=float, default=256,
+                        help='fail when RSS or traced memory grows faster than this (KiB per 1000 requests)')
+    parser.add_argument('--per-kind', action='store_true', help='then soak each request kind on its own')
+    parser.add_argument('--per-kind-requests', type=int, default=5000)
+    parser.add_argument('--trace-frames', type=int, default=10, help='tracemalloc traceback depth')
+    parser.add_argument('--top', type=int, default=10, help='allocation sites / stages to report')
+    parser.add_argument('--stub-engines', help='engine latencies in ms, e.g. ocr=5,liveness=5,face=5')
+    parser.add_argument('--stub-jitter', type=float, default=0.0)
+    parser.add_argument('--fixtures', default=fixtures.DEFAULT_OUT)
+    parser.add_argument('--sizes', help='passport widths to send (default: all generated)')
+    parser.add_argument('--frames', type=int, default=10, help='liveness frames per request')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    mix = parse_pairs(args.mix) if args.mix else WORKLOADS[args.workload]
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+    if args.stub_engines:
+        stub_engines(parse_pairs(args.stub_engines), args.stub_jitter)
+
+    payloads = Payloads(args.fixtures, [int(s) for s in args.sizes.split(',')] if args.sizes else None,
+                        args.frames)
+    soak = Soak(InProcessTarget(), payloads, args.concurrency, args.trace_frames)
+    threshold = args.max_growth_kb_per_1k * 1024
+
+    print(f"Soak: {args.requests} requests of {mix}, {args.concurrency} threads, "
+          f"sample every {args.sample_every}, warm-up {args.warmup}")
+    baseline = {}
+
+    def on_sample(sample):
+        _print_sample(sample)
+        if 'snapshot' not in baseline and sample['requests'] >= args.warmup:
+            baseline['snapshot'] = take_snapshot()
+            baseline['status'] = sample['status']
+
+    samples, tally = soak.run(mix, args.requests, args.sample_every, on_sample)
+    if 'snapshot' not in baseline:
+        parser.error('--warmup must be smaller than --requests')
+
+    result = growth(samples, args.warmup)
+    stages, sites = top_growth(baseline['snapshot'], take_snapshot(), args.top)
+    counters = growing_counters(baseline['status'], samples[-1]['status'])
+    failed = [key for key in ('rss_per_1k_bytes', 'traced_per_1k_bytes') if result[key] > threshold]
+
+    print(f"\nGrowth per 1k requests: RSS {result['rss_per_1k_bytes'] / 1024:+.1f} KiB, "
+          f"traced {result['traced_per_1k_bytes'] / 1024:+.1f} KiB (limit {args.max_growth_kb_per_1k:g} KiB)")
+    print("Top growing stages since warm-up:")
+    for s in stages:
+        print(f"  {s['stage']:<52} {s['size_diff_bytes'] / 1024:>+10.1f} KiB  {s['count_diff']:>+8} blocks")
+    if counters:
+        print(f"Growing /status counters: {counters}")
+
+    per_kind = {}
+    if args.per_kind:
+        print("\nPer-kind phases:")
+        for kind in mix:
+            kind_samples, _ = soak.run({kind: 1.0}, args.per_kind_requests, args.sample_every)
+            kind_growth = growth(kind_samples, args.sample_every)  # first batch warms the kind's own paths
+            kind_growth['leaking'] = max(kind_growth['rss_per_1k_bytes'], kind_growth['traced_per_1k_bytes']) > threshold
+            per_kind[kind] = kind_growth
+            if kind_growth['leaking']:
+                failed.append(f'per_kind:{kind}')
+            print(f"  {kind:<9} RSS {kind_growth['rss_per_1k_bytes'] / 1024:+8.1f} KiB/1k  "
+                  f"traced {kind_growth['traced_per_1k_bytes'] / 1024:+8.1f} KiB/1k"
+                  + ('  LEAKING' if kind_growth['leaking'] else ''))
+
+    requests = tally.summary()
+    if requests['error_rate'] > 0.5:
+        print(f"Warning: {requests['error_rate']:.0%} of requests failed ({requests['statuses']}) — "
+              f"the soak mostly exercised error paths")
+    verdict = 'fail' if failed else 'pass'
+    print(f"\nSoak {verdict.upper()}" + (f": {', '.join(failed)} above the limit" if failed else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'timestamp':       time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'config':          {k: v for k, v in vars(args).items() if k != 'json'},
+                'mix':             mix,
+                'verdict':         verdict,
+                'failed':          failed,
+                'growth':          result,
+                'requests':        requests,
+                'top_stages':      stages,
+                'top_sites':       sites,
+                'growing_status':  counters,
+                'per_kind':        per_kind,
+                'samples':         samples,
+            }, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
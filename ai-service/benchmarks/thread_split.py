@@ -0,0 +1,182 @@
+"""
+Thread Split Benchmark
+======================
+Throughput of one engine under different worker × thread splits of this
+machine's cores (see services/thread_budget.py).
+
+    python -m benchmarks.thread_split --engine liveness --splits 4x1,2x2,1x4
+    python -m benchmarks.thread_split --engine face --duration 20 --json split.json
+
+Without --splits, tries 1, 2, 4, ... workers, each with cores // workers threads.
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+
+import numpy as np
+
+from services.thread_budget import DERIVED_ENV, compute_budget, cores
+
+
+# -------------------------------------------------------
+# Workloads
+# -------------------------------------------------------
+
+def _workload(engine: str):
+    """Return a zero-argument function doing one unit of `engine` work."""
+    if engine == 'face':
+        from services.face_verification import FaceVerificationService, _embed_batch, _get_face_model
+        FaceVerificationService.warmup()
+        h, w = _get_face_model().input_shape
+        batch = np.random.rand(1, h, w, 3).astype(np.float32)
+        return lambda: _embed_batch(batch)
+
+    if engine == 'liveness':
+        from services.liveness_detection import _load_cascades
+        face_cascade, _ = _load_cascades()
+        frame = (np.random.rand(480, 640) * 255).astype(np.uint8)
+        return lambda: face_cascade.detectMultiScale(frame, 1.1, 5)
+
+    if engine == 'ocr':
+        from PIL import Image, ImageDraw
+        from services.ocr_service import _get_tesseract
+        tess = _get_tesseract()
+        img = Image.new('L', (1000, 300), 255)
+        draw = ImageDraw.Draw(img)
+        for i in range(6):
+            draw.text((20, 20 + i * 45), 'P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<', fill=0)
+        return lambda: tess.image_to_string(img, config='--psm 6')
+
+    raise ValueError(f'Unknown engine: {engine}')
+
+
+def _benchmark_worker(engine: str, duration: float, concurrency: int, results):
+    try:
+        work = _workload(engine)
+        work()  # first call pays for lazy initialisation
+    except Exception as e:
+        results.put(f'{type(e).__name__}: {e}')
+        return
+
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def loop():
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            work()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put(latencies)
+
+
+# -------------------------------------------------------
+# Splits
+# -------------------------------------------------------
+
+def benchmark(engine: str, splits: list, duration: float = 10, concurrency: int = 2) -> list:
+    """
+    Measure throughput of `engine` under each (workers, threads) split.
+
+    Every split runs `workers` processes, each with `threads` threads for
+    TensorFlow intra-op, OpenCV and Tesseract, and `concurrency` request
+    threads, all at the same time — like that many gunicorn workers.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    report = []
+    for workers, threads in splits:
+        env = {
+            'THREAD_BUDGET_WORKERS': str(workers),
+            'TF_INTRA_OP_THREADS':   str(threads),
+            'CV2_THREADS':           str(threads),
+            'TESSERACT_OMP_THREADS': str(threads),
+        }
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_benchmark_worker, args=(engine, duration, concurrency, results))
+            for _ in range(workers)
+        ]
+        # Children compute their own budget from the environment they inherit
+        saved = dict(os.environ)
+        try:
+            for name in DERIVED_ENV:
+                os.environ.pop(name, None)
+            os.environ.update(env)
+            for p in procs:
+                p.start()
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+        latencies, errors = [], []
+        for _ in procs:
+            result = results.get()
+            if isinstance(result, str):
+                errors.append(result)
+            else:
+                latencies.extend(result)
+        for p in procs:
+            p.join()
+        if errors:
+            raise RuntimeError(f'{engine} benchmark worker failed: {errors[0]}')
+
+        ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        row = {
+            'workers':        workers,
+            'threads':        threads,
+            'ops':            len(latencies),
+            'ops_per_second': round(len(latencies) / duration, 2),
+            'p50_ms':         round(float(np.percentile(ms, 50)), 1),
+            'p95_ms':         round(float(np.percentile(ms, 95)), 1),
+            'p99_ms':         round(float(np.percentile(ms, 99)), 1),
+        }
+        report.append(row)
+        print(f"{workers:>3} workers x {threads:>2} threads: {row['ops_per_second']:>8} ops/s  "
+              f"p50 {row['p50_ms']:>7}ms  p95 {row['p95_ms']:>7}ms  p99 {row['p99_ms']:>7}ms")
+    return report
+
+
+def default_splits() -> list:
+    available = cores()
+    splits, workers = [], 1
+    while workers <= available:
+        splits.append((workers, max(1, available // workers)))
+        workers *= 2
+    return splits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Thread budget split benchmark')
+    parser.add_argument('--engine', choices=('face', 'liveness', 'ocr'), default='liveness')
+    parser.add_argument('--splits', help='comma-separated WORKERSxTHREADS, e.g. 4x1,2x2,1x4')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per split')
+    parser.add_argument('--concurrency', type=int, default=2, help='request threads per worker')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    splits = (
+        [tuple(int(n) for n in s.lower().split('x')) for s in args.splits.split(',')]
+        if args.splits else default_splits()
+    )
+    cores = compute_budget()['cores']
+    print(f"Benchmarking {args.engine} on {cores} cores, {args.duration:g}s per split")
+    report = benchmark(args.engine, splits, args.duration, args.concurrency)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'engine': args.engine, 'cores': cores, 'splits': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Gunicorn Configuration
+======================
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master and the engines are warmed there once,
+before any worker is forked, so workers share those pages copy-on-write
+instead of each loading models on its first user request.  After the fork
+every worker rebuilds its thread/process pools and loads whatever could
+not be shared (see services/warmup.py); /health/ready answers 503 until
+that has finished.
+
+Configuration (env):
+- PORT:              listen port (default: 8000)
+- GUNICORN_WORKERS:  worker processes (default: 2)
+- GUNICORN_THREADS:  threads per worker (default: 4)
+- GUNICORN_TIMEOUT:  worker timeout in seconds (default: 120)
+- WARMUP_MODELS:     'false' to skip warmup and load engines lazily
+- PRELOAD_FACE_MODEL: also build the face model in the master (see services/warmup.py)
+- PROMETHEUS_MULTIPROC_DIR: where workers write their metrics for /metrics to
+  aggregate (default: verifyx-metrics under the worker tmp dir; emptied on start)
+"""
+
+import os
+import glob
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# The app sizes per-process state by the worker count (job store, thread
+# budget) — make sure it sees the default too
+os.environ['GUNICORN_WORKERS'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+preload_app = True
+
+# Heartbeat files on tmpfs — a slow disk must not get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Prometheus multi-process mode — must be set before the app is preloaded
+if os.getenv('METRICS_ENABLED', 'true').lower() == 'true':
+    _metrics_dir = os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR',
+        os.path.join(worker_tmp_dir or tempfile.gettempdir(), 'verifyx-metrics'),
+    )
+    os.makedirs(_metrics_dir, exist_ok=True)
+    # Files from a previous run would be summed into this one's metrics
+    for _stale in glob.glob(os.path.join(_metrics_dir, '*.db')):
+        os.unlink(_stale)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def _warmup_enabled() -> bool:
+    return os.getenv('WARMUP_MODELS', 'true').lower() == 'true'
+
+
+def when_ready(server):
+    """Master, after binding and before forking workers."""
+    from services import warmup
+    from services.job_queue import store_kind
+    # Fail now, not on the first job: the memory job store can't span workers
+    store_kind()
+    if _warmup_enabled():
+        server.log.info("Warming engines in the master before forking workers")
+        warmup.warm_in_master()
+    else:
+        warmup.skip()
+
+
+def post_fork(server, worker):
+    """Worker, right after fork: rebuild pools, finish warmup and resume orphaned jobs."""
+    from services import warmup
+    from services.job_queue import resume_orphaned_jobs
+    warmup.after_fork()
+    resume_orphaned_jobs()
+
+
+def child_exit(server, worker):
+    """Master, after a worker exits: drop its live gauges (in-flight, queue depths) from /metrics."""
+    from services import metrics
+    metrics.mark_process_dead(worker.pid)
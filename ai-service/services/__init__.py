@@ -1,3 +1,7 @@
+# Thread limits must be in the environment before numpy/TensorFlow load
+from .thread_budget import apply as _apply_thread_budget
+_apply_thread_budget()
+
 from .face_verification import FaceVerificationService
 from .liveness_detection import LivenessDetectionService
 from .ocr_service import OCRService
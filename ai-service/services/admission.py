@@ -0,0 +1,169 @@
+"""
+Admission Control
+=================
+Fast rejection instead of falling over under load.
+
+A request is admitted only if, for every engine it will use, fewer than
+that engine's slot limit of requests are already in flight, and if its
+estimated decoded-image footprint fits in the global in-flight byte budget.
+Otherwise it is rejected straight away:
+
+- 429 when an engine is saturated (the client is sending more than we serve)
+- 503 when the decoded-bytes budget is exhausted (the node is out of memory headroom)
+
+Both carry Retry-After.  The decoded size is estimated from the image
+header alone (dimensions × 3 channels × a working-copy factor) so nothing
+is fully decoded before the request is admitted.
+
+Configuration (env):
+- ADMISSION_FACE_SLOTS / ADMISSION_LIVENESS_SLOTS / ADMISSION_OCR_SLOTS: in-flight requests per engine
+- ADMISSION_MAX_INFLIGHT_BYTES: global budget of estimated decoded bytes (default: 512 MB)
+- ADMISSION_DECODE_FACTOR:      working copies per decoded image (default: 3)
+- ADMISSION_RETRY_AFTER:        Retry-After seconds on rejection (default: 2)
+"""
+
+import os
+import base64
+import logging
+import binascii
+import threading
+from io import BytesIO
+from contextlib import contextmanager
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# A4 page rasterized at 200 DPI, RGB
+PDF_PAGE_BYTES = 1654 * 2339 * 3
+
+# Enough base64 to cover JPEG/PNG headers incl. typical EXIF blocks
+_HEADER_B64_CHARS = 96 * 1024
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted right now."""
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def estimate_decoded_bytes(b64: str, factor: float = None) -> int:
+    """
+    Estimate the in-memory size of a base64 image once decoded and processed.
+
+    Only the header is decoded.  Falls back to 10× the compressed size when
+    the header can't be read.
+    """
+    if not isinstance(b64, str) or not b64:
+        return 0
+    if factor is None:
+        factor = float(os.getenv('ADMISSION_DECODE_FACTOR', 3))
+
+    head = b64[:256]
+    if ',' in head:
+        b64 = b64.split(',', 1)[1]
+    compressed = len(b64) * 3 // 4
+
+    chunk = ''.join(b64[:_HEADER_B64_CHARS].split())
+    chunk = chunk[:len(chunk) - len(chunk) % 4]
+    try:
+        data = base64.b64decode(chunk)
+    except (binascii.Error, ValueError):
+        return compressed * 10
+
+    if data[:4] == b'%PDF':
+        return int(PDF_PAGE_BYTES * factor)
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            w, h = img.size
+        return int(w * h * 3 * factor)
+    except Exception:
+        return compressed * 10
+
+
+class AdmissionController:
+    """Per-engine in-flight limits plus a global decoded-bytes budget."""
+
+    def __init__(self, engine_slots: dict, max_inflight_bytes: int, retry_after: int = 2):
+        self.engine_slots = dict(engine_slots)
+        self.max_inflight_bytes = max_inflight_bytes
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._in_flight = {engine: 0 for engine in engine_slots}
+        self._bytes = 0
+        self._admitted = 0
+        self._rejected_engine = {engine: 0 for engine in engine_slots}
+        self._rejected_bytes = 0
+
+    def _try_acquire(self, engines: tuple, nbytes: int):
+        with self._lock:
+            for engine in engines:
+                if self._in_flight[engine] >= self.engine_slots[engine]:
+                    self._rejected_engine[engine] += 1
+                    raise AdmissionRejected(
+                        f'{engine} engine is at capacity ({self.engine_slots[engine]} in flight)',
+                        429, self.retry_after,
+                    )
+            # A single request larger than the whole budget is still let
+            # through when nothing else is in flight, so it can't wedge forever
+            if self._bytes and self._bytes + nbytes > self.max_inflight_bytes:
+                self._rejected_bytes += 1
+                raise AdmissionRejected(
+                    'Server is at its decoded-image memory budget',
+                    503, self.retry_after,
+                )
+            for engine in engines:
+                self._in_flight[engine] += 1
+            self._bytes += nbytes
+            self._admitted += 1
+
+    def _release(self, engines: tuple, nbytes: int):
+        with self._lock:
+            for engine in engines:
+                self._in_flight[engine] -= 1
+            self._bytes -= nbytes
+
+    @contextmanager
+    def admit(self, engines: tuple, nbytes: int):
+        """Hold admission for the block.  Raises AdmissionRejected when saturated."""
+        self._try_acquire(engines, nbytes)
+        try:
+            yield
+        finally:
+            self._release(engines, nbytes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'engines': {
+                    engine: {
+                        'in_flight':   self._in_flight[engine],
+                        'slots':       self.engine_slots[engine],
+                        'utilization': round(self._in_flight[engine] / self.engine_slots[engine], 3),
+                        'rejected':    self._rejected_engine[engine],
+                    }
+                    for engine in self.engine_slots
+                },
+                'decoded_bytes': {
+                    'in_flight':   self._bytes,
+                    'budget':      self.max_inflight_bytes,
+                    'utilization': round(self._bytes / self.max_inflight_bytes, 3),
+                    'rejected':    self._rejected_bytes,
+                },
+                'admitted': self._admitted,
+            }
+
+
+admission = AdmissionController(
+    engine_slots={
+        'face':     int(os.getenv('ADMISSION_FACE_SLOTS', 8)),
+        'liveness': int(os.getenv('ADMISSION_LIVENESS_SLOTS', 16)),
+        'ocr':      int(os.getenv('ADMISSION_OCR_SLOTS', 16)),
+    },
+    max_inflight_bytes=int(os.getenv('ADMISSION_MAX_INFLIGHT_BYTES', 512 * 1024 * 1024)),
+    retry_after=int(os.getenv('ADMISSION_RETRY_AFTER', 2)),
+)
@@ -0,0 +1,81 @@
+"""
+Request Deadlines
+=================
+A request-wide time budget that is handed down into every engine.
+
+Engines check it between units of work and stop early instead of finishing
+work nobody will read: Tesseract subprocesses are killed when the budget
+runs out, liveness skips its remaining frames, and stages that haven't
+started yet are not started at all.  Whatever was finished is returned
+marked `partial`.
+
+The budget comes from the X-Request-Timeout-Ms header, falling back to
+REQUEST_TIMEOUT (seconds, default 30).
+"""
+
+import os
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's time budget has run out."""
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which a request must finish."""
+
+    __slots__ = ('timeout', 'expires_at')
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, where: str = ''):
+        """Raise DeadlineExceeded if the budget is spent."""
+        if self.expired():
+            suffix = f' during {where}' if where else ''
+            raise DeadlineExceeded(f'Request deadline of {self.timeout:g}s exceeded{suffix}')
+
+    def __repr__(self):
+        return f'Deadline(remaining={self.remaining():.3f}s)'
+
+
+def remaining(deadline: Deadline) -> float:
+    """Seconds left on an optional deadline (None = unlimited)."""
+    return None if deadline is None else deadline.remaining()
+
+
+def check(deadline: Deadline, where: str = ''):
+    """deadline.check() that tolerates deadline=None."""
+    if deadline is not None:
+        deadline.check(where)
+
+
+def default_timeout() -> float:
+    return float(os.getenv('REQUEST_TIMEOUT', 30))
+
+
+def deadline_from_header(value: str) -> Deadline:
+    """
+    Build a deadline from an X-Request-Timeout-Ms header value.
+
+    The default (REQUEST_TIMEOUT) also acts as a cap: a client can ask for
+    less time than the server allows, never more.  Invalid values fall back
+    to the default.
+    """
+    cap = default_timeout()
+    if value:
+        try:
+            requested = float(value) / 1000
+            if requested > 0:
+                return Deadline(min(requested, cap))
+        except ValueError:
+            pass
+    return Deadline(cap)
@@ -0,0 +1,212 @@
+"""
+Face Embedding Micro-Batcher
+============================
+Runs ArcFace embeddings for concurrent requests as one batched inference.
+
+Each request detects and aligns its faces on its own thread, then hands
+the crops to the batcher.  A single dispatcher thread collects crops from
+all requests for up to FACE_BATCH_MAX_WAIT_MS or FACE_BATCH_MAX_SIZE
+crops, runs the model once and hands each request its own embeddings back.
+
+The dispatcher only waits while other requests are known to be on their
+way (they have opened a `session()` but not submitted yet), so a lone
+request at low load is dispatched immediately.
+
+Only requests holding a face scheduler slot get here, so the face slots
+(SCHED_FACE_SLOTS, services/scheduler.py) default to FACE_BATCH_MAX_SIZE
+while batching is on — fewer slots than that and batches never fill.
+
+Batch sizes and waits are reported by `stats()` (/status → face_batcher).
+
+Configuration (env):
+- FACE_MICROBATCH:         'true' to batch embeddings across requests (default: true)
+- FACE_BATCH_MAX_SIZE:     max crops per inference (default: 8)
+- FACE_BATCH_MAX_WAIT_MS:  max time the first crop waits for company (default: 5)
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import numpy as np
+
+from .deadline import DeadlineExceeded
+from .metrics import observe_stage, stage
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ('submitted',)
+
+    def __init__(self):
+        self.submitted = False
+
+
+class EmbeddingBatcher:
+    """Collects model inputs from concurrent callers and embeds them in batches."""
+
+    def __init__(self, embed_fn, max_batch: int = 8, max_wait_ms: float = 5.0, enabled: bool = True):
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._pending = []       # (inputs, future, enqueued_at)
+        self._expecting = 0      # open sessions that haven't submitted yet
+        self._pid = None
+
+        self._histogram = {}
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._wait_ms_total = 0.0
+        self._wait_ms_max = 0.0
+
+    def _ensure_started(self):
+        # Dispatcher thread doesn't survive a fork — start one per process
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []
+            self._expecting = 0
+            threading.Thread(target=self._dispatcher, name='face-batcher', daemon=True).start()
+
+    @contextmanager
+    def session(self):
+        """
+        Announce that the caller will submit crops shortly.
+
+        Open it before decode/detection so the dispatcher knows to wait for
+        this request instead of running a batch without it.
+        """
+        session = _Session()
+        with self._cond:
+            self._ensure_started()
+            self._expecting += 1
+        try:
+            yield session
+        finally:
+            if not session.submitted:
+                with self._cond:
+                    self._expecting -= 1
+                    self._cond.notify_all()
+
+    def embed(self, inputs: list, session: _Session = None, timeout: float = None) -> list:
+        """
+        Embed preprocessed model inputs, batched with other callers.
+
+        Args:
+            inputs:  list of arrays shaped like one model input
+            session: the caller's open session, if any
+            timeout: seconds to wait for the result (None = no limit)
+
+        Returns:
+            list of embedding vectors, one per input
+        """
+        if not inputs:
+            return []
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            if session is not None and not session.submitted:
+                session.submitted = True
+                self._expecting -= 1
+            self._pending.append((inputs, future, time.monotonic()))
+            self._cond.notify_all()
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            # Still queued → the dispatcher skips it; already running → result is dropped
+            future.cancel()
+            raise DeadlineExceeded('Request deadline exceeded waiting for face embeddings')
+
+    def _pending_items(self) -> int:
+        return sum(len(inputs) for inputs, _, _ in self._pending)
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            until = time.monotonic() + self.max_wait
+            while self._pending_items() < self.max_batch and self._expecting > 0:
+                left = until - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+
+            # Whole requests only; one oversized request still goes alone
+            taken, count = [], 0
+            while self._pending and (not taken or count + len(self._pending[0][0]) <= self.max_batch):
+                item = self._pending.pop(0)
+                taken.append(item)
+                count += len(item[0])
+            return taken
+
+    def _dispatcher(self):
+        while True:
+            taken = self._take_batch()
+            # Callers that already timed out cancelled their future — don't embed for them
+            taken = [item for item in taken if item[1].set_running_or_notify_cancel()]
+            if not taken:
+                continue
+            try:
+                self._run_batch(taken)
+            except Exception as e:
+                # Anything failing here (mismatched crop shapes, the model) fails
+                # this batch only; the dispatcher must outlive it
+                logger.exception(f"Batched face embedding failed ({len(taken)} requests)")
+                for _, future, _ in taken:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(self, taken: list):
+        batch = np.stack([x for inputs, _, _ in taken for x in inputs])
+        now = time.monotonic()
+        waits = [(now - enqueued_at) * 1000 for _, _, enqueued_at in taken]
+
+        for wait_ms in waits:
+            observe_stage('face', 'batch_wait', wait_ms / 1000)
+
+        with stage('face', 'model_forward'):
+            embeddings = self.embed_fn(batch)
+
+        offset = 0
+        for inputs, future, _ in taken:
+            future.set_result(list(embeddings[offset:offset + len(inputs)]))
+            offset += len(inputs)
+
+        with self._cond:
+            self._batches += 1
+            self._items += len(batch)
+            self._requests += len(taken)
+            self._histogram[len(batch)] = self._histogram.get(len(batch), 0) + 1
+            self._wait_ms_total += sum(waits)
+            self._wait_ms_max = max(self._wait_ms_max, *waits)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'enabled':         self.enabled,
+                'max_batch':       self.max_batch,
+                'wait_limit_ms':   self.max_wait * 1000,
+                'batches':         self._batches,
+                'items':           self._items,
+                'avg_batch_size':  round(self._items / self._batches, 2) if self._batches else 0.0,
+                'batch_sizes':     {str(size): n for size, n in sorted(self._histogram.items())},
+                'avg_wait_ms':     round(self._wait_ms_total / self._requests, 2) if self._requests else 0.0,
+                'max_wait_ms':     round(self._wait_ms_max, 2),
+                'pending':         self._pending_items(),
+                'expecting':       self._expecting,
+            }
+
+
+def batcher_from_env(embed_fn) -> EmbeddingBatcher:
+    return EmbeddingBatcher(
+        embed_fn,
+        max_batch=int(os.getenv('FACE_BATCH_MAX_SIZE', 8)),
+        max_wait_ms=float(os.getenv('FACE_BATCH_MAX_WAIT_MS', 5)),
+        enabled=os.getenv('FACE_MICROBATCH', 'true').lower() == 'true',
+    )
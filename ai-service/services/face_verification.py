@@ -12,6 +12,12 @@ import numpy as np
 from io import BytesIO
 from PIL import Image
 
+from .deadline import check as check_deadline, remaining
+from .face_batcher import batcher_from_env
+from .metrics import record_image, stage
+from .model_server import get_model_client
+from .thread_budget import configure_tensorflow
+
 logger = logging.getLogger(__name__)
 
 # DeepFace is imported lazily on first use so the server starts fast
@@ -25,15 +31,54 @@ def _get_deepface():
     if _deepface is None:
         logger.info("Loading DeepFace library (first call — models will download if needed)...")
         from deepface import DeepFace
+        import tensorflow as tf
+        configure_tensorflow(tf)
         _deepface = DeepFace
         logger.info("DeepFace loaded successfully")
     return _deepface
 
 
-def _decode_base64_image(base64_str: str) -> np.ndarray:
+_face_model = None
+
+
+def _get_face_model():
+    """DeepFace's recognition model client for FaceVerificationService.MODEL_NAME."""
+    global _face_model
+    if _face_model is None:
+        _face_model = _get_deepface().build_model(FaceVerificationService.MODEL_NAME)
+    return _face_model
+
+
+def _prepare_face(face: np.ndarray) -> np.ndarray:
+    """
+    Turn an aligned crop from extract_faces (RGB floats in [0, 1]) into one
+    model input, the same way DeepFace.represent does.
+    """
+    from deepface.modules import preprocessing
+    target_size = _get_face_model().input_shape
+    img = face[:, :, ::-1]  # represent() feeds the model BGR
+    img = preprocessing.resize_image(img=img, target_size=(target_size[1], target_size[0]))
+    img = preprocessing.normalize_input(img=img, normalization='base')
+    return img[0]
+
+
+def _embed_batch(batch: np.ndarray) -> np.ndarray:
+    """One forward pass over a stack of prepared crops."""
+    return np.asarray(_get_face_model().model(batch, training=False))
+
+
+def _cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    return float(1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+face_batcher = batcher_from_env(_embed_batch)
+
+
+def _decode_base64_image(base64_str: str, page: int = 1) -> np.ndarray:
     """
     Decode a base64 string into a numpy array (RGB).
     Handles data-URI prefixed strings, PDFs, whitespace, and padding.
+    PDFs are rasterized at `page` (1-based); no other page is rendered.
     """
     # Extract MIME type from data URI prefix if present
     mime_type = None
@@ -57,27 +102,31 @@ def _decode_base64_image(base64_str: str) -> np.ndarray:
 
     logger.debug(f"Decoded {len(img_bytes)} bytes, first 4: {img_bytes[:4].hex()}")
 
-    # Handle PDF uploads — convert first page to image
+    # Handle PDF uploads — convert the requested page to image
     if img_bytes[:4] == b'%PDF' or mime_type == 'application/pdf':
-        logger.info("Face verify: input is PDF — converting first page to image")
-        img = _pdf_first_page_to_pil(img_bytes)
-        return np.array(img)
-
-    try:
-        img = Image.open(BytesIO(img_bytes)).convert('RGB')
-    except Exception as e:
-        raise ValueError(
-            f"Cannot decode image (mime={mime_type}, size={len(img_bytes)} bytes): {e}"
-        )
+        logger.info(f"Face verify: input is PDF — converting page {page} to image")
+        with stage('face', 'pdf_raster'):
+            img = np.array(_pdf_page_to_pil(img_bytes, page))
+        record_image('face', img.nbytes)
+        return img
 
-    return np.array(img)
+    with stage('face', 'image_decode'):
+        try:
+            img = Image.open(BytesIO(img_bytes)).convert('RGB')
+        except Exception as e:
+            raise ValueError(
+                f"Cannot decode image (mime={mime_type}, size={len(img_bytes)} bytes): {e}"
+            )
+        img = np.array(img)
+    record_image('face', img.nbytes)
+    return img
 
 
-def _pdf_first_page_to_pil(pdf_bytes: bytes) -> Image.Image:
-    """Convert the first page of a PDF to a PIL Image."""
+def _pdf_page_to_pil(pdf_bytes: bytes, page: int = 1) -> Image.Image:
+    """Convert a single page (1-based) of a PDF to a PIL Image."""
     try:
         from pdf2image import convert_from_bytes
-        images = convert_from_bytes(pdf_bytes, first_page=1, last_page=1, dpi=200)
+        images = convert_from_bytes(pdf_bytes, first_page=page, last_page=page, dpi=200)
         if images:
             return images[0].convert('RGB')
     except ImportError:
@@ -88,13 +137,18 @@ def _pdf_first_page_to_pil(pdf_bytes: bytes) -> Image.Image:
     try:
         import fitz
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[0]
-        pix = page.get_pixmap(dpi=200)
+        page_count = doc.page_count
+        if page > page_count:
+            doc.close()
+            raise ValueError(f"PDF has {page_count} page(s); page {page} requested")
+        pix = doc[page - 1].get_pixmap(dpi=200)
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
         doc.close()
         return img
     except ImportError:
         pass
+    except ValueError:
+        raise
     except Exception as e:
         logger.warning(f"PyMuPDF failed: {e}")
 
@@ -114,16 +168,33 @@ class FaceVerificationService:
     CONFIDENCE_THRESHOLD = 0.40     # cosine distance threshold — lower = stricter
 
     _model_loaded = False
+    _batching_supported = None
 
     @classmethod
-    def warmup(cls):
+    def warmup(cls, build_model: bool = True):
         """
         Pre-load the model so the first real request is fast.
         Call this at server startup.
+
+        With build_model=False only the DeepFace/TensorFlow modules are
+        imported (safe before a fork); the model is built on first use.
         """
+        client = get_model_client()
+        if client is not None:
+            # Models live in the model server; just check it is reachable
+            try:
+                cls._model_loaded = bool(client.call('ping'))
+                logger.info(f"Face models served by model server at {client.address}")
+            except Exception as e:
+                cls._model_loaded = False
+                logger.warning(f"Model server not reachable yet: {e}")
+            return
+
         try:
             logger.info("Warming up face verification model...")
             DeepFace = _get_deepface()
+            if not build_model:
+                return
             # Build the model by representing a tiny dummy image
             dummy = np.zeros((100, 100, 3), dtype=np.uint8)
             dummy[30:70, 30:70] = 200  # light square in center
@@ -150,31 +221,85 @@ class FaceVerificationService:
         return cls._model_loaded
 
     @classmethod
-    def verify_faces(cls, document_image_b64: str, selfie_image_b64: str) -> dict:
+    def batcher_stats(cls) -> dict:
+        return face_batcher.stats()
+
+    @classmethod
+    def _use_batcher(cls) -> bool:
+        """Batch only if this DeepFace build exposes the model and preprocessing we need."""
+        if not face_batcher.enabled:
+            return False
+        if cls._batching_supported is None:
+            try:
+                from deepface.modules import preprocessing  # noqa: F401
+                _get_face_model().model
+                cls._batching_supported = True
+            except Exception as e:
+                logger.warning(f"Face micro-batching unavailable, using DeepFace.verify: {e}")
+                cls._batching_supported = False
+        return cls._batching_supported
+
+    @classmethod
+    def _threshold(cls) -> float:
+        try:
+            from deepface.modules.verification import find_threshold
+            return find_threshold(cls.MODEL_NAME, cls.DISTANCE_METRIC)
+        except ImportError:
+            return cls.CONFIDENCE_THRESHOLD
+
+    @classmethod
+    def verify_faces(cls, document_image_b64: str, selfie_image_b64: str, document_page: int = 1,
+                     deadline=None) -> dict:
         """
         Compare the face in a document photo against a selfie.
 
         Args:
             document_image_b64: Base64-encoded document image
             selfie_image_b64:   Base64-encoded selfie image
+            document_page:      1-based page to use when the document is a PDF
+            deadline:           Optional Deadline — checked before each step;
+                                a running DeepFace call is not interrupted
 
         Returns:
             dict with match result, confidence, and metadata
         """
-        DeepFace = _get_deepface()
         start = time.time()
 
-        img1 = _decode_base64_image(document_image_b64)
+        check_deadline(deadline, 'face decode')
+        img1 = _decode_base64_image(document_image_b64, document_page)
         img2 = _decode_base64_image(selfie_image_b64)
 
-        result = DeepFace.verify(
-            img1_path=img1,
-            img2_path=img2,
-            model_name=cls.MODEL_NAME,
-            detector_backend=cls.DETECTOR_BACKEND,
-            distance_metric=cls.DISTANCE_METRIC,
-            enforce_detection=True
-        )
+        client = get_model_client()
+        if client is not None:
+            with stage('face', 'model_server'):
+                result = client.call('face_verify', [img1, img2], deadline=deadline)
+            cls._model_loaded = True
+        else:
+            result = cls.verify_arrays(img1, img2, deadline=deadline)
+
+        result["processing_time_ms"] = int((time.time() - start) * 1000)
+        return result
+
+    @classmethod
+    def verify_arrays(cls, img1: np.ndarray, img2: np.ndarray, deadline=None) -> dict:
+        """verify_faces on already decoded RGB arrays (also the model server's entry point)."""
+        if cls._use_batcher():
+            return cls._verify_batched(img1, img2, deadline)
+
+        DeepFace = _get_deepface()
+        start = time.time()
+        check_deadline(deadline, 'face verification')
+
+        # Detection and embedding of both images happen inside this one call
+        with stage('face', 'deepface_verify'):
+            result = DeepFace.verify(
+                img1_path=img1,
+                img2_path=img2,
+                model_name=cls.MODEL_NAME,
+                detector_backend=cls.DETECTOR_BACKEND,
+                distance_metric=cls.DISTANCE_METRIC,
+                enforce_detection=True
+            )
 
         cls._model_loaded = True
         elapsed_ms = int((time.time() - start) * 1000)
@@ -196,27 +321,168 @@ class FaceVerificationService:
         }
 
     @classmethod
-    def detect_faces(cls, image_b64: str) -> dict:
+    def _verify_batched(cls, img1: np.ndarray, img2: np.ndarray, deadline) -> dict:
+        """
+        verify_arrays with the embedding step sent through the cross-request batcher.
+
+        Detection and alignment stay on the calling thread; like DeepFace.verify,
+        the closest pair wins when an image holds more than one face.
+        """
+        DeepFace = _get_deepface()
+        start = time.time()
+
+        with face_batcher.session() as session:
+            crops = []
+            for img in (img1, img2):
+                check_deadline(deadline, 'face detection')
+                with stage('face', 'detection'):
+                    faces = DeepFace.extract_faces(
+                        img_path=img,
+                        detector_backend=cls.DETECTOR_BACKEND,
+                        enforce_detection=True,
+                        align=True
+                    )
+                with stage('face', 'align_prepare'):
+                    crops.append([_prepare_face(face['face']) for face in faces])
+
+            check_deadline(deadline, 'face embedding')
+            with stage('face', 'embedding'):
+                embeddings = face_batcher.embed(crops[0] + crops[1], session, timeout=remaining(deadline))
+
+        cls._model_loaded = True
+        return cls._match_result(embeddings[:len(crops[0])], embeddings[len(crops[0]):], start)
+
+    @classmethod
+    def _match_result(cls, doc_embeddings, selfie_embeddings, start: float) -> dict:
+        """verify_arrays-style result for the closest document/selfie embedding pair."""
+        elapsed_ms = int((time.time() - start) * 1000)
+        distance = min(_cosine_distance(a, b) for a in doc_embeddings for b in selfie_embeddings)
+        threshold = cls._threshold()
+        confidence = round(max(0.0, 1.0 - distance), 4)
+
+        return {
+            "match": distance <= threshold,
+            "confidence": confidence,
+            "distance": round(distance, 4),
+            "threshold": threshold,
+            "model": cls.MODEL_NAME,
+            "detector": cls.DETECTOR_BACKEND,
+            "distance_metric": cls.DISTANCE_METRIC,
+            "processing_time_ms": elapsed_ms
+        }
+
+    @classmethod
+    def embed_array(cls, img: np.ndarray, deadline=None) -> np.ndarray:
+        """
+        Embeddings of every face in an already decoded RGB array, one row per face
+        (also the model server's entry point).
+
+        Used to embed a document ahead of the selfie (see services/presubmit.py).
+        """
+        check_deadline(deadline, 'face detection')
+        if cls._use_batcher():
+            with stage('face', 'detection'):
+                faces = _get_deepface().extract_faces(
+                    img_path=img,
+                    detector_backend=cls.DETECTOR_BACKEND,
+                    enforce_detection=True,
+                    align=True
+                )
+            with stage('face', 'align_prepare'):
+                crops = [_prepare_face(face['face']) for face in faces]
+            check_deadline(deadline, 'face embedding')
+            with stage('face', 'embedding'):
+                embeddings = face_batcher.embed(crops, timeout=remaining(deadline))
+        else:
+            # Detection and embedding happen inside this one call
+            with stage('face', 'deepface_represent'):
+                representations = _get_deepface().represent(
+                    img_path=img,
+                    model_name=cls.MODEL_NAME,
+                    detector_backend=cls.DETECTOR_BACKEND,
+                    enforce_detection=True,
+                    align=True
+                )
+            embeddings = [r['embedding'] for r in representations]
+
+        cls._model_loaded = True
+        return np.asarray(embeddings, dtype=np.float32)
+
+    @classmethod
+    def embed_faces(cls, img: np.ndarray, deadline=None) -> np.ndarray:
+        """embed_array, on the model server when one is configured."""
+        client = get_model_client()
+        if client is not None:
+            with stage('face', 'model_server'):
+                embeddings = client.call('face_embed', [img], deadline=deadline)
+            cls._model_loaded = True
+            return embeddings
+        return cls.embed_array(img, deadline=deadline)
+
+    @classmethod
+    def verify_selfie(cls, doc_embeddings: np.ndarray, selfie_image_b64: str, deadline=None) -> dict:
+        """
+        verify_faces against a document whose faces were embedded beforehand —
+        only the selfie is decoded, detected and embedded here.
+
+        Args:
+            doc_embeddings:   embed_faces() output for the document image
+            selfie_image_b64: Base64-encoded selfie image
+            deadline:         Optional Deadline
+
+        Returns:
+            same dict as verify_faces
+        """
+        start = time.time()
+
+        check_deadline(deadline, 'face decode')
+        selfie = _decode_base64_image(selfie_image_b64)
+        selfie_embeddings = cls.embed_faces(selfie, deadline=deadline)
+
+        return cls._match_result(doc_embeddings, selfie_embeddings, start)
+
+    @classmethod
+    def detect_faces(cls, image_b64: str, deadline=None) -> dict:
         """
         Detect all faces in an image and return bounding boxes + landmarks.
 
         Args:
             image_b64: Base64-encoded image
+            deadline:  Optional Deadline, checked before decode and detection
 
         Returns:
             dict with detected faces, bounding boxes, and landmarks
         """
-        DeepFace = _get_deepface()
         start = time.time()
 
+        check_deadline(deadline, 'face decode')
         img = _decode_base64_image(image_b64)
 
-        faces = DeepFace.extract_faces(
-            img_path=img,
-            detector_backend=cls.DETECTOR_BACKEND,
-            enforce_detection=True,
-            align=True
-        )
+        client = get_model_client()
+        if client is not None:
+            with stage('face', 'model_server'):
+                result = client.call('face_detect', [img], deadline=deadline)
+            cls._model_loaded = True
+        else:
+            result = cls.detect_array(img, deadline=deadline)
+
+        result["processing_time_ms"] = int((time.time() - start) * 1000)
+        return result
+
+    @classmethod
+    def detect_array(cls, img: np.ndarray, deadline=None) -> dict:
+        """detect_faces on an already decoded RGB array (also the model server's entry point)."""
+        DeepFace = _get_deepface()
+        start = time.time()
+        check_deadline(deadline, 'face detection')
+
+        with stage('face', 'detection'):
+            faces = DeepFace.extract_faces(
+                img_path=img,
+                detector_backend=cls.DETECTOR_BACKEND,
+                enforce_detection=True,
+                align=True
+            )
 
         cls._model_loaded = True
         elapsed_ms = int((time.time() - start) * 1000)
@@ -0,0 +1,470 @@
+"""
+Verification Job Queue
+======================
+Asynchronous /verify/complete jobs so HTTP workers don't sit on the
+multi-second pipeline.
+
+- Submit returns a job id immediately; clients poll or get a callback.
+- A bounded queue feeds a fixed number of pipeline worker threads; when it
+  is full, submit fails fast (the API answers 503 + Retry-After).
+- Jobs live in memory, or in a local SQLite file so queued work survives a
+  restart and every worker process can answer a poll.  With more than one
+  worker process (GUNICORN_WORKERS > 1) SQLite is the default and the
+  memory store is refused: a poll landing on another worker would 404.
+  Finished jobs are removed after a TTL.
+- Jobs whose owning worker died (crash, redeploy) are resumed by a live
+  one: at worker start when the SQLite file exists, and on every janitor
+  tick after that.
+- Completion callbacks only go to hosts in JOB_CALLBACK_ALLOWED_HOSTS,
+  checked at submit time, so a caller cannot make the service POST to
+  internal addresses.
+
+Configuration (env):
+- JOB_WORKERS:           pipeline worker threads (default: 2)
+- JOB_QUEUE_MAX:         max queued jobs before backpressure (default: 100)
+- JOB_TTL_SECONDS:       how long finished jobs are kept (default: 3600)
+- JOB_STORE:             'memory' or 'sqlite' (default: sqlite with several worker processes, else memory)
+- JOB_DB_PATH:           SQLite file for JOB_STORE=sqlite (default: data/jobs.sqlite3)
+- JOB_CALLBACK_TIMEOUT:  seconds for the completion callback POST (default: 10)
+- JOB_CALLBACK_ALLOWED_HOSTS: comma-separated callback hosts; '.example.com' also
+                         matches subdomains (default: none — callbacks rejected)
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from .thread_budget import worker_processes
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity."""
+
+
+def _allowed_callback_hosts() -> list:
+    return [h.strip().lower() for h in os.getenv('JOB_CALLBACK_ALLOWED_HOSTS', '').split(',') if h.strip()]
+
+
+def callback_error(url: str):
+    """Why `url` may not receive job callbacks, or None when it may."""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+    except ValueError:
+        return 'callback_url is not a valid URL'
+    if parts.scheme not in ('http', 'https') or not host:
+        return 'callback_url must be an http(s) URL'
+    for allowed in _allowed_callback_hosts():
+        if host == allowed.lstrip('.') or (allowed.startswith('.') and host.endswith(allowed)):
+            return None
+    return f"callback_url host '{host}' is not in JOB_CALLBACK_ALLOWED_HOSTS"
+
+
+def _iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+
+def _process_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# -------------------------------------------------------
+# Job stores
+# -------------------------------------------------------
+
+class MemoryJobStore:
+    """Jobs kept in a dict — lost on restart."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def unfinished(self) -> list:
+        return []
+
+    def claim(self, job_id: str, expected_owner: int, new_owner: int) -> bool:
+        return False
+
+    def delete_expired(self, now: float) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] and job['finished_at'] + job['ttl'] < now
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+
+class SQLiteJobStore:
+    """Jobs persisted to a local SQLite file; queued jobs are resumed on restart."""
+
+    COLUMNS = ('id', 'status', 'params', 'callback_url', 'result', 'error',
+               'created_at', 'started_at', 'finished_at', 'ttl', 'owner',
+               'lane', 'client_id')
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn_obj = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not cross a fork — reconnect per process
+        if self._conn_obj is None or self._pid != os.getpid():
+            self._conn_obj = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn_obj.execute('PRAGMA journal_mode=WAL')
+            self._conn_obj.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, status TEXT, params TEXT, callback_url TEXT,'
+                ' result TEXT, error TEXT, created_at REAL, started_at REAL,'
+                ' finished_at REAL, ttl REAL, owner INTEGER, lane TEXT, client_id TEXT)'
+            )
+            self._pid = os.getpid()
+        return self._conn_obj
+
+    @staticmethod
+    def _encode(field: str, value):
+        return json.dumps(value) if field in ('params', 'result') and value is not None else value
+
+    def _decode(self, row) -> dict:
+        job = dict(zip(self.COLUMNS, row))
+        for field in ('params', 'result'):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def create(self, job: dict):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [self._encode(c, job.get(c)) for c in self.COLUMNS],
+            )
+
+    def update(self, job_id: str, **fields):
+        if not fields:
+            return
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        values = [self._encode(name, value) for name, value in fields.items()]
+        with self._lock:
+            self._conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', values + [job_id])
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs"
+                " WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def claim(self, job_id: str, expected_owner: int, new_owner: int) -> bool:
+        """Atomically take over an orphaned job.  False if someone else got it first."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET owner = ?, status = 'queued', started_at = NULL"
+                " WHERE id = ? AND owner = ?", (new_owner, job_id, expected_owner)
+            )
+            return cur.rowcount == 1
+
+    def delete_expired(self, now: float) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                'DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at + ttl < ?', (now,)
+            )
+            return cur.rowcount
+
+
+# -------------------------------------------------------
+# Queue + workers
+# -------------------------------------------------------
+
+class JobQueue:
+    """Bounded verification job queue drained by pipeline worker threads."""
+
+    def __init__(self, store, workers: int, max_queued: int, ttl_seconds: float,
+                 callback_timeout: float = 10):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.callback_timeout = callback_timeout
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._submitted = 0
+        self._rejected = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._running = 0
+
+    def start(self):
+        """Start this process's worker threads (once per process) and resume orphaned jobs."""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        with self._lock:
+            # Re-create after fork — threads don't survive into children
+            if self._queue is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queued)
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True).start()
+            threading.Thread(target=self._janitor, name='job-janitor', daemon=True).start()
+            logger.info(f"Job queue started ({self.workers} workers, capacity {self.max_queued})")
+        self._recover_orphans()
+
+    def _recover_orphans(self):
+        # Only resume jobs whose owning process is gone, so several
+        # workers sharing one SQLite file don't steal each other's work
+        orphaned = [job for job in self.store.unfinished() if not _process_alive(job['owner'])]
+        if orphaned:
+            threading.Thread(target=self._requeue, args=(orphaned,), daemon=True).start()
+
+    def _requeue(self, jobs: list):
+        resumed = 0
+        for job in jobs:
+            if self.store.claim(job['id'], job['owner'], os.getpid()):
+                self._queue.put(job['id'])
+                resumed += 1
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished job(s)")
+
+    def submit(self, params: dict, callback_url: str = None,
+               lane: str = 'batch', client_id: str = None) -> str:
+        """
+        Queue a verification job.
+
+        Args:
+            params:       keyword arguments for run_complete_verification
+            callback_url: optional URL that receives the job on completion; the
+                          caller checks it with callback_error() first
+            lane:         scheduler lane the job's stages run in
+            client_id:    client the job is accounted to for fair share
+
+        Returns:
+            job id
+
+        Raises:
+            QueueFullError if the queue is at capacity
+        """
+        self._ensure_started()
+        job_id = f'job_{uuid.uuid4().hex}'
+        self.store.create({
+            'id': job_id,
+            'status': 'queued',
+            'params': params,
+            'callback_url': callback_url,
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'ttl': self.ttl_seconds,
+            'owner': os.getpid(),
+            'lane': lane,
+            'client_id': client_id,
+        })
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            self.store.update(job_id, status='rejected', params=None, finished_at=time.time())
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(f'Job queue is full ({self.max_queued} queued)')
+        with self._lock:
+            self._submitted += 1
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """Public view of a job (no input payload), or None."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {
+            'job_id':      job['id'],
+            'status':      job['status'],
+            'created_at':  _iso(job['created_at']),
+            'started_at':  _iso(job['started_at']),
+            'finished_at': _iso(job['finished_at']),
+            'result':      job['result'],
+            'error':       job['error'],
+        }
+
+    def _worker(self):
+        from .pipeline import run_complete_verification
+        from .scheduler import request_lane
+
+        while True:
+            job_id = self._queue.get()
+            job = self.store.get(job_id)
+            if job is None or job['status'] != 'queued':
+                continue
+
+            self.store.update(job_id, status='running', started_at=time.time())
+            with self._lock:
+                self._running += 1
+            try:
+                with request_lane(job['lane'], job['client_id']):
+                    result = run_complete_verification(**job['params'])
+                self.store.update(job_id, status='succeeded', result=result,
+                                  params=None, finished_at=time.time())
+                with self._lock:
+                    self._succeeded += 1
+            except Exception as e:
+                logger.exception(f"Verification job {job_id} failed")
+                self.store.update(job_id, status='failed', error=str(e),
+                                  params=None, finished_at=time.time())
+                with self._lock:
+                    self._failed += 1
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+            if job['callback_url']:
+                self._send_callback(job['callback_url'], self.get(job_id))
+
+    def _send_callback(self, url: str, job: dict):
+        # Checked again here: jobs resumed from SQLite may predate the allowlist
+        error = callback_error(url)
+        if error:
+            logger.warning(f"Job callback to {url} skipped: {error}")
+            return
+        try:
+            import requests
+            # A redirect could point anywhere — don't follow it
+            requests.post(url, json=job, timeout=self.callback_timeout, allow_redirects=False)
+        except Exception as e:
+            logger.warning(f"Job callback to {url} failed: {e}")
+
+    def _janitor(self):
+        while True:
+            time.sleep(min(60, max(1, self.ttl_seconds / 10)))
+            try:
+                removed = self.store.delete_expired(time.time())
+                if removed:
+                    logger.debug(f"Removed {removed} expired job(s)")
+                # A worker that died since the last tick leaves its jobs queued/running
+                self._recover_orphans()
+            except Exception as e:
+                logger.warning(f"Job cleanup failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers':      self.workers,
+                'capacity':     self.max_queued,
+                'queue_depth':  self._queue.qsize() if self._queue is not None else 0,
+                'running':      self._running,
+                'submitted':    self._submitted,
+                'rejected':     self._rejected,
+                'succeeded':    self._succeeded,
+                'failed':       self._failed,
+            }
+
+
+def store_kind() -> str:
+    """
+    'memory' or 'sqlite', from JOB_STORE and the worker count.
+
+    Raises:
+        RuntimeError for the memory store with several worker processes
+    """
+    processes = worker_processes()
+    kind = os.getenv('JOB_STORE', 'sqlite' if processes > 1 else 'memory').lower()
+    if kind != 'sqlite' and processes > 1:
+        raise RuntimeError(
+            f'JOB_STORE=memory cannot serve {processes} worker processes — a job polled on a '
+            f'worker other than the one that took it would 404; use JOB_STORE=sqlite'
+        )
+    return kind
+
+
+def _db_path() -> str:
+    return os.getenv('JOB_DB_PATH', os.path.join('data', 'jobs.sqlite3'))
+
+
+def _build_store():
+    if store_kind() == 'sqlite':
+        return SQLiteJobStore(_db_path())
+    return MemoryJobStore()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue (created on first use)."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(
+                    store=_build_store(),
+                    workers=int(os.getenv('JOB_WORKERS', 2)),
+                    max_queued=int(os.getenv('JOB_QUEUE_MAX', 100)),
+                    ttl_seconds=float(os.getenv('JOB_TTL_SECONDS', 3600)),
+                    callback_timeout=float(os.getenv('JOB_CALLBACK_TIMEOUT', 10)),
+                )
+    return _job_queue
+
+
+def job_stats() -> dict:
+    """Stats of this process's job queue, without creating one (for /status and /metrics)."""
+    if _job_queue is None:
+        return {'active': False}
+    return _job_queue.stats()
+
+
+def resume_orphaned_jobs():
+    """
+    Process start: if a job database is already there, start the queue now so
+    jobs left queued/running by a crashed or redeployed worker resume without
+    waiting for the next submit.  Deployments that never used jobs get no store.
+    """
+    if store_kind() == 'sqlite' and os.path.exists(_db_path()):
+        get_job_queue().start()
@@ -23,6 +23,10 @@ import numpy as np
 from io import BytesIO
 from PIL import Image
 
+from .deadline import DeadlineExceeded
+from .metrics import record_image, stage
+from .thread_budget import configure_cv2
+
 logger = logging.getLogger(__name__)
 
 # ── Module-level cascade handles (loaded once) ──
@@ -34,6 +38,7 @@ def _load_cascades():
     global _face_cascade, _eye_cascade
     if _face_cascade is None:
         import cv2
+        configure_cv2(cv2)
         _face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         )
@@ -90,13 +95,16 @@ class LivenessDetectionService:
             raise
 
     @classmethod
-    def detect(cls, frames_b64: list, challenge_type: str = "blink") -> dict:
+    def detect(cls, frames_b64: list, challenge_type: str = "blink", deadline=None) -> dict:
         """
         Analyse a sequence of base64 frames for liveness.
 
         Args:
             frames_b64:     List of base64-encoded frames (>=10 recommended).
             challenge_type: 'blink' | 'head_left' | 'head_right' | 'nod' | 'smile'
+            deadline:       Optional Deadline.  When it runs out, remaining frames
+                            are skipped and the verdict (from the frames already
+                            analysed) is marked partial.
 
         Returns:
             dict with is_live, confidence, challenge result, and anti-spoofing verdict.
@@ -113,19 +121,31 @@ class LivenessDetectionService:
         eye_open  = []   # True if >=2 eyes detected
         frames_with_face = 0
         total = len(frames_b64)
-
-        for b64 in frames_b64:
-            frame = _decode_frame(b64)
+        frames_skipped = 0
+
+        for i, b64 in enumerate(frames_b64):
+            if deadline is not None and deadline.expired():
+                frames_skipped = total - i
+                if i == 0:
+                    raise DeadlineExceeded("Request deadline exceeded before any liveness frame was analysed")
+                logger.info(f"Liveness: deadline reached — skipping {frames_skipped} of {total} frames")
+                break
+
+            with stage('liveness', 'frame_decode'):
+                frame = _decode_frame(b64)
+            record_image('liveness', frame.nbytes)
             h, w  = frame.shape[:2]
-            gray  = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray  = cv2.equalizeHist(gray)    # improve detection in low light
-
-            faces = fc.detectMultiScale(
-                gray,
-                scaleFactor=cls.FACE_SCALE,
-                minNeighbors=cls.FACE_NEIGHBORS,
-                minSize=(50, 50),
-            )
+            with stage('liveness', 'frame_preprocess'):
+                gray  = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                gray  = cv2.equalizeHist(gray)    # improve detection in low light
+
+            with stage('liveness', 'face_cascade'):
+                faces = fc.detectMultiScale(
+                    gray,
+                    scaleFactor=cls.FACE_SCALE,
+                    minNeighbors=cls.FACE_NEIGHBORS,
+                    minSize=(50, 50),
+                )
 
             if not len(faces):
                 eye_open.append(False)
@@ -142,17 +162,19 @@ class LivenessDetectionService:
 
             # Eye detection inside the upper half of the face ROI
             roi_gray = gray[y : y + fh // 2, x : x + fw]
-            eyes = ec.detectMultiScale(
-                roi_gray,
-                scaleFactor=cls.EYE_SCALE,
-                minNeighbors=cls.EYE_NEIGHBORS,
-            )
+            with stage('liveness', 'eye_cascade'):
+                eyes = ec.detectMultiScale(
+                    roi_gray,
+                    scaleFactor=cls.EYE_SCALE,
+                    minNeighbors=cls.EYE_NEIGHBORS,
+                )
             eye_open.append(bool(len(eyes) >= 2))
 
         elapsed_ms = int((time.time() - start) * 1000)
+        analysed = total - frames_skipped
 
         # Require face in >=40% of frames
-        if frames_with_face < max(1, total * 0.4):
+        if frames_with_face < max(1, analysed * 0.4):
             return {
                 "is_live":             False,
                 "confidence":          0.0,
@@ -164,8 +186,10 @@ class LivenessDetectionService:
                     "confidence":          0.0,
                     "spoof_type_detected": "no_face",
                 },
-                "frames_analyzed":    total,
+                "frames_analyzed":    analysed,
                 "frames_with_face":   frames_with_face,
+                "frames_skipped":     frames_skipped,
+                "partial":            frames_skipped > 0,
                 "processing_time_ms": elapsed_ms,
             }
 
@@ -240,7 +264,9 @@ class LivenessDetectionService:
                 "eye_closed_frames": int(sum(not e for e in eye_open)),
                 "face_width_range":  round(float(max(face_w) - min(face_w)), 4) if face_w else None,
             },
-            "frames_analyzed":    int(total),
+            "frames_analyzed":    int(analysed),
             "frames_with_face":   int(frames_with_face),
+            "frames_skipped":     int(frames_skipped),
+            "partial":            frames_skipped > 0,
             "processing_time_ms": int(elapsed_ms),
         }
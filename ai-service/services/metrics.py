@@ -0,0 +1,304 @@
+"""
+Prometheus Metrics
+==================
+Latency histograms for every internal stage of the three engines, plus
+request, cache, queue and warmup metrics, served at GET /metrics.
+
+Stages are timed with `stage(engine, name)` around each step (image
+decode, PDF raster, quality, preprocessing, each Tesseract pass, Haar
+cascades per frame, face detection and embedding) and land in
+`verifyx_stage_seconds{engine, stage}`, as well as in the request's
+timing breakdown when it is traced (services/timing.py).
+
+- verifyx_stage_seconds{engine,stage}          histogram
+- verifyx_request_seconds{endpoint}            histogram
+- verifyx_requests_total{endpoint,status}      counter
+- verifyx_requests_in_flight{endpoint}         gauge
+- verifyx_cache_lookups_total{cache,result}    counter (hit ratio = hit / all)
+- verifyx_queue_depth{queue}                   gauge (OCR pool, face batcher, jobs, coalesced waiters)
+- verifyx_scheduler_waiting{engine,lane}       gauge
+- verifyx_engine_slots_in_use{engine}          gauge
+- verifyx_admission_inflight_bytes             gauge
+- verifyx_engine_load_seconds{engine}          gauge (warmup duration)
+- verifyx_engine_ready{engine}                 gauge
+- verifyx_stage_cpu_seconds{engine,stage}      histogram (thread CPU time)
+- verifyx_stage_rss_growth_bytes{engine,stage} histogram
+- verifyx_stage_alloc_peak_bytes{engine,stage} histogram (RESOURCE_TRACE_MALLOC only)
+- verifyx_request_cpu_seconds{endpoint}        histogram (images per core-second = count / sum)
+- verifyx_request_decoded_image_bytes{endpoint} histogram
+- verifyx_request_rss_growth_bytes{endpoint}   histogram
+- verifyx_decoded_image_bytes{engine}          histogram (per image / frame)
+- verifyx_process_rss_bytes                    gauge (all workers)
+
+CPU and memory are measured by services/usage.py.
+
+Under gunicorn every worker writes its metrics to files in
+PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py sets and clears it) and a
+scrape of any worker aggregates all of them.  Queue depths and slot usage
+are sampled from the existing stats every METRICS_SAMPLE_INTERVAL seconds
+by each worker, and again by the worker answering the scrape.
+
+Without prometheus_client installed every call here is a no-op and
+/metrics answers 503.
+
+Configuration (env):
+- METRICS_ENABLED:          'false' to turn metrics off (default: true)
+- PROMETHEUS_MULTIPROC_DIR: directory shared by all worker processes (unset = single process)
+- METRICS_SAMPLE_INTERVAL:  seconds between queue-depth samples in multi-process mode (default: 5)
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from . import timing, usage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+ENABLED = prometheus_client is not None and os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# From a cache hit (~1ms) up to a slow multi-page OCR
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_MB = 1024 * 1024
+# From a thumbnail-sized frame up to a 200 DPI multi-megapixel page (and its copies)
+_BYTES_BUCKETS = tuple(mb * _MB for mb in (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+if ENABLED:
+    STAGE_SECONDS = Histogram(
+        'verifyx_stage_seconds', 'Duration of internal engine stages',
+        ['engine', 'stage'], buckets=_STAGE_BUCKETS,
+    )
+    REQUEST_SECONDS = Histogram(
+        'verifyx_request_seconds', 'HTTP request duration',
+        ['endpoint'], buckets=_REQUEST_BUCKETS,
+    )
+    REQUESTS = Counter('verifyx_requests', 'HTTP requests served', ['endpoint', 'status'])
+    IN_FLIGHT = Gauge(
+        'verifyx_requests_in_flight', 'HTTP requests being served',
+        ['endpoint'], multiprocess_mode='livesum',
+    )
+    CACHE_LOOKUPS = Counter('verifyx_cache_lookups', 'Result cache lookups', ['cache', 'result'])
+    QUEUE_DEPTH = Gauge(
+        'verifyx_queue_depth', 'Work waiting in internal queues',
+        ['queue'], multiprocess_mode='livesum',
+    )
+    SCHEDULER_WAITING = Gauge(
+        'verifyx_scheduler_waiting', 'Calls waiting for an engine slot',
+        ['engine', 'lane'], multiprocess_mode='livesum',
+    )
+    SLOTS_IN_USE = Gauge(
+        'verifyx_engine_slots_in_use', 'Engine scheduler slots in use',
+        ['engine'], multiprocess_mode='livesum',
+    )
+    ADMISSION_BYTES = Gauge(
+        'verifyx_admission_inflight_bytes', 'Estimated decoded-image bytes admitted and in flight',
+        multiprocess_mode='livesum',
+    )
+    ENGINE_LOAD_SECONDS = Gauge(
+        'verifyx_engine_load_seconds', 'Time taken to warm each engine',
+        ['engine'], multiprocess_mode='livemax',
+    )
+    ENGINE_READY = Gauge(
+        'verifyx_engine_ready', 'Engine warmed and ready (1) or not (0)',
+        ['engine'], multiprocess_mode='livemin',
+    )
+    STAGE_CPU_SECONDS = Histogram(
+        'verifyx_stage_cpu_seconds', 'Thread CPU time of internal engine stages',
+        ['engine', 'stage'], buckets=_STAGE_BUCKETS,
+    )
+    STAGE_RSS_GROWTH = Histogram(
+        'verifyx_stage_rss_growth_bytes', 'Process RSS growth across internal engine stages',
+        ['engine', 'stage'], buckets=_BYTES_BUCKETS,
+    )
+    STAGE_ALLOC_PEAK = Histogram(
+        'verifyx_stage_alloc_peak_bytes', 'Peak traced allocations of internal engine stages',
+        ['engine', 'stage'], buckets=_BYTES_BUCKETS,
+    )
+    REQUEST_CPU_SECONDS = Histogram(
+        'verifyx_request_cpu_seconds', 'CPU time charged to HTTP requests',
+        ['endpoint'], buckets=_REQUEST_BUCKETS,
+    )
+    REQUEST_IMAGE_BYTES = Histogram(
+        'verifyx_request_decoded_image_bytes', 'Decoded image bytes per HTTP request',
+        ['endpoint'], buckets=_BYTES_BUCKETS,
+    )
+    REQUEST_RSS_GROWTH = Histogram(
+        'verifyx_request_rss_growth_bytes', 'Process RSS growth across HTTP requests',
+        ['endpoint'], buckets=_BYTES_BUCKETS,
+    )
+    IMAGE_BYTES = Histogram(
+        'verifyx_decoded_image_bytes', 'Size of each decoded image or liveness frame',
+        ['engine'], buckets=_BYTES_BUCKETS,
+    )
+    PROCESS_RSS = Gauge(
+        'verifyx_process_rss_bytes', 'Resident memory of the service processes',
+        multiprocess_mode='livesum',
+    )
+
+
+# -------------------------------------------------------
+# Recording
+# -------------------------------------------------------
+
+def observe_stage(engine: str, name: str, seconds: float):
+    """Record a stage measured elsewhere (no nested stages)."""
+    if ENABLED:
+        STAGE_SECONDS.labels(engine, name).observe(seconds)
+    timing.record(f'{engine}.{name}', seconds)
+
+
+@contextmanager
+def stage(engine: str, name: str):
+    """Time the enclosed block as stage `name` of `engine` (recorded even if it raises)."""
+    start = time.perf_counter()
+    sample = usage.measure()
+    with timing.span(f'{engine}.{name}') as node:
+        try:
+            yield
+        finally:
+            if ENABLED:
+                STAGE_SECONDS.labels(engine, name).observe(time.perf_counter() - start)
+            if sample is not None:
+                _record_sample(engine, name, sample, node)
+
+
+def _record_sample(engine: str, name: str, sample, node):
+    sample.stop()
+    if node is not None:
+        node.cpu_seconds, node.rss_delta, node.alloc_peak = sample.cpu_seconds, sample.rss_delta, sample.alloc_peak
+    if ENABLED:
+        STAGE_CPU_SECONDS.labels(engine, name).observe(sample.cpu_seconds)
+        STAGE_RSS_GROWTH.labels(engine, name).observe(max(0, sample.rss_delta))
+        if sample.alloc_peak is not None:
+            STAGE_ALLOC_PEAK.labels(engine, name).observe(sample.alloc_peak)
+
+
+def record_image(engine: str, nbytes: int):
+    """A decoded image (or liveness frame) of `nbytes` pixels' worth of memory."""
+    if ENABLED:
+        IMAGE_BYTES.labels(engine).observe(nbytes)
+    usage.charge_image(nbytes)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    if ENABLED:
+        CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_engine_state(engine: str, state: str, load_ms: int = None):
+    if not ENABLED:
+        return
+    ENGINE_READY.labels(engine).set(1 if state == 'ready' else 0)
+    if load_ms is not None:
+        ENGINE_LOAD_SECONDS.labels(engine).set(load_ms / 1000)
+
+
+def request_started(endpoint: str):
+    if ENABLED:
+        IN_FLIGHT.labels(endpoint).inc()
+        _ensure_sampler()
+
+
+def request_finished(endpoint: str, status: int, seconds: float, resources: dict = None):
+    """`resources` is the request's usage report (services/usage.py), if it was accounted."""
+    if ENABLED:
+        REQUESTS.labels(endpoint, str(status)).inc()
+        REQUEST_SECONDS.labels(endpoint).observe(seconds)
+        if resources is not None:
+            REQUEST_CPU_SECONDS.labels(endpoint).observe(resources['cpu_ms'] / 1000)
+            REQUEST_IMAGE_BYTES.labels(endpoint).observe(resources['decoded_image_bytes'])
+            REQUEST_RSS_GROWTH.labels(endpoint).observe(max(0, resources['rss_delta_bytes']))
+
+
+def request_closed(endpoint: str):
+    if ENABLED:
+        IN_FLIGHT.labels(endpoint).dec()
+
+
+# -------------------------------------------------------
+# Queue-depth sampling
+# -------------------------------------------------------
+
+def sample():
+    """Copy queue depths and slot usage from the services' stats into gauges."""
+    if not ENABLED:
+        return
+    from .admission import admission
+    from .face_verification import face_batcher
+    from .job_queue import job_stats
+    from .ocr_pool import pool_stats
+    from .scheduler import scheduler_stats
+    from .singleflight import singleflight
+
+    for engine, s in scheduler_stats().items():
+        SLOTS_IN_USE.labels(engine).set(s['in_use'])
+        for lane, lane_stats in s['lanes'].items():
+            SCHEDULER_WAITING.labels(engine, lane).set(lane_stats['waiting'])
+
+    QUEUE_DEPTH.labels('ocr_pool').set(pool_stats().get('queue_depth', 0))
+    QUEUE_DEPTH.labels('face_batcher').set(face_batcher.stats()['pending'])
+    QUEUE_DEPTH.labels('jobs').set(job_stats().get('queue_depth', 0))
+    QUEUE_DEPTH.labels('singleflight').set(singleflight.stats()['waiting'])
+    ADMISSION_BYTES.set(admission.stats()['decoded_bytes']['in_flight'])
+    PROCESS_RSS.set(usage.rss_bytes())
+
+
+_sampler_pid = None
+_sampler_lock = threading.Lock()
+
+
+def _sampler_loop(interval: float):
+    while True:
+        try:
+            sample()
+        except Exception as e:
+            logger.debug(f"Metrics sampling failed: {e}")
+        time.sleep(interval)
+
+
+def _ensure_sampler():
+    """In multi-process mode, start this worker's sampler thread (once per process)."""
+    global _sampler_pid
+    if not MULTIPROCESS or _sampler_pid == os.getpid():
+        return
+    with _sampler_lock:
+        if _sampler_pid != os.getpid():
+            _sampler_pid = os.getpid()
+            interval = float(os.getenv('METRICS_SAMPLE_INTERVAL', 5))
+            threading.Thread(target=_sampler_loop, args=(interval,),
+                             name='metrics-sampler', daemon=True).start()
+
+
+# -------------------------------------------------------
+# Exposition
+# -------------------------------------------------------
+
+def render() -> tuple:
+    """(body, content_type) for a scrape; aggregates all workers in multi-process mode."""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    sample()
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """gunicorn child_exit: drop a dead worker's live gauges from the aggregate."""
+    if ENABLED and MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,295 @@
+"""
+Shared-Memory Model Server
+==========================
+Optional split between thin HTTP workers and a few processes that own
+the face models.
+
+Normally every HTTP worker loads its own copy of DeepFace/TensorFlow.
+With MODEL_SERVER_ADDRESS set, HTTP workers only decode images: each
+decoded array is copied once into a `multiprocessing.shared_memory`
+block and the server is sent its name, shape and dtype over a small
+authenticated connection.  The server maps the block without copying,
+runs the model and sends back the (small) result dict.
+
+The server pre-forks MODEL_SERVER_PROCESSES processes that all accept on
+one listening socket; each loads the models once and serves every
+connection in its own thread, so concurrent requests from all HTTP
+workers also meet in the face embedding batcher.
+
+Run it next to the HTTP workers:
+
+    python -m services.model_server
+
+The connection unpickles whatever it receives, so the shared authkey is
+what keeps other hosts and users from running code in these processes.
+It has no default: without MODEL_SERVER_AUTHKEY the server refuses to
+start and HTTP workers refuse to connect (face requests fail and
+/health/ready reports the face engine as failed).  Use a long random
+value, and prefer a unix socket, whose file permissions add a second
+guard, to a TCP address.
+
+Liveness (OpenCV cascades) and OCR (already its own Tesseract process
+pool) stay in the HTTP workers.
+
+Configuration (env):
+- MODEL_SERVER_ADDRESS:    unix socket path or host:port; unset = models run in-process
+- MODEL_SERVER_AUTHKEY:    shared secret for the connection handshake (required)
+- MODEL_SERVER_PROCESSES:  inference processes (default: 2)
+- MODEL_SERVER_TIMEOUT:    seconds to wait for a reply when the request has no deadline (default: 60)
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .deadline import Deadline, DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_address(value: str):
+    """'/path/to.sock' → unix socket; 'host:port' → TCP."""
+    if ':' in value and not value.startswith('/'):
+        host, port = value.rsplit(':', 1)
+        return host, int(port)
+    return value
+
+
+def _authkey() -> bytes:
+    """The connection secret.  Raises RuntimeError when MODEL_SERVER_AUTHKEY is unset."""
+    key = os.getenv('MODEL_SERVER_AUTHKEY', '')
+    if not key:
+        raise RuntimeError(
+            'MODEL_SERVER_AUTHKEY must be set to use the model server — connections '
+            'are unpickled, so a known key lets anyone who reaches the socket run code'
+        )
+    return key.encode()
+
+
+# -------------------------------------------------------
+# Client (HTTP workers)
+# -------------------------------------------------------
+
+class ModelServerClient:
+    """Per-thread connections to the model server; arrays travel through shared memory."""
+
+    def __init__(self, address, authkey: bytes, timeout: float = 60):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections don't survive a fork — open a fresh one per process
+        if conn is None or self._local.pid != os.getpid():
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, op: str, arrays: list = (), deadline=None, **kwargs):
+        """
+        Run `op` on the server.
+
+        Args:
+            op:       operation name (see _ops)
+            arrays:   numpy arrays handed over through shared memory
+            deadline: optional Deadline; its remaining budget is sent along
+                      and bounds the wait for the reply
+            kwargs:   small picklable arguments
+
+        Returns:
+            the operation's result
+
+        Raises:
+            ValueError / DeadlineExceeded as raised by the engine,
+            RuntimeError if the server is unreachable or fails otherwise
+        """
+        blocks, descriptors = [], []
+        try:
+            for arr in arrays:
+                arr = np.ascontiguousarray(arr)
+                shm = SharedMemory(create=True, size=max(1, arr.nbytes))
+                blocks.append(shm)
+                np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+                descriptors.append((shm.name, arr.shape, arr.dtype.str))
+
+            budget = remaining(deadline)
+            try:
+                conn = self._connection()
+                conn.send((op, descriptors, kwargs, budget))
+                replied = conn.poll(self.timeout if budget is None else budget)
+                if replied:
+                    status, payload = conn.recv()
+            except (EOFError, OSError) as e:
+                self._drop_connection()
+                raise RuntimeError(f'Model server unavailable at {self.address}: {e}')
+            if not replied:
+                # The reply would arrive on a connection we've given up on
+                self._drop_connection()
+                raise DeadlineExceeded(f'Request deadline exceeded waiting for model server ({op})')
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        if status == 'ok':
+            return payload
+        kind, message = payload
+        if kind == 'ValueError':
+            raise ValueError(message)
+        if kind == 'DeadlineExceeded':
+            raise DeadlineExceeded(message)
+        raise RuntimeError(f'Model server {op} failed: {kind}: {message}')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelServerClient:
+    """Return the model server client, or None when models run in-process."""
+    global _client
+    address = os.getenv('MODEL_SERVER_ADDRESS')
+    if not address:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ModelServerClient(
+                    _parse_address(address), _authkey(),
+                    timeout=float(os.getenv('MODEL_SERVER_TIMEOUT', 60)),
+                )
+    return _client
+
+
+# -------------------------------------------------------
+# Server (inference processes)
+# -------------------------------------------------------
+
+def _ops() -> dict:
+    from .face_verification import FaceVerificationService
+    return {
+        'ping':        lambda deadline=None: FaceVerificationService.is_ready(),
+        'face_verify': FaceVerificationService.verify_arrays,
+        'face_detect': FaceVerificationService.detect_array,
+        'face_embed':  FaceVerificationService.embed_array,
+    }
+
+
+def _attach(name: str) -> SharedMemory:
+    shm = SharedMemory(name=name)
+    # The client owns and unlinks the block; stop our resource tracker
+    # from unlinking it (and warning) when this process exits
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _handle_connection(conn, ops: dict):
+    with conn:
+        while True:
+            try:
+                op, descriptors, kwargs, budget = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            blocks, arrays = [], []
+            try:
+                for name, shape, dtype in descriptors:
+                    shm = _attach(name)
+                    blocks.append(shm)
+                    arrays.append(np.ndarray(shape, np.dtype(dtype), buffer=shm.buf))
+                deadline = Deadline(budget) if budget is not None else None
+                reply = ('ok', ops[op](*arrays, deadline=deadline, **kwargs))
+            except Exception as e:
+                if not isinstance(e, (ValueError, DeadlineExceeded)):
+                    logger.exception(f"Model server {op} failed")
+                reply = ('error', (type(e).__name__, str(e)))
+            finally:
+                # Views into the blocks must be gone before they can be closed
+                arrays = None
+                for shm in blocks:
+                    try:
+                        shm.close()
+                    except BufferError:
+                        logger.warning(f"Shared memory block {shm.name} still referenced")
+
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def _serve_forever(listener: Listener):
+    # This process *is* the model server — run the models here, not via a client
+    os.environ.pop('MODEL_SERVER_ADDRESS', None)
+
+    from .face_verification import FaceVerificationService
+    FaceVerificationService.warmup()
+    ops = _ops()
+    logger.info(f"Model server process {os.getpid()} ready")
+    while True:
+        try:
+            conn = listener.accept()
+        except multiprocessing.AuthenticationError:
+            logger.warning("Rejected model server connection with a bad authkey")
+            continue
+        except OSError as e:
+            logger.warning(f"Model server accept failed: {e}")
+            continue
+        threading.Thread(target=_handle_connection, args=(conn, ops), daemon=True).start()
+
+
+def serve(address: str = None, processes: int = None):
+    """Listen on `address` and serve with `processes` pre-forked inference processes."""
+    authkey = _authkey()
+    address = _parse_address(address or os.getenv('MODEL_SERVER_ADDRESS', '/tmp/verifyx-models.sock'))
+    processes = processes or int(os.getenv('MODEL_SERVER_PROCESSES', 2))
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)
+
+    # Fork after the socket is bound but before any model is loaded —
+    # TensorFlow must be initialised in the process that uses it
+    listener = Listener(address, authkey=authkey)
+    ctx = multiprocessing.get_context('fork')
+    workers = [
+        ctx.Process(target=_serve_forever, args=(listener,), name=f'model-server-{i}', daemon=True)
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Model server listening on {address} with {processes} process(es)")
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        listener.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO'),
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+    )
+    serve()
@@ -0,0 +1,302 @@
+"""
+OCR Worker Pool
+===============
+Process pool that runs Tesseract on document regions in parallel.
+
+Tesseract is effectively single-threaded per image, so a whole document
+OCR'd in one call is bound by one core.  The pool instead:
+
+- Splits the preprocessed page into horizontal text regions, cutting only
+  at blank rows so no text line is ever split in half.
+- Dispatches every (region, pass) pair as an independent job to a pool of
+  worker processes, each pinned to OMP_THREAD_LIMIT=1 with a warm engine.
+- Reassembles the per-region output in top-to-bottom reading order.
+
+A multi-region document therefore finishes in roughly the time of its
+slowest region instead of the sum of all of them.
+
+Configuration (env):
+- OCR_POOL_SIZE:         worker processes (default: from the thread budget; 0 disables the pool)
+- OCR_MAX_REGIONS:       max regions per page (default: pool size)
+- OCR_POOL_START_METHOD: multiprocessing start method (default: spawn)
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+from PIL import Image
+
+from .metrics import observe_stage, stage
+
+logger = logging.getLogger(__name__)
+
+
+def _default_pool_size() -> int:
+    from .thread_budget import budget
+    return budget()['ocr_pool']
+
+
+# -------------------------------------------------------
+# Worker-process side
+# -------------------------------------------------------
+
+def _init_worker():
+    """Pin Tesseract to one thread and warm the engine once per process."""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    try:
+        from services.ocr_service import _get_tesseract
+        _get_tesseract().get_tesseract_version()
+    except Exception as e:
+        # The job itself will surface the real error to the caller
+        logging.getLogger(__name__).warning(f"OCR worker warmup failed: {e}")
+
+
+def _run_job(kind: str, config: str, size: tuple, data: bytes, expires_at: float = None):
+    """
+    Run one OCR pass on one grayscale region (executed inside a worker).
+
+    `expires_at` is a wall-clock deadline; the Tesseract subprocess is killed
+    when it passes, and jobs that start after it are dropped immediately.
+    """
+    from services.deadline import DeadlineExceeded
+    from services.ocr_service import _get_tesseract, _ocr_pass
+
+    timeout = 0
+    if expires_at is not None:
+        timeout = expires_at - time.time()
+        if timeout <= 0:
+            raise DeadlineExceeded('OCR job dequeued after the request deadline')
+
+    region = Image.frombytes('L', size, data)
+    return _ocr_pass(_get_tesseract(), region, kind, config, timeout)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# -------------------------------------------------------
+# Region splitting
+# -------------------------------------------------------
+
+def _split_regions(img: Image.Image, max_regions: int, pad: int = 6) -> list:
+    """
+    Split a grayscale page into at most `max_regions` horizontal bands.
+
+    Bands are built from runs of rows that contain ink and are only ever cut
+    at blank rows, so every text line stays intact.  Returns a list of
+    (top, bottom) row ranges in reading order.
+    """
+    w, h = img.size
+    if max_regions <= 1 or h < 2:
+        return [(0, h)]
+
+    arr = np.asarray(img)
+    ink = (arr < 128).sum(axis=1)
+    has_ink = ink > max(2, w // 200)
+
+    # Runs of inked rows -> text lines / blocks
+    bands = []
+    top = None
+    for y, inked in enumerate(has_ink):
+        if inked and top is None:
+            top = y
+        elif not inked and top is not None:
+            bands.append((top, y))
+            top = None
+    if top is not None:
+        bands.append((top, h))
+
+    if len(bands) <= 1:
+        return [(0, h)]
+
+    # Greedily merge lines into roughly equal-height groups
+    total_ink_rows = sum(b - t for t, b in bands)
+    target = total_ink_rows / max_regions
+    groups = []
+    current = [bands[0]]
+    acc = bands[0][1] - bands[0][0]
+    for band in bands[1:]:
+        if acc >= target and len(groups) < max_regions - 1:
+            groups.append((current[0][0], current[-1][1]))
+            current, acc = [], 0
+        current.append(band)
+        acc += band[1] - band[0]
+    groups.append((current[0][0], current[-1][1]))
+
+    return [(max(0, t - pad), min(h, b + pad)) for t, b in groups]
+
+
+# -------------------------------------------------------
+# Pool
+# -------------------------------------------------------
+
+class OCRWorkerPool:
+    """Region-parallel Tesseract execution on a pool of worker processes."""
+
+    def __init__(self, size: int, max_regions: int = None, start_method: str = 'spawn'):
+        self.size = size
+        self.max_regions = max_regions or size
+        self.start_method = start_method
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        # Queue-depth metrics
+        self._pending = 0
+        self._max_pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # Re-create after fork — executors don't survive into children
+            if self._executor is None or self._pid != os.getpid():
+                ctx = multiprocessing.get_context(self.start_method)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                )
+                self._pid = os.getpid()
+                logger.info(f"OCR worker pool started ({self.size} processes, {self.start_method})")
+            return self._executor
+
+    def _job_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            if future.cancelled():
+                self._cancelled += 1
+            elif future.exception() is not None:
+                self._failed += 1
+
+    def _submit(self, executor, *args):
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+            self._max_pending = max(self._max_pending, self._pending)
+        future = executor.submit(_run_job, *args)
+        future.add_done_callback(self._job_done)
+        return future
+
+    def warm(self):
+        """Start every worker process up front so the first document doesn't pay for spawning."""
+        executor = self._get_executor()
+        pids = {f.result() for f in [executor.submit(_ping) for _ in range(self.size * 2)]}
+        logger.info(f"OCR worker pool warm ({len(pids)} processes)")
+
+    def run_passes(self, img: Image.Image, passes: dict, deadline=None) -> tuple:
+        """
+        Run every OCR pass over every region of `img` concurrently.
+
+        Args:
+            img:      Preprocessed page image
+            passes:   {name: (kind, config)} — see ocr_service.OCR_PASSES
+            deadline: Optional Deadline; passes not finished by then are
+                      cancelled (queued jobs) or killed (running Tesseract)
+
+        Returns:
+            ({name: output}, timed_out) — 'string' passes joined in reading
+            order, 'data' passes as the concatenated word-confidence list (or
+            None if every region failed); timed-out passes map to None and
+            are listed in `timed_out`.
+        """
+        from .deadline import DeadlineExceeded
+
+        expires_at = None if deadline is None else time.time() + deadline.remaining()
+
+        with stage('ocr', 'split_regions'):
+            gray = img.convert('L')
+            w, _ = gray.size
+            regions = _split_regions(gray, self.max_regions)
+            crops = [gray.crop((0, top, w, bottom)) for top, bottom in regions]
+            crops = [(c.size, c.tobytes()) for c in crops]
+        executor = self._get_executor()
+        dispatched = time.perf_counter()
+
+        futures = {}
+        for name, (kind, config) in passes.items():
+            futures[name] = [
+                self._submit(executor, kind, config, size, data, expires_at)
+                for size, data in crops
+            ]
+
+        results = {}
+        timed_out = []
+        for name, (kind, _) in passes.items():
+            try:
+                outputs = [
+                    f.result(timeout=None if deadline is None else deadline.remaining())
+                    for f in futures[name]
+                ]
+            except (FutureTimeout, DeadlineExceeded):
+                for f in futures[name]:
+                    f.cancel()
+                results[name] = None
+                timed_out.append(name)
+                continue
+            # Passes run side by side: time from dispatch until every region of this pass is back
+            observe_stage('ocr', f'tesseract_{name}', time.perf_counter() - dispatched)
+
+            if kind == 'data':
+                confs = [o for o in outputs if o is not None]
+                results[name] = [c for o in confs for c in o] if confs else None
+            else:
+                results[name] = '\n'.join(o.strip('\n') for o in outputs)
+        return results, timed_out
+
+    def stats(self) -> dict:
+        """Queue-depth and throughput counters."""
+        with self._lock:
+            return {
+                'enabled':      True,
+                'size':         self.size,
+                'max_regions':  self.max_regions,
+                'queue_depth':  self._pending,
+                'max_queue_depth': self._max_pending,
+                'jobs_submitted':  self._submitted,
+                'jobs_completed':  self._completed,
+                'jobs_failed':     self._failed,
+                'jobs_cancelled':  self._cancelled,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    """Return the process-wide OCR pool, or None if OCR_POOL_SIZE=0."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = int(os.getenv('OCR_POOL_SIZE', _default_pool_size()))
+                if size <= 0:
+                    return None
+                max_regions = int(os.getenv('OCR_MAX_REGIONS', size))
+                start_method = os.getenv('OCR_POOL_START_METHOD', 'spawn')
+                _pool = OCRWorkerPool(size, max_regions, start_method)
+    return _pool
+
+
+def pool_stats() -> dict:
+    pool = get_ocr_pool()
+    if pool is None:
+        return {'enabled': False}
+    return pool.stats()
@@ -11,6 +11,7 @@ Supports:
 """
 
 import base64
+import hashlib
 import os
 import re
 import time
@@ -20,6 +21,11 @@ from io import BytesIO
 from PIL import Image, ImageFilter, ImageStat
 from datetime import datetime
 
+from .deadline import DeadlineExceeded, check as check_deadline
+from .metrics import record_image, stage
+from .ocr_pool import get_ocr_pool
+from .result_cache import ResultCache
+
 logger = logging.getLogger(__name__)
 
 _tesseract = None
@@ -47,8 +53,8 @@ def _get_tesseract():
     return _tesseract
 
 
-def _decode_base64_image(b64: str) -> Image.Image:
-    """Decode base64 to PIL Image.  Handles data-URI prefix, whitespace, padding, and PDF files."""
+def _decode_base64_payload(b64: str) -> tuple:
+    """Decode base64 to raw bytes.  Handles data-URI prefix, whitespace and padding.  Returns (bytes, mime_type)."""
     # Extract and log MIME type from data URI prefix if present
     mime_type = None
     if ',' in b64:
@@ -75,12 +81,15 @@ def _decode_base64_image(b64: str) -> Image.Image:
         raise ValueError("Image data is too small — likely not a valid image")
 
     logger.debug(f"Decoded {len(img_bytes)} bytes, first 4 bytes: {img_bytes[:4].hex()}")
+    return img_bytes, mime_type
+
 
-    # Check if the data is a PDF (magic bytes: %PDF = 25504446)
-    if img_bytes[:4] == b'%PDF' or mime_type == 'application/pdf':
-        logger.info("Input is a PDF — converting first page to image")
-        return _pdf_to_image(img_bytes)
+def _is_pdf(data: bytes, mime_type: str = None) -> bool:
+    # Magic bytes: %PDF = 25504446
+    return data[:4] == b'%PDF' or mime_type == 'application/pdf'
 
+
+def _open_image(img_bytes: bytes, mime_type: str = None) -> Image.Image:
     try:
         return Image.open(BytesIO(img_bytes)).convert('RGB')
     except Exception as e:
@@ -89,12 +98,72 @@ def _decode_base64_image(b64: str) -> Image.Image:
         )
 
 
-def _pdf_to_image(pdf_bytes: bytes) -> Image.Image:
-    """Convert the first page of a PDF to a PIL Image."""
+def _image_nbytes(img: Image.Image) -> int:
+    """Memory held by a decoded PIL image's pixels."""
+    return img.width * img.height * len(img.getbands())
+
+
+def _decode_base64_image(b64: str, page: int = 1) -> Image.Image:
+    """Decode base64 to PIL Image.  PDFs are rasterized at the requested page (1-based)."""
+    img_bytes, mime_type = _decode_base64_payload(b64)
+
+    if _is_pdf(img_bytes, mime_type):
+        logger.info(f"Input is a PDF — converting page {page} to image")
+        return _pdf_to_image(img_bytes, page)
+
+    return _open_image(img_bytes, mime_type)
+
+
+def _pdf_text_layer(pdf_bytes: bytes, page: int = 1) -> str:
+    """
+    Return the embedded text of one PDF page, or None if there is none.
+
+    Digitally generated PDFs (e-passport exports, DigiLocker downloads)
+    carry a text layer that is exact — reading it takes milliseconds and
+    makes rasterization and Tesseract unnecessary.
+    """
+    try:
+        # Try PyMuPDF (fitz)
+        import fitz
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            if page > doc.page_count:
+                raise ValueError(f"PDF has {doc.page_count} page(s); page {page} requested")
+            text = doc[page - 1].get_text()
+        finally:
+            doc.close()
+        return text if text and text.strip() else None
+    except ImportError:
+        pass
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.warning(f"PyMuPDF text extraction failed: {e} — trying pypdf")
+
+    try:
+        # Try pypdf (pure Python)
+        from pypdf import PdfReader
+        reader = PdfReader(BytesIO(pdf_bytes))
+        if page > len(reader.pages):
+            raise ValueError(f"PDF has {len(reader.pages)} page(s); page {page} requested")
+        text = reader.pages[page - 1].extract_text()
+        return text if text and text.strip() else None
+    except ImportError:
+        logger.debug("No PDF text extractor installed — skipping text-layer check")
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.warning(f"pypdf text extraction failed: {e}")
+
+    return None
+
+
+def _pdf_to_image(pdf_bytes: bytes, page: int = 1) -> Image.Image:
+    """Rasterize a single PDF page (1-based) to a PIL Image.  Other pages are never rendered."""
     try:
         # Try pdf2image (requires poppler)
         from pdf2image import convert_from_bytes
-        images = convert_from_bytes(pdf_bytes, first_page=1, last_page=1, dpi=200)
+        images = convert_from_bytes(pdf_bytes, first_page=page, last_page=page, dpi=200)
         if images:
             return images[0].convert('RGB')
     except ImportError:
@@ -106,13 +175,18 @@ def _pdf_to_image(pdf_bytes: bytes) -> Image.Image:
         # Try PyMuPDF (fitz)
         import fitz
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[0]
-        pix = page.get_pixmap(dpi=200)
+        page_count = doc.page_count
+        if page > page_count:
+            doc.close()
+            raise ValueError(f"PDF has {page_count} page(s); page {page} requested")
+        pix = doc[page - 1].get_pixmap(dpi=200)
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
         doc.close()
         return img
     except ImportError:
         pass
+    except ValueError:
+        raise
     except Exception as e:
         logger.warning(f"PyMuPDF failed: {e}")
 
@@ -123,6 +197,61 @@ def _pdf_to_image(pdf_bytes: bytes) -> Image.Image:
     )
 
 
+# -------------------------------------------------------
+# Tesseract passes
+# -------------------------------------------------------
+
+# name -> (kind, config).  'string' passes return text, 'data' returns the
+# list of positive per-word confidences (None if Tesseract failed).
+OCR_PASSES = {
+    # Default OCR for general text
+    'raw':  ('string', '--psm 6'),
+    # Specialized MRZ extraction (single block mode, MRZ-optimized)
+    'mrz':  ('string', '--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'),
+    # Per-word confidence
+    'data': ('data', ''),
+}
+
+
+def _ocr_pass(tess, img: Image.Image, kind: str, config: str, timeout: float = 0):
+    """
+    Run a single Tesseract pass.  Shared by the in-process and pooled paths.
+
+    A non-zero `timeout` (seconds) kills the Tesseract subprocess when it
+    runs out and raises DeadlineExceeded.
+    """
+    try:
+        if kind == 'string':
+            return tess.image_to_string(img, config=config, timeout=timeout)
+
+        ocr_data = tess.image_to_data(img, config=config, output_type=tess.Output.DICT, timeout=timeout)
+        return [
+            int(c) for c in ocr_data.get('conf', [])
+            if str(c).lstrip('-').isdigit() and int(c) > 0
+        ]
+    except RuntimeError as e:
+        # pytesseract signals a killed subprocess as RuntimeError('Tesseract process timeout')
+        if timeout and 'timeout' in str(e).lower():
+            raise DeadlineExceeded(f"Tesseract '{kind}' pass killed after {timeout:.2f}s")
+        if kind == 'string':
+            raise
+        return None
+    except Exception:
+        if kind == 'string':
+            raise
+        return None
+
+
+def _pass_timeout(deadline) -> float:
+    """Tesseract timeout for the next pass: 0 = unlimited.  Raises if nothing is left."""
+    if deadline is None:
+        return 0
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded before OCR pass")
+    return remaining
+
+
 # -------------------------------------------------------
 # Image preprocessing for better OCR accuracy
 # -------------------------------------------------------
@@ -194,10 +323,24 @@ def _assess_quality(img: Image.Image) -> dict:
         "resolution": f"{w}x{h}",
         "brightness": round(mean_brightness, 1),
         "contrast": round(contrast, 1),
-        "blur_score": round(blur_var, 1)
+        "blur_score": round(blur_var, 1),
+        "source": "image",
     }
 
 
+# No pixels were looked at — same keys as _assess_quality so the response
+# schema doesn't depend on the input type
+TEXT_LAYER_QUALITY = {
+    "score": 1.0,
+    "issues": [],
+    "resolution": None,
+    "brightness": None,
+    "contrast": None,
+    "blur_score": None,
+    "source": "pdf_text_layer",
+}
+
+
 # -------------------------------------------------------
 # MRZ Parsing (TD3 format — passports)
 # -------------------------------------------------------
@@ -319,10 +462,13 @@ def _parse_mrz_td3(line1: str, line2: str) -> dict:
     }
 
 
-def _find_mrz_lines(text: str) -> tuple:
+def _find_mrz_lines(text: str, fix_ocr_errors: bool = True) -> tuple:
     """
     Find MRZ lines in OCR text output.
     MRZ lines are 44 chars of [A-Z0-9<] for TD3 passports.
+
+    `fix_ocr_errors` applies the O→0 / I→1 / S→5 / B→8 substitutions; pass
+    False for exact text (e.g. a PDF text layer) so names aren't mangled.
     """
     # Clean up and find lines matching MRZ pattern
     mrz_pattern = re.compile(r'[A-Z0-9<]{30,50}')
@@ -331,7 +477,8 @@ def _find_mrz_lines(text: str) -> tuple:
     for line in text.split('\n'):
         clean = line.strip().upper().replace(' ', '')
         # Replace common OCR mistakes in MRZ
-        clean = clean.replace('O', '0').replace('I', '1').replace('S', '5').replace('B', '8')
+        if fix_ocr_errors:
+            clean = clean.replace('O', '0').replace('I', '1').replace('S', '5').replace('B', '8')
         # But keep alpha chars that are valid in names
         # Only apply digit replacement in line2 (numbers-heavy), so do a best-effort
         if mrz_pattern.match(clean) and len(clean) >= 30:
@@ -353,18 +500,34 @@ def _find_mrz_lines(text: str) -> tuple:
 class OCRService:
     """Document text extraction and MRZ parsing."""
 
+    # Bump whenever preprocessing or field parsing changes output for the
+    # same image, so stale cached results are never served.
+    PIPELINE_VERSION = '2'
+
     _loaded = False
+    _engine_fingerprint = None
+
+    # Results keyed by content hash + document_type + page + engine config
+    _cache = ResultCache(
+        name='ocr',
+        max_entries=int(os.getenv('OCR_CACHE_MAX_ENTRIES', 256)),
+        max_bytes=int(os.getenv('OCR_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+        ttl_seconds=float(os.getenv('OCR_CACHE_TTL_SECONDS', 600)),
+    )
 
     @classmethod
     def is_ready(cls) -> bool:
         return cls._loaded
 
     @classmethod
-    def warmup(cls):
-        """Test that Tesseract is accessible."""
+    def warmup(cls, start_pool: bool = True):
+        """Test that Tesseract is accessible and (optionally) start the OCR worker pool."""
         try:
             tess = _get_tesseract()
             version = tess.get_tesseract_version()
+            pool = get_ocr_pool()
+            if pool is not None and start_pool:
+                pool.warm()
             cls._loaded = True
             logger.info(f"Tesseract OCR ready (version {version})")
         except Exception as e:
@@ -372,104 +535,168 @@ class OCRService:
             logger.warning(f"Tesseract warmup failed: {e}")
 
     @classmethod
-    def extract(cls, image_b64: str, document_type: str = 'auto') -> dict:
+    def cache_stats(cls) -> dict:
+        return cls._cache.stats()
+
+    @classmethod
+    def _get_engine_fingerprint(cls) -> str:
+        """Tesseract version + pass configs + pipeline version, resolved once."""
+        if cls._engine_fingerprint is None:
+            try:
+                version = str(_get_tesseract().get_tesseract_version())
+            except Exception:
+                version = 'unknown'
+            configs = '|'.join(f"{name}:{kind}:{config}" for name, (kind, config) in OCR_PASSES.items())
+            cls._engine_fingerprint = f"{version}|{configs}|v{cls.PIPELINE_VERSION}"
+        return cls._engine_fingerprint
+
+    @classmethod
+    def _cache_key(cls, payload: bytes, document_type: str, page: int) -> str:
+        digest = hashlib.sha256(payload).hexdigest()
+        return f"{digest}:{document_type}:{page}:{cls._get_engine_fingerprint()}"
+
+    @classmethod
+    def extract(cls, image_b64: str, document_type: str = 'auto', page: int = 1,
+                deadline=None) -> dict:
         """
         Extract text and structured data from a document image.
 
+        Identical inputs (same decoded bytes, document_type, page and engine
+        config) are served from a bounded TTL cache; `cache_hit` says which.
+
         Args:
-            image_b64:     Base64-encoded document image
+            image_b64:     Base64-encoded document image or PDF
             document_type: 'passport', 'driving_license', 'national_id', or 'auto'
+            page:          1-based page to read when the input is a PDF
+            deadline:      Optional Deadline.  Tesseract passes still running
+                           when it expires are killed; if the general-text
+                           pass finished the result is returned marked partial.
 
         Returns:
             dict with extracted_data, confidence_scores, quality, and MRZ info
         """
-        tess = _get_tesseract()
-        cls._loaded = True
         start = time.time()
+        check_deadline(deadline, 'OCR decode')
 
-        img = _decode_base64_image(image_b64)
-
-        # Assess quality first
-        quality = _assess_quality(img)
+        with stage('ocr', 'decode'):
+            payload, mime_type = _decode_base64_payload(image_b64)
 
-        # Preprocess for better OCR
-        processed = _preprocess_for_ocr(img)
+        key = cls._cache_key(payload, document_type, page) if cls._cache.enabled else None
+        if key is not None:
+            cached = cls._cache.get(key)
+            if cached is not None:
+                cached['cache_hit'] = True
+                cached['processing_time_ms'] = int((time.time() - start) * 1000)
+                return cached
 
-        # Run OCR with both default and MRZ-specific configs
-        # Default OCR for general text
-        raw_text = tess.image_to_string(processed, config='--psm 6')
+        result = cls._extract_uncached(payload, mime_type, document_type, page, start, deadline)
+        if key is not None and not result.get('partial'):
+            cls._cache.put(key, result)
+        result['cache_hit'] = False
+        return result
 
-        # Specialized MRZ extraction (single block mode, MRZ-optimized)
-        mrz_text = tess.image_to_string(
-            processed,
-            config='--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'
-        )
+    @classmethod
+    def _extract_uncached(cls, payload: bytes, mime_type: str, document_type: str,
+                          page: int, start: float, deadline=None) -> dict:
+
+        if _is_pdf(payload, mime_type):
+            # Fast path: digitally generated PDFs carry an exact text layer —
+            # when it holds the MRZ or the key fields, skip raster + Tesseract
+            with stage('ocr', 'pdf_text_layer'):
+                text = _pdf_text_layer(payload, page)
+            if text:
+                parsed = _interpret_text(text, text, 1.0, document_type, fix_ocr_errors=False)
+                if parsed['mrz_found'] or all(
+                    parsed['extracted_data'].get(f) for f in TEXT_LAYER_REQUIRED_FIELDS
+                ):
+                    logger.info(f"PDF page {page} has a usable text layer — skipping OCR")
+                    return {
+                        **parsed,
+                        "quality": dict(TEXT_LAYER_QUALITY),
+                        "raw_text": text.strip(),
+                        "ocr_confidence": 1.0,
+                        "source": "pdf_text_layer",
+                        "processing_time_ms": int((time.time() - start) * 1000),
+                    }
+
+            logger.info(f"Input is a PDF — converting page {page} to image")
+            with stage('ocr', 'pdf_raster'):
+                img = _pdf_to_image(payload, page)
+        else:
+            with stage('ocr', 'image_decode'):
+                img = _open_image(payload, mime_type)
+        record_image('ocr', _image_nbytes(img))
 
-        # Get per-word confidence from Tesseract
-        try:
-            ocr_data = tess.image_to_data(processed, output_type=tess.Output.DICT)
-            word_confidences = [
-                int(c) for c in ocr_data.get('conf', [])
-                if str(c).lstrip('-').isdigit() and int(c) > 0
-            ]
-            avg_confidence = sum(word_confidences) / len(word_confidences) / 100 if word_confidences else 0.5
-        except Exception:
-            avg_confidence = 0.5
+        tess = _get_tesseract()
+        cls._loaded = True
 
-        # Try to find and parse MRZ
-        mrz_line1, mrz_line2 = _find_mrz_lines(mrz_text)
-        if not mrz_line1:
-            mrz_line1, mrz_line2 = _find_mrz_lines(raw_text)
-
-        extracted_data = {}
-        confidence_scores = {}
-        checks_passed = []
-        checks_failed = []
-        detected_type = document_type
-
-        if mrz_line1 and mrz_line2:
-            # We have MRZ — parse it
-            if detected_type == 'auto':
-                detected_type = 'passport' if mrz_line1.startswith('P') else 'id_card'
-
-            mrz_result = _parse_mrz_td3(mrz_line1, mrz_line2)
-            extracted_data = mrz_result['data']
-            extracted_data['mrz_line1'] = mrz_line1
-            extracted_data['mrz_line2'] = mrz_line2
-            checks_passed = mrz_result['checks_passed']
-            checks_failed = mrz_result['checks_failed']
-
-            # MRZ fields have high confidence if checksums pass
-            base_conf = 0.90 if len(checks_passed) > len(checks_failed) else 0.60
-            for field in extracted_data:
-                if field.startswith('mrz_'):
-                    continue
-                confidence_scores[field] = round(base_conf + (avg_confidence * 0.1), 2)
+        # Assess quality first
+        with stage('ocr', 'quality'):
+            quality = _assess_quality(img)
 
+        # Preprocess for better OCR
+        with stage('ocr', 'preprocess'):
+            processed = _preprocess_for_ocr(img)
+        check_deadline(deadline, 'OCR')
+
+        # Run the general-text, MRZ and confidence passes — region-parallel
+        # on the worker pool when enabled, serially in-process otherwise.
+        # Passes cut off by the deadline come back as None.
+        pool = get_ocr_pool()
+        if pool is not None:
+            outputs, timed_out = pool.run_passes(processed, OCR_PASSES, deadline)
         else:
-            # No MRZ found — fall back to raw text field extraction
-            if detected_type == 'auto':
-                detected_type = 'unknown'
+            outputs, timed_out = {}, []
+            for name, (kind, config) in OCR_PASSES.items():
+                try:
+                    with stage('ocr', f'tesseract_{name}'):
+                        outputs[name] = _ocr_pass(tess, processed, kind, config, _pass_timeout(deadline))
+                except DeadlineExceeded:
+                    outputs[name] = None
+                    timed_out.append(name)
+
+        if outputs['raw'] is None:
+            raise DeadlineExceeded("Request deadline exceeded during OCR")
+
+        raw_text = outputs['raw']
+        mrz_text = outputs['mrz'] or ''
+        word_confidences = outputs['data']
+        if word_confidences:
+            avg_confidence = sum(word_confidences) / len(word_confidences) / 100
+        else:
+            avg_confidence = 0.5
 
-            extracted_data = _extract_fields_from_text(raw_text)
-            for field in extracted_data:
-                confidence_scores[field] = round(avg_confidence, 2)
+        with stage('ocr', 'parse'):
+            parsed = _interpret_text(raw_text, mrz_text, avg_confidence, document_type)
 
         elapsed_ms = int((time.time() - start) * 1000)
 
         return {
-            "document_type": detected_type,
-            "extracted_data": extracted_data,
-            "confidence_scores": confidence_scores,
+            **parsed,
             "quality": quality,
             "raw_text": raw_text.strip(),
-            "mrz_found": mrz_line1 is not None,
-            "checks_passed": checks_passed,
-            "checks_failed": checks_failed,
             "ocr_confidence": round(avg_confidence, 4),
+            "source": "ocr",
+            "partial": bool(timed_out),
+            "passes_timed_out": timed_out,
             "processing_time_ms": elapsed_ms
         }
 
+    @classmethod
+    def assess_quality(cls, image_b64: str, page: int = 1, deadline=None) -> dict:
+        """
+        Image quality of a document without running OCR — a cheap pre-check.
+
+        Returns:
+            dict with score, issues, resolution, brightness, contrast, blur_score
+        """
+        check_deadline(deadline, 'quality assessment')
+        with stage('ocr', 'image_decode'):
+            img = _decode_base64_image(image_b64, page)
+        record_image('ocr', _image_nbytes(img))
+        with stage('ocr', 'quality'):
+            return _assess_quality(img)
+
     @classmethod
     def validate(cls, extracted_data: dict) -> dict:
         """
@@ -481,70 +708,195 @@ class OCRService:
         Returns:
             dict with validation results
         """
-        checks_passed = []
-        checks_failed = []
-        warnings = []
-
-        # Check name is present and reasonable
-        name = extracted_data.get('full_name', '')
-        if name and len(name) >= 2:
-            checks_passed.append('name_present')
-            if re.match(r'^[A-Za-z\s\-\.]+$', name):
-                checks_passed.append('name_format')
+        with stage('ocr', 'validate'):
+            return cls.validate_batch([extracted_data])[0]
+
+    @classmethod
+    def validate_batch(cls, records: list) -> list:
+        """
+        Validate many extracted_data dicts in one pass.
+
+        Dates are parsed once per distinct string across the batch, age and
+        expiry are computed as array operations, and the current date is
+        taken once for the whole batch.
+
+        Args:
+            records: list of extracted_data dicts
+
+        Returns:
+            list of validation result dicts, in input order
+        """
+        today = datetime.utcnow().date().toordinal()
+
+        dobs = [r.get('date_of_birth', '') for r in records]
+        expiries = [r.get('expiry_date', '') for r in records]
+        parsed = _parse_dates_batch(dobs + expiries)
+
+        dob_ord = np.array([_date_ordinal(parsed, d) for d in dobs], dtype=np.int64)
+        exp_ord = np.array([_date_ordinal(parsed, e) for e in expiries], dtype=np.int64)
+
+        age = (today - dob_ord) / 365.25
+        dob_in_range = (age > 0) & (age < 150)
+        not_expired = exp_ord > today
+
+        results = []
+        for i, data in enumerate(records):
+            checks_passed = []
+            checks_failed = []
+            warnings = []
+
+            # Check name is present and reasonable
+            name = data.get('full_name', '')
+            if name and len(name) >= 2:
+                checks_passed.append('name_present')
+                if _NAME_RE.match(name):
+                    checks_passed.append('name_format')
+                else:
+                    warnings.append('name_contains_unusual_characters')
             else:
-                warnings.append('name_contains_unusual_characters')
-        else:
-            checks_failed.append('name_missing')
-
-        # Check document number
-        doc_num = extracted_data.get('document_number', '')
-        if doc_num and len(doc_num) >= 5:
-            checks_passed.append('document_number_present')
-            if re.match(r'^[A-Z0-9]+$', doc_num):
-                checks_passed.append('document_number_format')
+                checks_failed.append('name_missing')
+
+            # Check document number
+            doc_num = data.get('document_number', '')
+            if doc_num and len(doc_num) >= 5:
+                checks_passed.append('document_number_present')
+                if _DOC_NUMBER_RE.match(doc_num):
+                    checks_passed.append('document_number_format')
+                else:
+                    warnings.append('document_number_unusual_format')
             else:
-                warnings.append('document_number_unusual_format')
-        else:
-            checks_failed.append('document_number_missing')
+                checks_failed.append('document_number_missing')
 
-        # Check date of birth
-        dob = extracted_data.get('date_of_birth', '')
-        if dob:
-            try:
-                dob_date = datetime.strptime(dob, '%Y-%m-%d')
-                age = (datetime.utcnow() - dob_date).days / 365.25
-                if 0 < age < 150:
-                    checks_passed.append('dob_valid')
-                else:
-                    checks_failed.append('dob_out_of_range')
-            except ValueError:
+            # Check date of birth
+            if dob_ord[i] == _DATE_MISSING:
+                checks_failed.append('dob_missing')
+            elif dob_ord[i] == _DATE_INVALID:
                 checks_failed.append('dob_invalid_format')
-        else:
-            checks_failed.append('dob_missing')
+            elif dob_in_range[i]:
+                checks_passed.append('dob_valid')
+            else:
+                checks_failed.append('dob_out_of_range')
 
-        # Check expiry date
-        expiry = extracted_data.get('expiry_date', '')
-        if expiry:
-            try:
-                exp_date = datetime.strptime(expiry, '%Y-%m-%d')
-                if exp_date > datetime.utcnow():
+            # Check expiry date
+            if exp_ord[i] == _DATE_INVALID:
+                checks_failed.append('expiry_date_invalid_format')
+            elif exp_ord[i] != _DATE_MISSING:
+                if not_expired[i]:
                     checks_passed.append('expiry_date_valid')
                 else:
                     checks_failed.append('document_expired')
-            except ValueError:
-                checks_failed.append('expiry_date_invalid_format')
 
-        # Overall score
-        total = len(checks_passed) + len(checks_failed)
-        authenticity = len(checks_passed) / total if total > 0 else 0
+            # Overall score
+            total = len(checks_passed) + len(checks_failed)
+            authenticity = len(checks_passed) / total if total > 0 else 0
 
-        return {
-            "is_valid": len(checks_failed) == 0,
-            "checks_passed": checks_passed,
-            "checks_failed": checks_failed,
-            "warnings": warnings,
-            "authenticity_score": round(authenticity, 2)
-        }
+            results.append({
+                "is_valid": len(checks_failed) == 0,
+                "checks_passed": checks_passed,
+                "checks_failed": checks_failed,
+                "warnings": warnings,
+                "authenticity_score": round(authenticity, 2)
+            })
+
+        return results
+
+
+# -------------------------------------------------------
+# Batch validation helpers
+# -------------------------------------------------------
+
+_NAME_RE = re.compile(r'^[A-Za-z\s\-\.]+$')
+_DOC_NUMBER_RE = re.compile(r'^[A-Z0-9]+$')
+
+# Same grammar strptime('%Y-%m-%d') accepts
+_ISO_DATE_RE = re.compile(r'^(\d{4})-(1[0-2]|0[1-9]|[1-9])-(3[01]|[12]\d|0[1-9]|[1-9])$')
+
+# Sentinel ordinals (real ordinals are >= 1)
+_DATE_MISSING = 0
+_DATE_INVALID = -1
+
+
+def _parse_dates_batch(values: list) -> dict:
+    """Map each distinct YYYY-MM-DD string to its day ordinal, or _DATE_INVALID."""
+    parsed = {}
+    for value in set(v for v in values if v and isinstance(v, str)):
+        m = _ISO_DATE_RE.match(value)
+        try:
+            parsed[value] = datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).toordinal() if m else _DATE_INVALID
+        except ValueError:
+            # e.g. 2023-02-30
+            parsed[value] = _DATE_INVALID
+    return parsed
+
+
+def _date_ordinal(parsed: dict, value) -> int:
+    if not value:
+        return _DATE_MISSING
+    if not isinstance(value, str):
+        return _DATE_INVALID
+    return parsed[value]
+
+
+# Without an MRZ, a PDF text layer is only trusted when it yields these
+TEXT_LAYER_REQUIRED_FIELDS = ('document_number', 'date_of_birth')
+
+
+def _interpret_text(raw_text: str, mrz_text: str, avg_confidence: float,
+                    document_type: str, fix_ocr_errors: bool = True) -> dict:
+    """
+    Turn OCR (or text-layer) output into structured fields.
+
+    Returns:
+        dict with document_type, extracted_data, confidence_scores,
+        mrz_found, checks_passed and checks_failed
+    """
+    # Try to find and parse MRZ
+    mrz_line1, mrz_line2 = _find_mrz_lines(mrz_text, fix_ocr_errors)
+    if not mrz_line1:
+        mrz_line1, mrz_line2 = _find_mrz_lines(raw_text, fix_ocr_errors)
+
+    extracted_data = {}
+    confidence_scores = {}
+    checks_passed = []
+    checks_failed = []
+    detected_type = document_type
+
+    if mrz_line1 and mrz_line2:
+        # We have MRZ — parse it
+        if detected_type == 'auto':
+            detected_type = 'passport' if mrz_line1.startswith('P') else 'id_card'
+
+        mrz_result = _parse_mrz_td3(mrz_line1, mrz_line2)
+        extracted_data = mrz_result['data']
+        extracted_data['mrz_line1'] = mrz_line1
+        extracted_data['mrz_line2'] = mrz_line2
+        checks_passed = mrz_result['checks_passed']
+        checks_failed = mrz_result['checks_failed']
+
+        # MRZ fields have high confidence if checksums pass
+        base_conf = 0.90 if len(checks_passed) > len(checks_failed) else 0.60
+        for field in extracted_data:
+            if field.startswith('mrz_'):
+                continue
+            confidence_scores[field] = round(base_conf + (avg_confidence * 0.1), 2)
+
+    else:
+        # No MRZ found — fall back to raw text field extraction
+        if detected_type == 'auto':
+            detected_type = 'unknown'
+
+        extracted_data = _extract_fields_from_text(raw_text)
+        for field in extracted_data:
+            confidence_scores[field] = round(avg_confidence, 2)
+
+    return {
+        "document_type": detected_type,
+        "extracted_data": extracted_data,
+        "confidence_scores": confidence_scores,
+        "mrz_found": mrz_line1 is not None,
+        "checks_passed": checks_passed,
+        "checks_failed": checks_failed,
+    }
 
 
 def _extract_fields_from_text(text: str) -> dict:
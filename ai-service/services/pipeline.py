@@ -0,0 +1,393 @@
+"""
+Verification Pipeline
+=====================
+The /api/v1/verify/complete pipeline: face match + liveness + OCR + validation.
+
+Face verification, liveness and OCR are independent, so they run
+concurrently on a bounded, process-wide stage pool; validation runs as soon
+as OCR finishes.  End-to-end latency is roughly the slowest stage rather than
+the sum.  Every stage reports its wall-clock time and how long it waited for
+a pool thread.
+
+Fail-fast mode (opt-in) instead runs the stages one at a time, cheapest
+first by measured cost, and stops at the first decisive failure — rejected
+attempts then only pay for the stages needed to reject them.
+
+Configuration (env):
+- PIPELINE_STAGE_WORKERS: threads in the shared stage pool (default: 6)
+- PIPELINE_FAIL_FAST:     fail-fast by default (default: false)
+- FAIL_FAST_MIN_QUALITY:  document quality score below which OCR is pointless (default: 0.25)
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from .face_verification import FaceVerificationService
+from .liveness_detection import LivenessDetectionService
+from .ocr_service import OCRService
+from .deadline import DeadlineExceeded
+from .metrics import stage
+from .profiler import attach as profiler_attach
+from .scheduler import run_scheduled
+from .usage import charge_cpu
+
+logger = logging.getLogger(__name__)
+
+
+class StageResult:
+    """Outcome of one pipeline stage."""
+
+    __slots__ = ('name', 'value', 'error', 'queue_ms', 'wall_ms')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = None
+        self.error = None
+        self.queue_ms = 0
+        self.wall_ms = 0
+
+    def timing(self) -> dict:
+        return {'wall_ms': self.wall_ms, 'queue_ms': self.queue_ms}
+
+
+class StageExecutor:
+    """Runs pipeline stages on a bounded thread pool, capturing results, errors and timings."""
+
+    def __init__(self, max_workers: int, costs: 'StageCostTracker' = None):
+        self.max_workers = max_workers
+        self.costs = costs
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            # Re-create after fork — threads don't survive into children
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='stage',
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, result: StageResult, submitted: float, fn, args, kwargs) -> StageResult:
+        started = time.perf_counter()
+        result.queue_ms = int((started - submitted) * 1000)
+        try:
+            with profiler_attach(), stage('pipeline', result.name):
+                result.value = fn(*args, **kwargs)
+        except Exception as e:
+            result.error = e
+        result.wall_ms = int((time.perf_counter() - started) * 1000)
+        if self.costs is not None:
+            self.costs.observe(result.name, result.wall_ms)
+        return result
+
+    def _run_on_worker(self, *args) -> StageResult:
+        # The request's own thread is accounted by the caller; charge it this thread's share
+        cpu = time.thread_time()
+        try:
+            return self._run(*args)
+        finally:
+            charge_cpu(time.thread_time() - cpu)
+
+    def submit(self, name: str, fn, *args, **kwargs):
+        """Schedule `fn` as stage `name`.  Returns a future resolving to a StageResult (never raises)."""
+        result = StageResult(name)
+        ctx = contextvars.copy_context()
+        return self._get_executor().submit(
+            ctx.run, self._run_on_worker, result, time.perf_counter(), fn, args, kwargs
+        )
+
+    def run_inline(self, name: str, fn, *args, **kwargs) -> StageResult:
+        """Run a stage on the calling thread with the same bookkeeping."""
+        return self._run(StageResult(name), time.perf_counter(), fn, args, kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._pid = None
+
+
+class StageCostTracker:
+    """Exponentially weighted moving average of each stage's wall-clock cost."""
+
+    def __init__(self, priors: dict, alpha: float = 0.2):
+        self.alpha = alpha
+        self._costs = dict(priors)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, wall_ms: float):
+        with self._lock:
+            previous = self._costs.get(name)
+            self._costs[name] = wall_ms if previous is None else (
+                self.alpha * wall_ms + (1 - self.alpha) * previous
+            )
+
+    def order(self, names: list) -> list:
+        """`names` sorted cheapest first."""
+        with self._lock:
+            return sorted(names, key=lambda n: self._costs.get(n, float('inf')))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: round(cost, 1) for name, cost in self._costs.items()}
+
+
+# Starting estimates (ms) until real measurements come in
+stage_costs = StageCostTracker({
+    'liveness_detection': 80,
+    'document_quality':   120,
+    'face_verification':  800,
+    'ocr_extraction':     1500,
+})
+
+stage_executor = StageExecutor(int(os.getenv('PIPELINE_STAGE_WORKERS', 6)), stage_costs)
+
+# Fail-fast: opt-in per request, or on by default with PIPELINE_FAIL_FAST=true
+FAIL_FAST_DEFAULT = os.getenv('PIPELINE_FAIL_FAST', 'false').lower() == 'true'
+# Documents scoring below this are too poor to OCR
+FAIL_FAST_MIN_QUALITY = float(os.getenv('FAIL_FAST_MIN_QUALITY', 0.25))
+
+
+def _deadline_stage(name: str, when: str) -> StageResult:
+    stage = StageResult(name)
+    stage.error = DeadlineExceeded(f'Request deadline exceeded {when}')
+    return stage
+
+
+def _is_decisive_failure(stage: StageResult) -> bool:
+    """Would this stage's outcome fail the verification on its own?"""
+    if stage.error is not None:
+        return True
+    value = stage.value
+    if stage.name == 'liveness_detection':
+        return not value['is_live']
+    if stage.name == 'document_quality':
+        return value['score'] < FAIL_FAST_MIN_QUALITY
+    if stage.name == 'face_verification':
+        return not value['match']
+    if stage.name == 'ocr_extraction':
+        return not value['extracted_data']
+    return False
+
+
+def run_complete_verification(document_image: str, selfie_image: str,
+                              liveness_frames: list, challenge_type: str,
+                              document_type: str, document_page: int = 1,
+                              fail_fast: bool = None, deadline=None, document=None) -> dict:
+    """
+    Run the full verification pipeline.
+
+    Args:
+        document_image:  Base64 encoded ID document image
+        selfie_image:    Base64 encoded selfie
+        liveness_frames: List of base64 encoded frames (may be empty)
+        challenge_type:  Liveness challenge
+        document_type:   Document type hint for OCR
+        document_page:   1-based page when document_image is a PDF
+        fail_fast:       Run stages cheapest-first and stop at the first
+                         decisive failure (default: PIPELINE_FAIL_FAST)
+        deadline:        Optional Deadline, handed to every engine.  Stages
+                         not started in time are skipped, stages still
+                         running are abandoned, and the response is marked
+                         `partial`.
+        document:        Optional PresubmittedDocument (services/presubmit.py)
+                         standing in for document_image: its background
+                         OCR, quality and face embedding are reused and
+                         only the selfie side is computed here.
+
+    Returns:
+        Response body for /api/v1/verify/complete
+    """
+    if fail_fast is None:
+        fail_fast = FAIL_FAST_DEFAULT
+
+    start = datetime.utcnow()
+    errors = []
+    skipped = []
+
+    # Each engine stage takes a slot on its engine's scheduler, in the caller's lane
+    if document is not None:
+        # Pre-submitted document: wait for its background stages, no slot held while waiting
+        calls = {
+            'face_verification': (document.verify_face, selfie_image),
+            'ocr_extraction':    (document.extract,),
+        }
+    else:
+        calls = {
+            'face_verification': (run_scheduled, 'face', FaceVerificationService.verify_faces,
+                                  document_image, selfie_image, document_page),
+            'ocr_extraction':    (run_scheduled, 'ocr', OCRService.extract,
+                                  document_image, document_type, document_page),
+        }
+    if liveness_frames:
+        calls['liveness_detection'] = (run_scheduled, 'liveness', LivenessDetectionService.detect,
+                                       liveness_frames, challenge_type)
+
+    stages = {}
+    if fail_fast:
+        # Cheapest first; the first decisive failure skips everything after it.
+        # The quality gate only exists here — in concurrent mode OCR reports quality itself.
+        if document is not None:
+            calls['document_quality'] = (document.assess_quality,)
+        else:
+            calls['document_quality'] = (run_scheduled, 'ocr', OCRService.assess_quality,
+                                         document_image, document_page)
+        stop = False
+        for name in stage_costs.order(list(calls)):
+            if stop:
+                skipped.append(name)
+                continue
+            if deadline is not None and deadline.expired():
+                stages[name] = _deadline_stage(name, 'before it started')
+            else:
+                stages[name] = stage_executor.run_inline(name, *calls[name], deadline=deadline)
+            stop = _is_decisive_failure(stages[name])
+    else:
+        # Independent stages run concurrently
+        futures = {
+            name: stage_executor.submit(name, *call, deadline=deadline)
+            for name, call in calls.items()
+        }
+        for name, future in futures.items():
+            try:
+                stages[name] = future.result(timeout=None if deadline is None else deadline.remaining())
+            except FutureTimeout:
+                # Still running — the engine stops itself at its next deadline check
+                future.cancel()
+                stages[name] = _deadline_stage(name, 'while running')
+
+    # OCR extraction
+    ocr_stage = stages.get('ocr_extraction')
+    if ocr_stage is not None and ocr_stage.error is None:
+        ocr_result = ocr_stage.value
+        ocr_passed = len(ocr_result['extracted_data']) > 0
+    elif ocr_stage is not None:
+        ocr_result = {'extracted_data': {}, 'error': str(ocr_stage.error)}
+        ocr_passed = False
+    else:
+        ocr_result = {'extracted_data': {}, 'note': 'Skipped (fail-fast)'}
+        ocr_passed = False
+
+    # Data validation — depends only on OCR
+    validation_stage = None
+    if ocr_result.get('extracted_data'):
+        validation_stage = stage_executor.run_inline(
+            'validation', OCRService.validate, ocr_result['extracted_data'],
+        )
+        if validation_stage.error is None:
+            validation_result = validation_stage.value
+            validation_passed = validation_result['is_valid']
+        else:
+            validation_result = {'is_valid': False, 'error': str(validation_stage.error)}
+            validation_passed = False
+    else:
+        validation_result = {'is_valid': False, 'note': 'No extracted data to validate'}
+        validation_passed = False
+        if ocr_stage is None:
+            skipped.append('validation')
+
+    # Face verification
+    face_stage = stages.get('face_verification')
+    if face_stage is not None and face_stage.error is None:
+        face_result = face_stage.value
+        face_passed = face_result['match']
+    elif face_stage is not None:
+        face_result = {'match': False, 'confidence': 0, 'error': str(face_stage.error)}
+        face_passed = False
+    else:
+        face_result = {'match': False, 'confidence': 0, 'note': 'Skipped (fail-fast)'}
+        face_passed = False
+
+    # Liveness detection
+    liveness_stage = stages.get('liveness_detection')
+    if not liveness_frames:
+        liveness_result = {'is_live': None, 'note': 'No frames provided — skipped'}
+        liveness_passed = True  # don't fail pipeline if caller skips liveness
+    elif liveness_stage is not None and liveness_stage.error is None:
+        liveness_result = liveness_stage.value
+        liveness_passed = liveness_result['is_live']
+    elif liveness_stage is not None:
+        liveness_result = {'is_live': False, 'confidence': 0, 'error': str(liveness_stage.error)}
+        liveness_passed = False
+    else:
+        liveness_result = {'is_live': None, 'note': 'Skipped (fail-fast)'}
+        liveness_passed = False
+
+    quality_stage = stages.get('document_quality')
+
+    # Errors in pipeline order, same format as before
+    ordered = [face_stage, liveness_stage, quality_stage, ocr_stage, validation_stage]
+    for stage in ordered:
+        if stage is not None and stage.error is not None:
+            errors.append(f'{stage.name}: {str(stage.error)}')
+
+    overall_passed = face_passed and liveness_passed and ocr_passed
+    elapsed_ms = int((datetime.utcnow() - start).total_seconds() * 1000)
+
+    partial = any(
+        isinstance(stage.error, DeadlineExceeded)
+        or (isinstance(stage.value, dict) and stage.value.get('partial'))
+        for stage in ordered if stage is not None
+    )
+
+    response = {
+        'success': True,
+        'verification_id': f'ver_{start.strftime("%Y%m%d%H%M%S")}',
+        'overall_result': 'PASSED' if overall_passed else 'FAILED',
+        'results': {
+            'face_verification': {
+                'passed':     face_passed,
+                'confidence': face_result.get('confidence', 0),
+                'match':      face_result.get('match', False),
+            },
+            'liveness_detection': {
+                'passed':     liveness_passed,
+                'confidence': liveness_result.get('confidence', None),
+                'is_live':    liveness_result.get('is_live'),
+            },
+            'document_ocr': {
+                'passed':        ocr_passed,
+                'mrz_found':     ocr_result.get('mrz_found', False),
+                'checks_passed': ocr_result.get('checks_passed', []),
+                'checks_failed': ocr_result.get('checks_failed', []),
+                'cache_hit':     ocr_result.get('cache_hit', False),
+            },
+            'document_validation': {
+                'passed':             validation_passed,
+                'authenticity_score': validation_result.get('authenticity_score', 0) if validation_result else 0,
+            }
+        },
+        'extracted_data': ocr_result.get('extracted_data', {}),
+        'errors': errors,
+        'stage_timings': {
+            stage.name: stage.timing() for stage in ordered if stage is not None
+        },
+        'partial': partial,
+        'processing_time_ms': elapsed_ms,
+        'timestamp': start.isoformat()
+    }
+
+    if fail_fast:
+        response['fail_fast'] = {
+            'stage_order':    list(stages) + skipped,
+            'stopped_at':     next((n for n, st in stages.items() if _is_decisive_failure(st)), None),
+            'skipped_stages': skipped,
+        }
+        if quality_stage is not None and quality_stage.error is None:
+            response['results']['document_quality'] = {
+                'passed': not _is_decisive_failure(quality_stage),
+                'score':  quality_stage.value['score'],
+                'issues': quality_stage.value['issues'],
+            }
+
+    return response
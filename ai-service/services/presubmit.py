@@ -0,0 +1,244 @@
+"""
+Document Pre-Submission
+=======================
+Starts the document side of a verification while the user is still
+taking the selfie and doing the liveness challenge.
+
+POST /api/v1/verify/presubmit hands the document over early and gets back
+a handle.  In the background the document is:
+
+- decoded once (`decode`), then
+- quality-assessed (`document_quality`) and its faces embedded
+  (`face_embedding`) from that decoded image, while
+- OCR runs on the original payload (`ocr_extraction`).
+
+/api/v1/verify/complete then sends `document_handle` instead of
+`document_image`; the face stage only decodes and embeds the selfie, and
+OCR is whatever is left of the background run — usually nothing, so the
+end of the flow costs roughly the selfie-side work.
+
+Handles live in this process only.  Behind several workers, either route
+a session to one worker or also send `document_image`: when the handle is
+unknown here the request falls back to processing the image from scratch.
+
+Background work runs on its own small stage pool, in the lane of the
+request that pre-submitted it, and under its own deadline.  Nothing else
+of that request's context follows it: the response has long been sent,
+so its timing span, usage account and profiler are left behind.
+
+Configuration (env):
+- PRESUBMIT_WORKERS:      threads in the pre-submission stage pool (default: 4)
+- PRESUBMIT_TTL_SECONDS:  how long a handle stays usable (default: 900)
+- PRESUBMIT_TIMEOUT:      time budget of the background work, seconds (default: 120)
+- PRESUBMIT_MAX_HANDLES:  live handles per process; beyond it pre-submission is refused (default: 256)
+"""
+
+import os
+import time
+import secrets
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from PIL import Image
+
+from .deadline import Deadline, DeadlineExceeded, remaining
+from .face_verification import FaceVerificationService, _decode_base64_image
+from .ocr_service import OCRService, _assess_quality
+from .pipeline import StageExecutor
+from .scheduler import current_lane, request_lane, run_scheduled
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'document_quality', 'face_embedding', 'ocr_extraction')
+
+presubmit_executor = StageExecutor(int(os.getenv('PRESUBMIT_WORKERS', 4)))
+
+
+class PresubmitFull(Exception):
+    """Raised when this process already holds PRESUBMIT_MAX_HANDLES live documents."""
+
+
+class PresubmittedDocument:
+    """A document whose decode, quality, OCR and face embedding run in the background."""
+
+    def __init__(self, handle: str, document_image: str, document_type: str, page: int,
+                 ttl_seconds: float, timeout: float):
+        self.handle = handle
+        self.document_type = document_type
+        self.page = page
+        self.created_at = time.time()
+        self.expires_at = time.monotonic() + ttl_seconds
+        self.deadline = Deadline(timeout)
+        self._stages = {}
+        self._cond = threading.Condition()
+        self._lane = current_lane()
+
+        self._submit('ocr_extraction', run_scheduled, 'ocr', OCRService.extract,
+                     document_image, document_type, page, deadline=self.deadline)
+        decode = self._submit('decode', _decode_base64_image, document_image, page)
+        decode.add_done_callback(self._after_decode)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def _submit(self, name: str, fn, *args, **kwargs):
+        # Submit from an empty context so the stage copies none of the request's
+        # state (Flask request, timing, usage, profiler); only its lane is re-entered
+        future = contextvars.Context().run(presubmit_executor.submit, name, self._in_lane, fn, *args, **kwargs)
+        with self._cond:
+            self._stages[name] = future
+            self._cond.notify_all()
+        return future
+
+    def _in_lane(self, fn, *args, **kwargs):
+        with request_lane(*self._lane):
+            return fn(*args, **kwargs)
+
+    def _after_decode(self, future):
+        self._start_image_stages(future.result())
+
+    def _start_image_stages(self, decoded):
+        if decoded.error is not None:
+            # Nothing to assess or embed — both stages fail the way decode did
+            def failed():
+                raise decoded.error
+            self._submit('document_quality', failed)
+            self._submit('face_embedding', failed)
+            return
+
+        img = decoded.value
+        # Only the stages below hold on to the pixels; the handle keeps their outcome
+        decoded.value = {'width': img.shape[1], 'height': img.shape[0]}
+        self._submit('document_quality', lambda: _assess_quality(Image.fromarray(img)))
+        self._submit('face_embedding', run_scheduled, 'face', FaceVerificationService.embed_faces,
+                     img, deadline=self.deadline)
+
+    def wait(self, name: str, deadline=None):
+        """
+        Value of stage `name`, waiting at most until `deadline` for it to finish.
+
+        Raises:
+            the stage's own error, or DeadlineExceeded if it is still running
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: name in self._stages, remaining(deadline)):
+                raise DeadlineExceeded(f'Request deadline exceeded waiting for pre-submitted {name}')
+            future = self._stages[name]
+        try:
+            stage = future.result(timeout=remaining(deadline))
+        except FutureTimeout:
+            raise DeadlineExceeded(f'Request deadline exceeded waiting for pre-submitted {name}')
+        if stage.error is not None:
+            raise stage.error
+        return stage.value
+
+    # Pipeline stages (see run_complete_verification) — same signatures as the engines'
+
+    def verify_face(self, selfie_image: str, deadline=None) -> dict:
+        embeddings = self.wait('face_embedding', deadline)
+        return run_scheduled('face', FaceVerificationService.verify_selfie, embeddings, selfie_image,
+                             deadline=deadline)
+
+    def extract(self, deadline=None) -> dict:
+        return dict(self.wait('ocr_extraction', deadline))
+
+    def assess_quality(self, deadline=None) -> dict:
+        return self.wait('document_quality', deadline)
+
+    def status(self) -> dict:
+        """Per-stage state, plus the quality report once it is known."""
+        with self._cond:
+            futures = dict(self._stages)
+
+        stages, quality = {}, None
+        for name in STAGES:
+            future = futures.get(name)
+            if future is None:
+                stages[name] = {'state': 'pending'}
+            elif not future.done():
+                stages[name] = {'state': 'running'}
+            else:
+                stage = future.result()
+                stages[name] = {'state': 'failed' if stage.error is not None else 'done', **stage.timing()}
+                if stage.error is not None:
+                    stages[name]['error'] = str(stage.error)
+                elif name == 'document_quality':
+                    quality = stage.value
+        return {
+            'handle':             self.handle,
+            'document_type':      self.document_type,
+            'document_page':      self.page,
+            'ready':              all(s['state'] in ('done', 'failed') for s in stages.values()),
+            'stages':             stages,
+            'document_quality':   quality,
+            'expires_in_seconds': max(0, int(self.expires_at - time.monotonic())),
+        }
+
+
+class PresubmitStore:
+    """Live pre-submitted documents by handle, expiring after a TTL."""
+
+    def __init__(self, ttl_seconds: float, timeout: float, max_handles: int):
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self.max_handles = max_handles
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._used = 0
+        self._missed = 0
+
+    def _expire(self):
+        while self._documents:
+            handle, document = next(iter(self._documents.items()))
+            if not document.expired():
+                break
+            del self._documents[handle]
+
+    def submit(self, document_image: str, document_type: str = 'auto', page: int = 1) -> PresubmittedDocument:
+        """Start background processing of a document.  Raises PresubmitFull when out of room."""
+        with self._lock:
+            self._expire()
+            if len(self._documents) >= self.max_handles:
+                raise PresubmitFull(f'Too many pre-submitted documents ({self.max_handles}); retry later')
+            document = PresubmittedDocument(
+                secrets.token_urlsafe(24), document_image, document_type, page,
+                self.ttl_seconds, self.timeout,
+            )
+            self._documents[document.handle] = document
+            self._submitted += 1
+        logger.info(f"Pre-submitted document {document.handle[:8]}… ({document_type}, page {page})")
+        return document
+
+    def get(self, handle: str) -> PresubmittedDocument:
+        """The live document for `handle`, or None if unknown here or expired."""
+        with self._lock:
+            self._expire()
+            document = self._documents.get(handle) if handle else None
+            if document is None:
+                self._missed += 1
+            else:
+                self._used += 1
+            return document
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            return {
+                'handles':     len(self._documents),
+                'max_handles': self.max_handles,
+                'ttl_seconds': self.ttl_seconds,
+                'submitted':   self._submitted,
+                'used':        self._used,
+                'missed':      self._missed,
+            }
+
+
+presubmit_store = PresubmitStore(
+    ttl_seconds=float(os.getenv('PRESUBMIT_TTL_SECONDS', 900)),
+    timeout=float(os.getenv('PRESUBMIT_TIMEOUT', 120)),
+    max_handles=int(os.getenv('PRESUBMIT_MAX_HANDLES', 256)),
+)
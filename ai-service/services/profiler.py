@@ -0,0 +1,271 @@
+"""
+Request Profiler
+================
+Profiles single /api/v1 requests in production, on demand or by sampling
+a fraction of traffic.
+
+On demand — send the admin token and pick a profiler:
+
+    X-Profile:        sample | deterministic
+    X-Profile-Token:  <PROFILE_ADMIN_TOKEN>
+    X-Profile-Output: attachment (default) | spool
+
+- `sample` walks the stacks of the request's threads every
+  PROFILE_SAMPLE_INTERVAL_MS and produces collapsed stacks
+  (`thread;outer (file:line);...;inner (file:line) count`) for
+  flamegraph.pl / speedscope.  Cheap enough for slow production requests.
+- `deterministic` runs cProfile and produces a pstats file
+  (`python -m pstats file.prof`).  Much slower; one request at a time.
+
+The request thread and the pipeline stage threads working for it are
+profiled; the shared face-batcher thread is not.  With `attachment` the
+profile replaces the response body (the view's status is in
+X-Profiled-Status); with `spool` the normal response is returned and the
+profile is written to PROFILE_SPOOL_DIR (path in X-Profile-File).
+
+Background mode — PROFILE_SAMPLE_RATE > 0 samples that fraction of
+/api/v1 requests with the sampling profiler into the spool directory,
+which keeps only the newest PROFILE_SPOOL_MAX_FILES files.
+
+Configuration (env):
+- PROFILE_ADMIN_TOKEN:        token for on-demand profiling; unset = on-demand profiling disabled
+- PROFILE_SPOOL_DIR:          where profiles are written (default: <tmp>/verifyx-profiles)
+- PROFILE_SPOOL_MAX_FILES:    profiles kept in the spool directory (default: 100)
+- PROFILE_SAMPLE_INTERVAL_MS: stack sampling interval (default: 5)
+- PROFILE_SAMPLE_RATE:        fraction of requests profiled in the background (default: 0)
+- PROFILE_MAX_CONCURRENT:     sampling profiles running at once (default: 2)
+"""
+
+import os
+import sys
+import hmac
+import glob
+import time
+import random
+import secrets
+import pstats
+import marshal
+import cProfile
+import logging
+import tempfile
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'deterministic')
+
+SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+SPOOL_DIR = os.getenv('PROFILE_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'verifyx-profiles'))
+SPOOL_MAX_FILES = int(os.getenv('PROFILE_SPOOL_MAX_FILES', 100))
+
+_current = contextvars.ContextVar('profile', default=None)
+_slots = threading.BoundedSemaphore(int(os.getenv('PROFILE_MAX_CONCURRENT', 2)))
+_deterministic = threading.Lock()
+_written = 0
+
+
+class ProfilerBusy(Exception):
+    """Raised when no profiling slot is free."""
+
+
+def authorized(token: str) -> bool:
+    """Does `token` match PROFILE_ADMIN_TOKEN?  Always false when no token is configured."""
+    expected = os.getenv('PROFILE_ADMIN_TOKEN')
+    return bool(expected) and bool(token) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def sampled() -> bool:
+    """Should this request be profiled in the background?"""
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """One request's profile: the request thread plus any stage threads attached to it."""
+
+    def __init__(self, mode: str, label: str):
+        self.mode = mode
+        self.label = label
+        self.id = secrets.token_hex(3)
+        self._threads = {}           # thread ident -> (name, attach count)
+        self._lock = threading.Lock()
+        self._profilers = []
+        self._stacks = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+        self.stopped = False
+        self.elapsed = 0.0
+
+    # -- threads ------------------------------------------------------
+
+    def _add_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            name, count = self._threads.get(ident, (threading.current_thread().name, 0))
+            self._threads[ident] = (name, count + 1)
+
+    def _remove_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            name, count = self._threads.get(ident, (None, 1))
+            if count <= 1:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] = (name, count - 1)
+
+    def _enable_cprofile(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: one process-wide profiler already covers this thread
+            return None
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    # -- sampling -----------------------------------------------------
+
+    def _sample_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, (name, _) in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[';'.join([name] + stack[::-1])] += 1
+            self._samples += 1
+
+    # -- lifecycle ----------------------------------------------------
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._add_thread()
+        if self.mode == 'deterministic':
+            self._enable_cprofile()
+        else:
+            interval = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000
+            self._sampler = threading.Thread(target=self._sample_loop, args=(interval,),
+                                             name='profiler-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self.stopped = True
+        self.elapsed = time.perf_counter() - self._started
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        for profiler in self._profilers:
+            profiler.disable()
+        self._remove_thread()
+
+    def output(self) -> tuple:
+        """(bytes, file extension) of the finished profile."""
+        if self.mode == 'deterministic':
+            stats = None
+            for profiler in self._profilers:
+                if stats is None:
+                    stats = pstats.Stats(profiler)
+                else:
+                    stats.add(profiler)
+            return marshal.dumps(stats.stats if stats is not None else {}), 'prof'
+
+        lines = [f'{stack} {count}' for stack, count in self._stacks.most_common()]
+        return ('\n'.join(lines) + '\n').encode(), 'collapsed'
+
+    def filename(self) -> str:
+        safe = ''.join(c if c.isalnum() else '_' for c in self.label).strip('_')
+        extension = 'prof' if self.mode == 'deterministic' else 'collapsed'
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.id}-{safe}.{extension}"
+
+
+def start(mode: str, label: str) -> tuple:
+    """
+    Start profiling the current request.  Returns (profile, token for finish()).
+
+    Raises:
+        ProfilerBusy when the concurrency limit (or, for deterministic mode,
+        the one-at-a-time rule) leaves no room
+    """
+    if not _slots.acquire(blocking=False):
+        raise ProfilerBusy('Too many requests are being profiled')
+    if mode == 'deterministic' and not _deterministic.acquire(blocking=False):
+        _slots.release()
+        raise ProfilerBusy('A deterministic profile is already running')
+
+    profile = Profile(mode, label)
+    profile.start()
+    return profile, _current.set(profile)
+
+
+def finish(profile: Profile, token):
+    """Stop profiling and release the slot.  Safe to call once per start()."""
+    try:
+        profile.stop()
+    finally:
+        _current.reset(token)
+        if profile.mode == 'deterministic':
+            _deterministic.release()
+        _slots.release()
+
+
+@contextmanager
+def attach():
+    """Include the current (worker) thread in the profile of the request that handed it work."""
+    profile = _current.get()
+    if profile is None or profile.stopped:
+        # Work outliving its request (pre-submission) is not part of the profile
+        yield
+        return
+    profile._add_thread()
+    profiler = profile._enable_cprofile() if profile.mode == 'deterministic' else None
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        profile._remove_thread()
+
+
+def write_spool(profile: Profile) -> str:
+    """Write the profile to the spool directory, dropping the oldest beyond SPOOL_MAX_FILES."""
+    global _written
+    data, _ = profile.output()
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, profile.filename())
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    files = sorted(glob.glob(os.path.join(SPOOL_DIR, '*.prof')) +
+                   glob.glob(os.path.join(SPOOL_DIR, '*.collapsed')), key=os.path.getmtime)
+    for old in files[:max(0, len(files) - SPOOL_MAX_FILES)]:
+        try:
+            os.unlink(old)
+        except OSError:
+            pass
+    _written += 1
+    logger.info(f"Wrote {profile.mode} profile of {profile.label} to {path}")
+    return path
+
+
+def stats() -> dict:
+    return {
+        'on_demand':     bool(os.getenv('PROFILE_ADMIN_TOKEN')),
+        'sample_rate':   SAMPLE_RATE,
+        'spool_dir':     SPOOL_DIR,
+        'spool_written': _written,
+    }
@@ -0,0 +1,112 @@
+"""
+Result Cache
+============
+Small thread-safe LRU cache with a TTL, bounded by entry count and bytes.
+
+Used to deduplicate expensive per-request work (e.g. Tesseract) when the
+same input is submitted more than once.  The cache is per process — under
+gunicorn each worker holds its own copy.
+"""
+
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from .metrics import record_cache_lookup
+
+
+def estimate_size(value) -> int:
+    """Approximate in-memory footprint of a JSON-like value, in bytes."""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ResultCache:
+    """LRU + TTL cache bounded by `max_entries` and `max_bytes`."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float, name: str = 'default'):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key: str):
+        """Return a copy of the cached value, or None on miss / expiry."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                record_cache_lookup(self.name, False)
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self._misses += 1
+                record_cache_lookup(self.name, False)
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        record_cache_lookup(self.name, True)
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value, size: int = None):
+        """Store a copy of `value`.  Values larger than the whole budget are not cached."""
+        if not self.enabled:
+            return
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled':     self.enabled,
+                'entries':     len(self._entries),
+                'bytes':       self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes':   self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits':        self._hits,
+                'misses':      self._misses,
+                'evictions':   self._evictions,
+                'hit_ratio':   round(self._hits / lookups, 4) if lookups else 0.0,
+            }
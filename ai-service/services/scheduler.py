@@ -0,0 +1,232 @@
+"""
+Engine Scheduler
+================
+Priority lanes and per-client fair share in front of the face, liveness
+and OCR engines.
+
+Every engine call takes a slot from that engine's scheduler first.  When
+slots are contended, waiters are granted in this order:
+
+1. Lane — 'interactive' before 'batch'.  A batch waiter that has waited
+   longer than SCHED_BATCH_MAX_WAIT_MS is promoted so backfills can't starve.
+2. Fair share — clients below their quota (SCHED_CLIENT_MAX_SHARE of the
+   engine's slots) go first, and among those the client with the fewest
+   running calls wins.  Quotas only bite under contention: an idle engine
+   is never held back.
+3. FIFO within a client.
+
+Slots are taken per stage, so a batch verification gives up its place
+between stages and interactive work overtakes it at each boundary.
+
+The lane and client of the current request travel in a context variable
+(see `request_lane`), which the pipeline's stage pool copies into its threads.
+
+Configuration (env):
+- SCHED_FACE_SLOTS / SCHED_LIVENESS_SLOTS / SCHED_OCR_SLOTS: concurrent calls per engine
+  (default: 2 / 4 / 4; face defaults to FACE_BATCH_MAX_SIZE while FACE_MICROBATCH
+  is on, so enough requests reach the embedding batcher to fill a batch)
+- SCHED_CLIENT_MAX_SHARE:  fraction of an engine's slots one client may hold under contention (default: 0.5)
+- SCHED_BATCH_MAX_WAIT_MS: batch waiters older than this are treated as interactive (default: 30000)
+"""
+
+import os
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from .deadline import DeadlineExceeded
+from .metrics import observe_stage
+
+LANES = ('interactive', 'batch')
+DEFAULT_LANE = 'interactive'
+
+_current_lane = contextvars.ContextVar('scheduler_lane', default=(DEFAULT_LANE, 'anonymous'))
+
+
+@contextmanager
+def request_lane(lane: str, client_id: str):
+    """Run the enclosed work in `lane` on behalf of `client_id`."""
+    if lane not in LANES:
+        lane = DEFAULT_LANE
+    token = _current_lane.set((lane, client_id or 'anonymous'))
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def set_request_lane(lane: str, client_id: str):
+    """Non-scoped variant of request_lane, for request hooks.  Returns a reset token."""
+    if lane not in LANES:
+        lane = DEFAULT_LANE
+    return _current_lane.set((lane, client_id or 'anonymous'))
+
+
+def reset_request_lane(token):
+    _current_lane.reset(token)
+
+
+def current_lane() -> tuple:
+    return _current_lane.get()
+
+
+class _Ticket:
+    __slots__ = ('lane', 'client', 'enqueued_at', 'granted')
+
+    def __init__(self, lane: str, client: str):
+        self.lane = lane
+        self.client = client
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class EngineScheduler:
+    """Slot scheduler for one engine."""
+
+    def __init__(self, engine: str, slots: int, client_max_share: float = 0.5,
+                 batch_max_wait_ms: float = 30000):
+        self.engine = engine
+        self.slots = max(1, slots)
+        self.client_quota = max(1, math.ceil(self.slots * client_max_share))
+        self.batch_max_wait = batch_max_wait_ms / 1000
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiters = []
+        self._running_by_client = {}
+
+        self._lane_stats = {
+            lane: {'waiting': 0, 'running': 0, 'admitted': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0}
+            for lane in LANES
+        }
+
+    def _effective_lane(self, ticket: _Ticket, now: float) -> int:
+        if ticket.lane == 'batch' and now - ticket.enqueued_at > self.batch_max_wait:
+            return 0
+        return LANES.index(ticket.lane)
+
+    def _pick(self) -> _Ticket:
+        now = time.monotonic()
+        under_quota = [
+            t for t in self._waiters
+            if self._running_by_client.get(t.client, 0) < self.client_quota
+        ]
+        candidates = under_quota or self._waiters
+        return min(candidates, key=lambda t: (
+            self._effective_lane(t, now),
+            self._running_by_client.get(t.client, 0),
+            t.enqueued_at,
+        ))
+
+    def _dispatch(self):
+        granted = False
+        while self._waiters and self._in_use < self.slots:
+            ticket = self._pick()
+            self._waiters.remove(ticket)
+            self._grant(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _grant(self, ticket: _Ticket):
+        ticket.granted = True
+        self._in_use += 1
+        self._running_by_client[ticket.client] = self._running_by_client.get(ticket.client, 0) + 1
+
+        wait_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+        stats = self._lane_stats[ticket.lane]
+        stats['waiting'] -= 1
+        stats['running'] += 1
+        stats['admitted'] += 1
+        stats['wait_ms_total'] += wait_ms
+        stats['wait_ms_max'] = max(stats['wait_ms_max'], wait_ms)
+
+    def _release(self, ticket: _Ticket):
+        self._in_use -= 1
+        remaining = self._running_by_client[ticket.client] - 1
+        if remaining:
+            self._running_by_client[ticket.client] = remaining
+        else:
+            del self._running_by_client[ticket.client]
+        self._lane_stats[ticket.lane]['running'] -= 1
+        self._dispatch()
+
+    @contextmanager
+    def slot(self, deadline=None):
+        """
+        Hold one engine slot for the duration of the block, in the current request's lane.
+
+        With a deadline, gives up waiting (DeadlineExceeded) once it expires —
+        there is no point starting engine work the client won't wait for.
+        """
+        lane, client = current_lane()
+        ticket = _Ticket(lane, client)
+        with self._cond:
+            self._lane_stats[lane]['waiting'] += 1
+            self._waiters.append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    self._waiters.remove(ticket)
+                    self._lane_stats[lane]['waiting'] -= 1
+                    raise DeadlineExceeded(f"Request deadline exceeded waiting for a {self.engine} slot")
+                self._cond.wait(remaining)
+        observe_stage(self.engine, 'slot_wait', time.monotonic() - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._release(ticket)
+
+    def stats(self) -> dict:
+        with self._cond:
+            lanes = {}
+            for lane, s in self._lane_stats.items():
+                lanes[lane] = {
+                    'waiting':     s['waiting'],
+                    'running':     s['running'],
+                    'admitted':    s['admitted'],
+                    'avg_wait_ms': round(s['wait_ms_total'] / s['admitted'], 1) if s['admitted'] else 0.0,
+                    'max_wait_ms': round(s['wait_ms_max'], 1),
+                }
+            return {
+                'slots':        self.slots,
+                'in_use':       self._in_use,
+                'client_quota': self.client_quota,
+                'clients':      len(self._running_by_client),
+                'lanes':        lanes,
+            }
+
+
+_share = float(os.getenv('SCHED_CLIENT_MAX_SHARE', 0.5))
+_batch_wait = float(os.getenv('SCHED_BATCH_MAX_WAIT_MS', 30000))
+
+
+def _default_face_slots() -> int:
+    # Two slots let at most ~4 crops reach the micro-batcher (services/face_batcher.py):
+    # its batches could never fill, and each would wait out FACE_BATCH_MAX_WAIT_MS
+    if os.getenv('FACE_MICROBATCH', 'true').lower() == 'true':
+        return max(2, int(os.getenv('FACE_BATCH_MAX_SIZE', 8)))
+    return 2
+
+
+schedulers = {
+    'face':     EngineScheduler('face', int(os.getenv('SCHED_FACE_SLOTS', _default_face_slots())), _share, _batch_wait),
+    'liveness': EngineScheduler('liveness', int(os.getenv('SCHED_LIVENESS_SLOTS', 4)), _share, _batch_wait),
+    'ocr':      EngineScheduler('ocr', int(os.getenv('SCHED_OCR_SLOTS', 4)), _share, _batch_wait),
+}
+
+
+def run_scheduled(engine: str, fn, *args, **kwargs):
+    """Call `fn` while holding a slot on `engine`'s scheduler.  A `deadline` kwarg also bounds the wait."""
+    with schedulers[engine].slot(kwargs.get('deadline')):
+        return fn(*args, **kwargs)
+
+
+def scheduler_stats() -> dict:
+    return {engine: s.stats() for engine, s in schedulers.items()}
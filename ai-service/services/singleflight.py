@@ -0,0 +1,150 @@
+"""
+Single-Flight Coalescing
+========================
+Identical requests that arrive while one is already running share its
+result instead of running the same engines again.
+
+Clients that retry on timeout, or double-submit from the UI, send the
+same multi-megabyte payload several times within seconds.  The first
+request for a key (endpoint + SHA-256 of the payload) becomes the leader
+and does the work; followers wait for it and get a copy of its result.
+
+- Errors are shared: a payload that fails for the leader fails the same
+  way for everyone.
+- Results and errors that only reflect the leader's own time budget
+  (a partial result, DeadlineExceeded) are not shared — followers run the
+  request again themselves (one of them becomes the new leader).
+- Followers wait no longer than their own deadline.
+- If the leader dies without a result, followers are released and retry.
+
+Configuration (env):
+- SINGLEFLIGHT_ENABLED: 'false' to disable coalescing (default: true)
+"""
+
+import os
+import copy
+import json
+import hashlib
+import threading
+
+from .deadline import DeadlineExceeded, remaining
+from .metrics import record_cache_lookup
+
+_RETRY = object()
+
+
+def request_key(endpoint: str, *parts) -> str:
+    """Key for a request: endpoint + SHA-256 over the (JSON-encoded) parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return f'{endpoint}:{digest.hexdigest()}'
+
+
+def _fresh(error: Exception) -> Exception:
+    """A copy of a shared exception, so each follower raises with its own traceback."""
+    try:
+        return copy.copy(error).with_traceback(None)
+    except Exception:
+        return error
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = _RETRY
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._retried = 0
+
+    def do(self, key: str, fn, deadline=None, shareable=None) -> tuple:
+        """
+        Run `fn()` once for all concurrent callers with the same key.
+
+        Args:
+            key:       request key (see request_key)
+            fn:        zero-argument callable doing the work
+            deadline:  this caller's Deadline; bounds how long a follower waits
+            shareable: optional predicate — results it rejects are not handed
+                       to followers (they run the request themselves)
+
+        Returns:
+            (result, coalesced) — coalesced is True when the result came
+            from another caller's run
+        """
+        if not self.enabled:
+            return fn(), False
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._leaders += 1
+                else:
+                    flight.followers += 1
+
+            if leader:
+                record_cache_lookup('singleflight', False)
+                return self._lead(key, flight, fn, shareable), False
+
+            if not flight.done.wait(remaining(deadline)):
+                raise DeadlineExceeded('Request deadline exceeded waiting for an identical request in flight')
+
+            if flight.error is not None:
+                raise _fresh(flight.error)
+            if flight.result is not _RETRY:
+                with self._lock:
+                    self._coalesced += 1
+                record_cache_lookup('singleflight', True)
+                return copy.deepcopy(flight.result), True
+
+            with self._lock:
+                self._retried += 1
+
+    def _lead(self, key: str, flight: _Flight, fn, shareable):
+        try:
+            result = fn()
+            if shareable is None or shareable(result):
+                flight.result = result
+            return result
+        except DeadlineExceeded:
+            raise  # the leader's budget, not the payload's fault — followers retry
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled':   self.enabled,
+                'in_flight': len(self._flights),
+                'waiting':   sum(f.followers for f in self._flights.values()),
+                'leaders':   self._leaders,
+                'coalesced': self._coalesced,
+                'retried':   self._retried,
+            }
+
+
+singleflight = SingleFlight(enabled=os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true')
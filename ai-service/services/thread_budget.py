@@ -0,0 +1,128 @@
+"""
+Thread Budget
+=============
+One place that decides how many threads each native library may use.
+
+Left alone, TensorFlow's intra/inter-op pools, OpenCV and Tesseract's
+OpenMP each size themselves to every core on the node — in every gunicorn
+worker.  With N workers that is N × (several pools) × cores threads
+fighting over the same cores.  Instead, the node's cores are divided
+across the workers first, and each worker's share across the libraries:
+
+    cores per worker = cores // workers
+    TensorFlow intra-op  = cores per worker
+    TensorFlow inter-op  = min(2, cores per worker)
+    OpenCV               = max(1, cores per worker // 2)
+    OCR pool processes   = min(4, cores per worker)
+    Tesseract OpenMP     = 1   (parallelism comes from the OCR pool)
+    BLAS / OpenMP (numpy)= 1
+
+`apply()` runs when the services package is imported, before numpy or
+TensorFlow initialise their pools; TensorFlow and OpenCV are also
+configured explicitly when they are first loaded.
+
+Configuration (env) — every value can be overridden:
+- THREAD_BUDGET_CORES:    cores available to this service (default: CPU affinity)
+- THREAD_BUDGET_WORKERS:  worker processes sharing them (default: worker_processes())
+- TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS / CV2_THREADS / TESSERACT_OMP_THREADS
+- OCR_POOL_SIZE:          OCR worker processes (see services/ocr_pool.py)
+
+Benchmark mode compares splits on this machine:
+
+    python -m benchmarks.thread_split --engine liveness --splits 4x1,2x2,1x4
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def cores() -> int:
+    """CPU cores this process may run on (its affinity mask where available)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def worker_processes() -> int:
+    """
+    Worker processes serving the app on this node.
+
+    gunicorn.conf.py exports its worker count (default 2) as GUNICORN_WORKERS
+    before the app is preloaded; everything else (dev server, uvicorn) is a
+    single process.  Anything sized per process reads the count from here.
+    """
+    return max(1, int(os.getenv('GUNICORN_WORKERS', 1)))
+
+
+def compute_budget() -> dict:
+    """Thread counts for this process, from the core split plus env overrides."""
+    available = int(os.getenv('THREAD_BUDGET_CORES', cores()))
+    workers = int(os.getenv('THREAD_BUDGET_WORKERS', worker_processes()))
+    per_worker = max(1, available // max(1, workers))
+
+    return {
+        'cores':          available,
+        'workers':        workers,
+        'per_worker':     per_worker,
+        'tf_intra_op':    int(os.getenv('TF_INTRA_OP_THREADS', per_worker)),
+        'tf_inter_op':    int(os.getenv('TF_INTER_OP_THREADS', min(2, per_worker))),
+        'cv2':            int(os.getenv('CV2_THREADS', max(1, per_worker // 2))),
+        'ocr_pool':       int(os.getenv('OCR_POOL_SIZE', min(4, per_worker))),
+        'tesseract_omp':  int(os.getenv('TESSERACT_OMP_THREADS', 1)),
+    }
+
+
+_budget = None
+
+
+def budget() -> dict:
+    """The budget applied to this process (computed on first use)."""
+    global _budget
+    if _budget is None:
+        _budget = compute_budget()
+    return _budget
+
+
+# Variables apply() exports; clear them to let a child process compute its own budget
+DERIVED_ENV = ('TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS', 'OMP_THREAD_LIMIT',
+               'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def apply():
+    """
+    Export the budget to the environment variables the libraries read at init.
+
+    Must run before numpy/TensorFlow are imported; child processes
+    (Tesseract, OCR pool workers) inherit it.
+    """
+    b = budget()
+    env = {
+        'TF_NUM_INTRAOP_THREADS': b['tf_intra_op'],
+        'TF_NUM_INTEROP_THREADS': b['tf_inter_op'],
+        'OMP_THREAD_LIMIT':       b['tesseract_omp'],
+        'OMP_NUM_THREADS':        1,
+        'OPENBLAS_NUM_THREADS':   1,
+        'MKL_NUM_THREADS':        1,
+    }
+    for name, value in env.items():
+        # An explicitly set variable always wins
+        os.environ.setdefault(name, str(value))
+    logger.debug(f"Thread budget: {b}")
+
+
+def configure_tensorflow(tf):
+    """Apply the TensorFlow part of the budget; a no-op once TF's runtime has started."""
+    b = budget()
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(b['tf_intra_op'])
+        tf.config.threading.set_inter_op_parallelism_threads(b['tf_inter_op'])
+    except RuntimeError:
+        # Already initialised — the env vars from apply() were in effect
+        pass
+
+
+def configure_cv2(cv2):
+    cv2.setNumThreads(budget()['cv2'])
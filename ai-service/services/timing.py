@@ -0,0 +1,192 @@
+"""
+Request Timing Breakdown
+========================
+Nested per-request timings of every engine stage, plus a log of slow
+requests.
+
+A request's root span lives in a context variable; `metrics.stage()`
+opens a child span for each step it times, so the tree follows the real
+call nesting — including stages running on the pipeline's thread pool,
+which copies the request's context.  Repeated siblings (one per liveness
+frame, one per face) are folded into a single node with count, total,
+average and maximum.
+
+- Send `X-Timing-Breakdown: true` and a JSON response gains a
+  `timing_breakdown` tree (and a Server-Timing header).
+- Requests slower than SLOW_REQUEST_MS are logged with their stage
+  timings and a summary of the inputs: sizes and SHA-256 prefixes of
+  every image field, never the images themselves.
+
+Configuration (env):
+- SLOW_REQUEST_MS:       log requests slower than this; 0 disables (default: 5000)
+- SLOW_REQUEST_LOG_FILE: also append slow-request records (JSON lines) to this file, rotated at 10MB
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 5000))
+
+# Strings longer than this in a request body are treated as payloads (images)
+_PAYLOAD_MIN_CHARS = 256
+
+_current = contextvars.ContextVar('timing_span', default=None)
+
+
+class Span:
+    """One timed step and the steps it contained."""
+
+    __slots__ = ('name', 'started', 'seconds', 'children', 'cpu_seconds', 'rss_delta', 'alloc_peak')
+
+    def __init__(self, name: str, seconds: float = None):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = seconds
+        self.children = []
+        # Filled in by metrics.stage() when resource accounting is on (services/usage.py)
+        self.cpu_seconds = None
+        self.rss_delta = None
+        self.alloc_peak = None
+
+    def finish(self):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self.started
+
+
+def start(name: str):
+    """Begin the root span of a request.  Returns (span, token for finish())."""
+    root = Span(name)
+    return root, _current.set(root)
+
+
+def finish(root: Span, token):
+    root.finish()
+    _current.reset(token)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time the enclosed block as a child of the current span.
+
+    Yields the new Span, or None outside a traced request.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    node = Span(name)
+    parent.children.append(node)  # list.append is atomic; stage threads share parents
+    token = _current.set(node)
+    try:
+        yield node
+    finally:
+        node.finish()
+        _current.reset(token)
+
+
+def record(name: str, seconds: float):
+    """Add an already measured step under the current span."""
+    parent = _current.get()
+    if parent is not None:
+        parent.children.append(Span(name, seconds))
+
+
+def _merge(spans: list) -> list:
+    """Fold same-named siblings into one node, recursively."""
+    groups = {}
+    for s in spans:
+        groups.setdefault(s.name, []).append(s)
+
+    nodes = []
+    for name, group in groups.items():
+        durations = [s.seconds or 0.0 for s in group]
+        node = {'name': name, 'ms': round(sum(durations) * 1000, 2)}
+        if len(group) > 1:
+            node['count'] = len(group)
+            node['avg_ms'] = round(node['ms'] / len(group), 2)
+            node['max_ms'] = round(max(durations) * 1000, 2)
+        cpu = [s.cpu_seconds for s in group if s.cpu_seconds is not None]
+        if cpu:
+            node['cpu_ms'] = round(sum(cpu) * 1000, 2)
+            node['rss_delta_bytes'] = sum(s.rss_delta or 0 for s in group)
+        alloc = [s.alloc_peak for s in group if s.alloc_peak is not None]
+        if alloc:
+            node['alloc_peak_bytes'] = max(alloc)
+        children = _merge([c for s in group for c in s.children])
+        if children:
+            node['children'] = children
+        nodes.append(node)
+    return nodes
+
+
+def breakdown(root: Span) -> dict:
+    """The request's timing tree as plain JSON."""
+    return _merge([root])[0]
+
+
+def server_timing(tree: dict) -> str:
+    """Server-Timing header value for the top-level stages."""
+    parts = [f"total;dur={tree['ms']}"]
+    for child in tree.get('children', []):
+        parts.append(f"{child['name'].replace(' ', '_')};dur={child['ms']}")
+    return ', '.join(parts)
+
+
+# -------------------------------------------------------
+# Slow-request log
+# -------------------------------------------------------
+
+def _summarize(value):
+    """Request body with every payload string replaced by its size and hash."""
+    if isinstance(value, str) and len(value) >= _PAYLOAD_MIN_CHARS:
+        return {'chars': len(value), 'sha256': hashlib.sha256(value.encode()).hexdigest()[:16]}
+    if isinstance(value, list):
+        if value and all(isinstance(v, str) and len(v) >= _PAYLOAD_MIN_CHARS for v in value):
+            return {'items': len(value), 'chars': sum(len(v) for v in value),
+                    'sha256': [_summarize(v)['sha256'] for v in value]}
+        return [_summarize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _summarize(v) for k, v in value.items()}
+    return value
+
+
+def summarize_inputs(body, content_length: int = None) -> dict:
+    """Sizes, hashes and small parameters of a request — never its images."""
+    if isinstance(body, dict):
+        return {'content_length': content_length, 'fields': _summarize(body)}
+    return {'content_length': content_length}
+
+
+_slow_log = logging.getLogger('verifyx.slow_requests')
+_slow_file = os.getenv('SLOW_REQUEST_LOG_FILE')
+if _slow_file:
+    _handler = RotatingFileHandler(_slow_file, maxBytes=10 * 1024 * 1024, backupCount=3)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    _slow_log.addHandler(_handler)
+
+
+def log_slow_request(endpoint: str, method: str, status: int, elapsed_ms: float,
+                     inputs: dict, tree: dict):
+    _slow_log.warning(json.dumps({
+        'event':      'slow_request',
+        'endpoint':   endpoint,
+        'method':     method,
+        'status':     status,
+        'elapsed_ms': round(elapsed_ms, 1),
+        'pid':        os.getpid(),
+        'inputs':     inputs,
+        'timing':     tree,
+    }, default=str))
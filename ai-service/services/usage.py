@@ -0,0 +1,190 @@
+"""
+Resource Accounting
+===================
+CPU time and memory used per request and per engine stage, for capacity
+planning (images per core-second) and for spotting memory spikes.
+
+- Thread CPU time (`time.thread_time`) of every `metrics.stage()` and of
+  each request: its own thread plus the pipeline stage threads working
+  for it.  Tesseract subprocesses, the OCR process pool and the shared
+  face-batcher thread are not attributed to a request.
+- Decoded image bytes: every decoded image / liveness frame is counted
+  against its request (total and largest).
+- Process RSS deltas (current RSS from /proc/self/statm, or the peak from
+  `resource.getrusage` elsewhere) across each stage and request.
+- With RESOURCE_TRACE_MALLOC=true, `tracemalloc` also reports each stage's
+  allocation peak above what was allocated when it started.  tracemalloc
+  is process-wide and slows allocation down, so use it with one request
+  at a time — benchmarks, soak tests, reproducing a spike.
+
+Everything lands in Prometheus (services/metrics.py) and, for traced
+requests, in the timing breakdown (`cpu_ms`, `rss_delta_bytes`, ...).
+
+Configuration (env):
+- RESOURCE_ACCOUNTING:   'false' to stop measuring CPU and memory per stage/request (default: true)
+- RESOURCE_TRACE_MALLOC: 'true' to track per-stage allocation peaks with tracemalloc (default: false)
+"""
+
+import os
+import time
+import threading
+import tracemalloc
+import contextvars
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENABLED = os.getenv('RESOURCE_ACCOUNTING', 'true').lower() == 'true'
+TRACE_MALLOC = ENABLED and os.getenv('RESOURCE_TRACE_MALLOC', 'false').lower() == 'true'
+
+if TRACE_MALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_current = contextvars.ContextVar('request_usage', default=None)
+_alloc_frame = contextvars.ContextVar('alloc_frame', default=None)
+
+
+# -------------------------------------------------------
+# Process memory
+# -------------------------------------------------------
+
+_statm = {'pid': None, 'fd': None}
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of this process's RSS."""
+    if resource is None:
+        return 0
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def rss_bytes() -> int:
+    """Current RSS of this process (the peak where /proc is unavailable)."""
+    pid = os.getpid()
+    if _statm['pid'] != pid:
+        # /proc/self is resolved at open(); a forked worker needs its own fd
+        try:
+            _statm['fd'] = os.open('/proc/self/statm', os.O_RDONLY)
+        except OSError:
+            _statm['fd'] = None
+        _statm['pid'] = pid
+    if _statm['fd'] is None:
+        return peak_rss_bytes()
+    return int(os.pread(_statm['fd'], 128, 0).split()[1]) * _PAGE_SIZE
+
+
+# -------------------------------------------------------
+# Per stage
+# -------------------------------------------------------
+
+class Sample:
+    """CPU and memory used by one block of code on one thread."""
+
+    __slots__ = ('cpu_seconds', 'rss_delta', 'alloc_peak',
+                 '_cpu', '_rss', '_alloc_start', '_alloc_max', '_token')
+
+    def __init__(self):
+        self.cpu_seconds = None
+        self.rss_delta = None
+        self.alloc_peak = None
+
+    def start(self):
+        self._cpu = time.thread_time()
+        self._rss = rss_bytes()
+        if TRACE_MALLOC:
+            current, peak = tracemalloc.get_traced_memory()
+            parent = _alloc_frame.get()
+            if parent is not None:
+                # reset_peak() below would hide the parent's peak so far
+                parent._alloc_max = max(parent._alloc_max, peak)
+            tracemalloc.reset_peak()
+            self._alloc_start, self._alloc_max = current, current
+            self._token = _alloc_frame.set(self)
+        return self
+
+    def stop(self):
+        self.cpu_seconds = time.thread_time() - self._cpu
+        self.rss_delta = rss_bytes() - self._rss
+        if TRACE_MALLOC:
+            peak = max(self._alloc_max, tracemalloc.get_traced_memory()[1])
+            self.alloc_peak = peak - self._alloc_start
+            _alloc_frame.reset(self._token)
+            parent = _alloc_frame.get()
+            if parent is not None:
+                parent._alloc_max = max(parent._alloc_max, peak)
+
+
+def measure() -> Sample:
+    """Start measuring the current thread; call `.stop()` on the result.  None when disabled."""
+    return Sample().start() if ENABLED else None
+
+
+# -------------------------------------------------------
+# Per request
+# -------------------------------------------------------
+
+class RequestUsage:
+    """Resources charged to one request, from any of the threads working for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread_cpu = time.thread_time()
+        self._rss = rss_bytes()
+        self._peak_rss = peak_rss_bytes()
+        self.worker_cpu_seconds = 0.0
+        self.images = 0
+        self.image_bytes = 0
+        self.largest_image_bytes = 0
+
+    def add_cpu(self, seconds: float):
+        with self._lock:
+            self.worker_cpu_seconds += seconds
+
+    def add_image(self, nbytes: int):
+        with self._lock:
+            self.images += 1
+            self.image_bytes += nbytes
+            self.largest_image_bytes = max(self.largest_image_bytes, nbytes)
+
+    def report(self) -> dict:
+        """Usage so far.  Call from the request's own thread."""
+        with self._lock:
+            cpu = (time.thread_time() - self._thread_cpu) + self.worker_cpu_seconds
+            return {
+                'cpu_ms':                round(cpu * 1000, 2),
+                'images_decoded':        self.images,
+                'decoded_image_bytes':   self.image_bytes,
+                'largest_image_bytes':   self.largest_image_bytes,
+                'rss_delta_bytes':       rss_bytes() - self._rss,
+                'peak_rss_growth_bytes': peak_rss_bytes() - self._peak_rss,
+            }
+
+
+def start():
+    """Begin accounting for the current request.  Returns (usage, token for finish())."""
+    usage = RequestUsage()
+    return usage, _current.set(usage)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def charge_cpu(seconds: float):
+    """Charge CPU time spent on another thread to the request that handed it the work."""
+    usage = _current.get()
+    if usage is not None:
+        usage.add_cpu(seconds)
+
+
+def charge_image(nbytes: int):
+    """Count a decoded image against the current request."""
+    usage = _current.get()
+    if usage is not None:
+        usage.add_image(nbytes)
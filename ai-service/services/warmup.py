@@ -0,0 +1,167 @@
+"""
+Engine Warmup
+=============
+Loads the engines before traffic arrives and tracks whether the process
+is ready to serve.
+
+Under gunicorn (see gunicorn.conf.py) warmup is split around the fork:
+
+- In the master, `warm_in_master()` loads everything that is safe to
+  share: the OpenCV cascades, the Tesseract check, and the DeepFace /
+  TensorFlow modules.  Workers inherit those pages copy-on-write.
+- In each worker, `after_fork()` drops pools inherited from the master,
+  then loads the rest (the face model, the OCR process pool) on a
+  background thread.
+
+TensorFlow's thread pools do not survive a fork, so the face model itself
+is only built in the master with PRELOAD_FACE_MODEL=true — use that only
+with a TensorFlow build known to tolerate it.  To share one copy of the
+model across workers, run the model server (services/model_server.py).
+
+Engines are warmed in parallel, one thread each, and in the background
+wherever possible so the process binds its port immediately.  Per-engine
+state and load durations back /health/ready; `is_ready()` is false until
+every engine has been attempted.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from .metrics import record_engine_state
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('face', 'liveness', 'ocr')
+
+_lock = threading.Lock()
+_state = {engine: {'state': 'pending', 'load_ms': None, 'error': None} for engine in ENGINES}
+_started_at = time.time()
+
+
+def _set_state(engine: str, state: str, load_ms: int = None, error: str = None, record: bool = True):
+    with _lock:
+        _state[engine] = {'state': state, 'load_ms': load_ms, 'error': error}
+    # The gunicorn master serves no requests and never exits: a gauge it set
+    # would hold the fleet-wide minimum at 0 forever.  Workers record the
+    # state they inherit in after_fork().
+    if record:
+        record_engine_state(engine, state, load_ms)
+
+
+def warm_engine(engine: str, in_master: bool = False):
+    """Warm one engine; failures are logged and the engine loads on first use instead."""
+    from .face_verification import FaceVerificationService
+    from .liveness_detection import LivenessDetectionService
+    from .ocr_service import OCRService
+
+    record = not in_master
+    _set_state(engine, 'loading', record=record)
+    start = time.time()
+    error = None
+    try:
+        if engine == 'face':
+            build_model = not in_master or os.getenv('PRELOAD_FACE_MODEL', 'false').lower() == 'true'
+            FaceVerificationService.warmup(build_model=build_model)
+            # Library-only preload leaves the model to each worker
+            if not build_model:
+                _set_state(engine, 'pending', record=record)
+                return
+            ready = FaceVerificationService.is_ready()
+        elif engine == 'liveness':
+            LivenessDetectionService.warmup()
+            ready = LivenessDetectionService.is_ready()
+        else:
+            # Pool processes belong to workers, not the master
+            OCRService.warmup(start_pool=not in_master)
+            ready = OCRService.is_ready()
+    except Exception as e:
+        logger.warning(f"Warmup of {engine} engine failed: {e}")
+        ready, error = False, str(e)
+
+    load_ms = int((time.time() - start) * 1000)
+    if ready:
+        _set_state(engine, 'ready', load_ms, record=record)
+        logger.info(f"Warmed {engine} engine in {load_ms}ms")
+    else:
+        _set_state(engine, 'failed', load_ms, error or 'engine did not report ready', record=record)
+        logger.warning(f"{engine} engine not warmed — it loads on first request")
+
+
+def warm_parallel(engines=ENGINES, in_master: bool = False, wait: bool = True) -> list:
+    """Warm `engines` concurrently, one thread each.  Returns the threads."""
+    threads = [
+        threading.Thread(target=warm_engine, args=(engine, in_master),
+                         name=f'warmup-{engine}', daemon=True)
+        for engine in engines
+    ]
+    for t in threads:
+        t.start()
+    if wait:
+        for t in threads:
+            t.join()
+    return threads
+
+
+def start_background():
+    """Warm every engine in the background (dev server / single process)."""
+    warm_parallel(wait=False)
+
+
+def warm_in_master():
+    """gunicorn master, before forking: load what workers can share copy-on-write."""
+    warm_parallel(in_master=True)
+
+
+def after_fork():
+    """
+    gunicorn worker, right after fork: reinitialise pools and finish warmup.
+
+    Thread and process pools created in the master are unusable here, so
+    they are dropped and rebuilt.  Whatever the master didn't warm (or
+    warmed only partly) is loaded in the background so the worker starts
+    answering /health/live immediately.
+    """
+    from .ocr_pool import get_ocr_pool
+    from .pipeline import stage_executor
+
+    global _started_at
+    _started_at = time.time()
+
+    stage_executor.shutdown()
+    pool = get_ocr_pool()
+    if pool is not None:
+        pool.shutdown()
+
+    with _lock:
+        todo = [engine for engine, s in _state.items() if s['state'] not in ('ready', 'lazy')]
+        if pool is not None and _state['ocr']['state'] == 'ready':
+            todo.append('ocr')  # the master skipped the process pool
+        inherited = {engine: dict(s) for engine, s in _state.items() if engine not in todo}
+
+    for engine, s in inherited.items():
+        record_engine_state(engine, s['state'], s['load_ms'])
+    warm_parallel(todo, wait=False)
+
+
+def skip():
+    """Mark all engines as loading lazily (WARMUP_MODELS=false)."""
+    with _lock:
+        for engine in ENGINES:
+            _state[engine] = {'state': 'lazy', 'load_ms': None, 'error': None}
+
+
+def is_ready() -> bool:
+    with _lock:
+        return all(s['state'] in ('ready', 'failed', 'lazy') for s in _state.values())
+
+
+def readiness() -> dict:
+    """Per-engine {state, load_ms, error}."""
+    with _lock:
+        return {engine: dict(s) for engine, s in _state.items()}
+
+
+def uptime_seconds() -> float:
+    return round(time.time() - _started_at, 1)
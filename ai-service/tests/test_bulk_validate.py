@@ -0,0 +1,48 @@
+"""Bulk validation must answer every line, even when some records are malformed."""
+
+import json
+
+import pytest
+
+from app import app
+
+
+def _post(lines):
+    client = app.test_client()
+    response = client.post('/api/v1/ocr/validate/bulk', data=''.join(json.dumps(line) + '\n' for line in lines),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('field', ['full_name', 'document_number', 'date_of_birth', 'expiry_date'])
+@pytest.mark.parametrize('value', [123, [1, 2], {'a': 1}, True])
+def test_non_string_field_is_reported_per_line(field, value):
+    out = _post([{'full_name': 'JOHN'}, {field: value}, {'id': 'r3', 'extracted_data': {'full_name': 'JANE DOE'}}])
+
+    assert [o['line'] for o in out] == [1, 2, 3]
+    assert 'validation' in out[0]
+    assert out[1]['error'] == f'Invalid record: {field} must be a string'
+    assert out[2]['id'] == 'r3' and 'validation' in out[2]
+
+
+def test_null_fields_count_as_absent():
+    out = _post([{'full_name': None, 'document_number': None, 'date_of_birth': None, 'expiry_date': None}])
+
+    assert 'name_missing' in out[0]['validation']['checks_failed']
+
+
+def test_failing_batch_falls_back_to_single_records(monkeypatch):
+    from services.ocr_service import OCRService
+    validate_batch = OCRService.validate_batch.__func__
+
+    def flaky(cls, records):
+        if any(r.get('full_name') == 'BOOM' for r in records):
+            raise RuntimeError('boom')
+        return validate_batch(cls, records)
+
+    monkeypatch.setattr(OCRService, 'validate_batch', classmethod(flaky))
+    out = _post([{'full_name': 'JOHN'}, {'full_name': 'BOOM'}, {'full_name': 'JANE'}])
+
+    assert 'validation' in out[0] and 'validation' in out[2]
+    assert out[1] == {'line': 2, 'id': None, 'error': 'Validation failed: boom'}
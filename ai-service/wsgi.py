@@ -0,0 +1,12 @@
+"""
+WSGI Entry Point
+================
+Production entry point for the AI service:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master, warms the engines
+there before forking, and finishes warmup in each worker after the fork.
+"""
+
+from app import app  # noqa: F401